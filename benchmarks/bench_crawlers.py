@@ -0,0 +1,176 @@
+"""Throughput, CPU time and memory of the builtin crawlers, offline
+
+The crawlers run against a fake search engine and image CDN (see
+``fake_engines.py``) served by another process, every crawl runs in its
+own process so that its CPU time and peak RSS are measured separately.
+Results can be saved and compared with a baseline to catch regressions.
+Usage::
+
+    python -m benchmarks.bench_crawlers --num 500 --threads 4 16 64 --latency 0.02 --error-rate 0.01
+    python -m benchmarks.bench_crawlers --json new.json --baseline old.json --tolerance 0.2
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from benchmarks.fake_engines import route, start_server
+from icrawler.builtin import (
+    BaiduImageCrawler,
+    BingImageCrawler,
+    FlickrImageCrawler,
+    GoogleImageCrawler,
+    GreedyImageCrawler,
+    UrlListCrawler,
+)
+
+CRAWLERS = ["google", "bing", "baidu", "flickr", "greedy", "urllist"]
+
+
+def serve(kwargs, conn):
+    server, base_url = start_server(**kwargs)
+    conn.send(base_url)
+    conn.recv()
+    server.shutdown()
+
+
+def crawl(name, base_url, num, threads, root_dir):
+    kwargs = dict(
+        parser_threads=max(1, threads // 8),
+        downloader_threads=threads,
+        storage={"root_dir": os.path.join(root_dir, "images")},
+        log_level=logging.CRITICAL,
+    )
+    if name == "google":
+        crawler = GoogleImageCrawler(**kwargs)
+        route(crawler, base_url)
+        crawler.crawl(keyword="cat", max_num=num)
+    elif name == "bing":
+        crawler = BingImageCrawler(**kwargs)
+        route(crawler, base_url)
+        crawler.crawl(keyword="cat", max_num=num)
+    elif name == "baidu":
+        crawler = BaiduImageCrawler(**kwargs)
+        route(crawler, base_url)
+        crawler.crawl(keyword="cat", max_num=num)
+    elif name == "flickr":
+        crawler = FlickrImageCrawler(apikey="benchmark", **kwargs)
+        route(crawler, base_url)
+        crawler.crawl(tags="cat", max_num=num)
+    elif name == "greedy":
+        crawler = GreedyImageCrawler(**kwargs)
+        crawler.crawl(domains=base_url, max_num=num)
+    elif name == "urllist":
+        url_list = os.path.join(root_dir, "urls.txt")
+        with open(url_list, "w") as fout:
+            fout.write("\n".join(f"{base_url}/img/list-{i}.jpg" for i in range(num)))
+        crawler = UrlListCrawler(**kwargs)
+        crawler.crawl(url_list, max_num=num)
+    else:
+        raise ValueError(name)
+    return crawler.downloader.fetched_num
+
+
+def run(name, base_url, num, threads, result_queue):
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+    root_dir = tempfile.mkdtemp()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    fetched = crawl(name, base_url, num, threads, root_dir)
+    elapsed = time.perf_counter() - start
+    end_usage = resource.getrusage(resource.RUSAGE_SELF)
+    shutil.rmtree(root_dir)
+    cpu = (end_usage.ru_utime - usage.ru_utime) + (end_usage.ru_stime - usage.ru_stime)
+    # kilobytes on linux, bytes on macOS
+    rss = end_usage.ru_maxrss / (1024**2 if sys.platform == "darwin" else 1024)
+    result_queue.put(
+        dict(
+            crawler=name,
+            threads=threads,
+            images=fetched,
+            seconds=elapsed,
+            images_per_second=fetched / elapsed,
+            cpu_seconds=cpu,
+            max_rss_mb=rss,
+        )
+    )
+
+
+def compare(results, baseline, tolerance):
+    """Get the runs whose throughput dropped by more than ``tolerance``."""
+    previous = {(r["crawler"], r["threads"]): r["images_per_second"] for r in baseline}
+    regressions = []
+    for result in results:
+        key = (result["crawler"], result["threads"])
+        if key in previous and result["images_per_second"] < (1 - tolerance) * previous[key]:
+            regressions.append((key, previous[key], result["images_per_second"]))
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the builtin crawlers against a local fake engine and CDN")
+    parser.add_argument("--crawlers", nargs="+", choices=CRAWLERS, default=CRAWLERS)
+    parser.add_argument("--num", type=int, default=500, help="images per crawl")
+    parser.add_argument("--threads", type=int, nargs="+", default=[4, 16, 64], help="downloader threads")
+    parser.add_argument("--latency", type=float, default=0.02, help="mean latency of the images in seconds")
+    parser.add_argument("--page-latency", type=float, default=0.05, help="latency of the result pages")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of failed image requests")
+    parser.add_argument("--sizes", default="64x48:1,256x256:2,1024x768:1", help="image sizes and their weights")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="file to save the results to")
+    parser.add_argument("--baseline", help="results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="max relative drop of images/s")
+    args = parser.parse_args()
+
+    server_kwargs = dict(
+        latency=args.latency,
+        page_latency=args.page_latency,
+        error_rate=args.error_rate,
+        sizes=args.sizes,
+        site_pages=args.num,
+        seed=args.seed,
+    )
+    ctx = multiprocessing.get_context("spawn")
+    conn, child_conn = ctx.Pipe()
+    server = ctx.Process(target=serve, args=(server_kwargs, child_conn), daemon=True)
+    server.start()
+    base_url = conn.recv()
+
+    results = []
+    result_queue = ctx.Queue()
+    print(f"{'crawler':<10}{'threads':>8}{'images':>8}{'seconds':>10}{'images/s':>10}{'cpu s':>8}{'rss MB':>8}")
+    for name in args.crawlers:
+        for threads in args.threads:
+            proc = ctx.Process(target=run, args=(name, base_url, args.num, threads, result_queue))
+            proc.start()
+            result = result_queue.get()
+            proc.join()
+            results.append(result)
+            print(
+                f"{name:<10}{threads:>8}{result['images']:>8}{result['seconds']:>10.2f}"
+                f"{result['images_per_second']:>10.1f}{result['cpu_seconds']:>8.2f}{result['max_rss_mb']:>8.0f}"
+            )
+    conn.send("stop")
+    server.join()
+
+    if args.json:
+        with open(args.json, "w") as fout:
+            json.dump(dict(args=vars(args), results=results), fout, indent=2)
+    if args.baseline:
+        with open(args.baseline) as fin:
+            regressions = compare(results, json.load(fin)["results"], args.tolerance)
+        for (name, threads), before, after in regressions:
+            print(f"regression: {name} with {threads} threads, {before:.1f} -> {after:.1f} images/s")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
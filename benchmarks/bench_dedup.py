@@ -0,0 +1,69 @@
+"""Memory and throughput of the deduplication backends
+
+Every backend runs in its own process, so that the peak RSS is measured
+separately. Usage::
+
+    python -m benchmarks.bench_dedup --num 10000000
+"""
+
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from icrawler.utils import BloomDedup, MemoryDedup, SQLiteDedup, url_fingerprint
+
+
+def make_backend(name, num, root_dir):
+    if name == "memory":
+        return MemoryDedup()
+    elif name == "bloom":
+        return BloomDedup(capacity=num, error_rate=0.001)
+    elif name == "sqlite":
+        return SQLiteDedup(root_dir, commit_interval=100000)
+    raise ValueError(name)
+
+
+def run(name, num, result_queue):
+    root_dir = tempfile.mkdtemp()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    backend = make_backend(name, num, root_dir)
+    start = time.perf_counter()
+    duplicated = 0
+    for i in range(num):
+        if not backend.add(url_fingerprint(f"http://example.com/images/{i}.jpg?size=large")):
+            duplicated += 1
+    backend.flush()
+    add_time = time.perf_counter() - start
+    start = time.perf_counter()
+    lookups = min(num, 1000000)
+    for i in range(lookups):
+        backend.add(url_fingerprint(f"http://example.com/images/{i}.jpg?size=large"))
+    lookup_time = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    disk = sum(os.path.getsize(os.path.join(root_dir, f)) for f in os.listdir(root_dir))
+    shutil.rmtree(root_dir)
+    result_queue.put((name, num / add_time, lookups / lookup_time, rss / 1024, disk / 1024**2, duplicated))
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark deduplication backends")
+    parser.add_argument("--num", type=int, default=10000000, help="number of distinct urls")
+    parser.add_argument("--backends", nargs="+", default=["memory", "bloom", "sqlite"])
+    args = parser.parse_args()
+    print(f"{'backend':<8}{'adds/s':>12}{'lookups/s':>12}{'rss MB':>10}{'disk MB':>10}{'false pos':>11}")
+    ctx = multiprocessing.get_context("spawn")
+    for name in args.backends:
+        result_queue = ctx.Queue()
+        proc = ctx.Process(target=run, args=(name, args.num, result_queue))
+        proc.start()
+        name, adds, lookups, rss, disk, duplicated = result_queue.get()
+        proc.join()
+        print(f"{name:<8}{adds:>12.0f}{lookups:>12.0f}{rss:>10.1f}{disk:>10.1f}{duplicated:>11}")
+
+
+if __name__ == "__main__":
+    main()
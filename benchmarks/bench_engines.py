@@ -0,0 +1,58 @@
+"""Compare the throughput of the threaded and the asyncio crawl engines
+
+Usage::
+
+    python -m benchmarks.bench_engines --pages 100 --concurrency 16 64 256 --latency 0.05
+"""
+
+import logging
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from benchmarks.stub_server import StubFeeder, StubParser, start_server
+from icrawler import AsyncCrawler, Crawler, ImageDownloader
+
+
+def run(crawler_cls, base_url, pages, concurrency):
+    root_dir = tempfile.mkdtemp()
+    crawler = crawler_cls(
+        feeder_cls=StubFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        parser_threads=4,
+        downloader_threads=concurrency,
+        storage={"root_dir": root_dir},
+        log_level=logging.WARNING,
+    )
+    start = time.perf_counter()
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=base_url, page_num=pages),
+        parser_kwargs=dict(base_url=base_url),
+        downloader_kwargs=dict(max_num=0),
+    )
+    elapsed = time.perf_counter() - start
+    fetched = crawler.downloader.fetched_num
+    shutil.rmtree(root_dir)
+    return fetched, elapsed
+
+
+def main():
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+    parser = ArgumentParser(description="Benchmark crawl engines against a local stub server")
+    parser.add_argument("--pages", type=int, default=100, help="number of result pages")
+    parser.add_argument("--latency", type=float, default=0.05, help="server latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256], help="downloader concurrency")
+    args = parser.parse_args()
+    server, base_url = start_server(latency=args.latency)
+    print(f"{'engine':<10}{'concurrency':>12}{'images':>8}{'seconds':>10}{'images/s':>10}")
+    for concurrency in args.concurrency:
+        for name, crawler_cls in [("thread", Crawler), ("asyncio", AsyncCrawler)]:
+            fetched, elapsed = run(crawler_cls, base_url, args.pages, concurrency)
+            print(f"{name:<10}{concurrency:>12}{fetched:>8}{elapsed:>10.2f}{fetched / elapsed:>10.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""CPU time and allocations of the builtin parsers
+
+The current parsers are compared with their previous implementations (see
+``reference_parsers.py``), on result pages of the fake engines, and the
+decoding of the Baidu urls alone is measured. Usage::
+
+    python -m benchmarks.bench_parsers --pages 200
+"""
+
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+from benchmarks.fake_engines import baidu_encode, baidu_page, bing_page, google_page, site_page
+from benchmarks.reference_parsers import dict_baidu, dict_decode_url, soup_bing, soup_google, soup_greedy
+from icrawler.builtin import BaiduParser, BingParser, GoogleParser, GreedyParser
+
+
+def make_response(content, url="http://example.com/"):
+    return SimpleNamespace(content=content.encode("utf-8"), url=url)
+
+
+def corpus(pages):
+    """Result pages of every parser, in the formats of the fake engines."""
+    urls = [f"http://example.com/img/{i}.jpg" for i in range(100)]
+    links = [f"/site/{i}.html" for i in range(10)] + ["//cdn.example.com/a.png", "#top", "javascript:void(0)"]
+    return dict(
+        google=[make_response(google_page(urls)) for _ in range(pages)],
+        bing=[make_response(bing_page(urls[:20])) for _ in range(pages)],
+        greedy=[make_response(site_page(urls[:30], links)) for _ in range(pages)],
+        baidu=[make_response(baidu_page(urls[:30])) for _ in range(pages)],
+    )
+
+
+def parsers():
+    """Get the reference and the current parse functions."""
+    domains = ["http://example.com"]
+    google, bing, greedy, baidu = (cls(1, None, None) for cls in (GoogleParser, BingParser, GreedyParser, BaiduParser))
+    old = dict(
+        google=soup_google, bing=soup_bing, greedy=lambda response: soup_greedy(response, domains), baidu=dict_baidu
+    )
+    new = dict(
+        google=google.parse,
+        bing=bing.parse,
+        greedy=lambda response: greedy.parse(response, domains),
+        baidu=baidu.parse,
+    )
+    return old, new
+
+
+def bench_decode(num):
+    """Decode Baidu urls one by one with the previous and the current
+    decoder, and a page of 30 urls at once with the current one."""
+    urls = [baidu_encode(f"https://img{i % 10}.example.com/it/u={i},{i * 7}&fm=26&fmt=auto.jpg") for i in range(num)]
+    parser = BaiduParser(1, None, None)
+    results = []
+    for name, decode in (("dict", dict_decode_url), ("translate", parser._decode_url)):
+        start = time.perf_counter()
+        for url in urls:
+            decode(url)
+        results.append((name, time.perf_counter() - start))
+    start = time.perf_counter()
+    for i in range(0, num, 30):
+        parser._decode_urls(urls[i : i + 30])
+    results.append(("batch", time.perf_counter() - start))
+    return results
+
+
+def measure(parse, responses):
+    start = time.process_time()
+    num = sum(len(list(parse(response) or [])) for response in responses)
+    elapsed = time.process_time() - start
+    # allocations are traced separately as tracing slows parsing down
+    tracemalloc.start()
+    list(parse(responses[0]) or [])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return num, elapsed, peak
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the builtin parsers")
+    parser.add_argument("--pages", type=int, default=200, help="pages per parser")
+    parser.add_argument("--urls", type=int, default=100000, help="baidu urls to decode")
+    args = parser.parse_args()
+    pages = corpus(args.pages)
+    old, new = parsers()
+    print(f"{'parser':<8}{'impl':>6}{'items':>8}{'cpu ms/page':>13}{'peak KB/page':>14}")
+    for name, responses in pages.items():
+        for impl, parse in (("old", old[name]), ("new", new[name])):
+            num, elapsed, peak = measure(parse, responses)
+            print(f"{name:<8}{impl:>6}{num:>8}{1000 * elapsed / len(responses):>13.3f}{peak / 1024:>14.0f}")
+    print(f"\n{'decoder':<10}{'us/url':>8}")
+    for name, elapsed in bench_decode(args.urls):
+        print(f"{name:<10}{1e6 * elapsed / args.urls:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
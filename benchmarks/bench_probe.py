@@ -0,0 +1,92 @@
+"""CPU time of reading the size of images with the header prober and with PIL
+
+``ImageDownloader.keep_file`` reads the format and the size of every image
+from the head of its file, 16 KB first and more if it is not enough, which
+is the whole file for WebP images opened with PIL. Usage::
+
+    python -m benchmarks.bench_probe --num 20000
+"""
+
+import time
+from argparse import ArgumentParser
+from io import BytesIO
+
+from PIL import Image
+
+from icrawler.utils import probe_image
+
+FORMATS = [
+    ("JPEG", "RGB", {"quality": 85}),
+    ("JPEG", "RGB", {"progressive": True, "exif": b"Exif\x00\x00" + bytes(4096)}),
+    ("PNG", "RGB", {}),
+    ("GIF", "P", {}),
+    ("BMP", "RGB", {}),
+    ("WEBP", "RGB", {}),
+    ("TIFF", "RGB", {}),
+]
+
+
+def make_image(fmt, mode, options, size=(800, 600)):
+    buf = BytesIO()
+    Image.effect_noise(size, 64).convert(mode).save(buf, fmt, **options)
+    return buf.getvalue()
+
+
+def read_head(data, read_size):
+    """Read the size as ``keep_file`` did, with PIL from a head growing until
+    it can be opened.
+
+    Returns:
+        tuple: the format, the size and the number of bytes read.
+    """
+    head_size = 16 * 1024
+    while True:
+        head = data[:head_size]
+        try:
+            img = read_size(head)
+        except OSError:
+            if len(head) < head_size:
+                return None
+            head_size *= 4
+        else:
+            if img is not None:
+                return img + (len(head),)
+            # the prober needs more bytes
+            if len(head) < head_size:
+                return None
+            head_size *= 4
+
+
+def pil_size(head):
+    img = Image.open(BytesIO(head))
+    return img.format, img.size
+
+
+def cpu_time(read_size, data, num):
+    start = time.process_time()
+    for _ in range(num):
+        read_head(data, read_size)
+    return (time.process_time() - start) / num
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the image header prober against PIL")
+    parser.add_argument("--num", type=int, default=20000, help="number of images of every format")
+    args = parser.parse_args()
+    print(f"{'format':<16}{'PIL us':>10}{'PIL KB':>8}{'probe us':>10}{'probe KB':>10}{'speedup':>10}")
+    for fmt, mode, options in FORMATS:
+        data = make_image(fmt, mode, options)
+        pil_fmt, pil_dims, pil_read = read_head(data, pil_size)
+        probe_fmt, probe_dims, probe_read = read_head(data, probe_image)
+        assert (pil_fmt, pil_dims) == (probe_fmt, probe_dims)
+        pil = cpu_time(pil_size, data, args.num)
+        probe = cpu_time(probe_image, data, args.num)
+        name = fmt + (" progressive" if options.get("progressive") else "")
+        print(
+            f"{name:<16}{pil * 1e6:>10.1f}{pil_read / 1024:>8.0f}{probe * 1e6:>10.1f}{probe_read / 1024:>10.0f}"
+            f"{pil / probe:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
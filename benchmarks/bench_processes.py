@@ -0,0 +1,104 @@
+"""Scaling of the parser and downloader worker processes with CPU-bound hooks
+
+The parser parses every page with BeautifulSoup and the downloader decodes
+and filters every image with PIL, so the crawl is bound by the GIL when the
+workers are threads. The stub server runs in its own process. Usage::
+
+    python -m benchmarks.bench_processes --pages 50 --processes 0 1 2 4
+"""
+
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+from io import BytesIO
+
+from bs4 import BeautifulSoup
+from PIL import Image, ImageFilter
+
+from benchmarks.stub_server import make_image, start_server
+from icrawler import Crawler, Feeder, ImageDownloader, Parser
+
+
+class StubFeeder(Feeder):
+    def feed(self, base_url, page_num):
+        for i in range(page_num):
+            self.output(f"{base_url}/page/{i}")
+
+
+class SoupParser(Parser):
+    def parse(self, response, base_url):
+        soup = BeautifulSoup(response.content, "lxml")
+        for img in soup.find_all("img", src=True):
+            yield dict(file_url=base_url + img["src"])
+
+
+class DecodingDownloader(ImageDownloader):
+    def keep_file(self, task, response, **kwargs):
+        img = Image.open(BytesIO(response.content)).convert("L")
+        edges = img.filter(ImageFilter.FIND_EDGES)
+        return edges.getextrema()[1] > 0
+
+
+def serve(latency, image_size, images_per_page, conn):
+    server, base_url = start_server(latency, images_per_page, make_image(image_size, image_size))
+    conn.send(base_url)
+    conn.recv()
+    server.shutdown()
+
+
+def run(base_url, pages, processes, threads):
+    root_dir = tempfile.mkdtemp()
+    crawler = Crawler(
+        feeder_cls=StubFeeder,
+        parser_cls=SoupParser,
+        downloader_cls=DecodingDownloader,
+        parser_threads=2,
+        downloader_threads=threads,
+        parser_processes=processes,
+        downloader_processes=processes,
+        storage={"root_dir": root_dir},
+        log_level=logging.WARNING,
+    )
+    start = time.perf_counter()
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=base_url, page_num=pages),
+        parser_kwargs=dict(base_url=base_url),
+        downloader_kwargs=dict(max_num=0),
+    )
+    elapsed = time.perf_counter() - start
+    fetched = crawler.downloader.fetched_num
+    crawler.close()
+    shutil.rmtree(root_dir)
+    return fetched, elapsed
+
+
+def main():
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+    parser = ArgumentParser(description="Benchmark worker processes against a local stub server")
+    parser.add_argument("--pages", type=int, default=50, help="number of result pages")
+    parser.add_argument("--latency", type=float, default=0.01, help="server latency in seconds")
+    parser.add_argument("--image-size", type=int, default=1024, help="width and height of the images")
+    parser.add_argument("--threads", type=int, default=8, help="downloader threads per process")
+    parser.add_argument(
+        "--processes", type=int, nargs="+", default=[0, 1, 2, 4], help="worker processes, 0 means threads only"
+    )
+    args = parser.parse_args()
+    conn, child_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(args.latency, args.image_size, 10, child_conn), daemon=True)
+    server.start()
+    base_url = conn.recv()
+    print(f"{os.cpu_count()} cores")
+    print(f"{'processes':>10}{'images':>8}{'seconds':>10}{'images/s':>10}")
+    for processes in args.processes:
+        fetched, elapsed = run(base_url, args.pages, processes, args.threads)
+        print(f"{processes:>10}{fetched:>8}{elapsed:>10.2f}{fetched / elapsed:>10.1f}")
+    conn.send(None)
+    server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Write and sequential read throughput of the per-file and sharded storages
+
+Every image is written with ``write_chunks()`` as the downloader does, and
+then all the images are read back in order, as a training data loader
+would. Usage::
+
+    python -m benchmarks.bench_storage --num 100000 --size 8192
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from icrawler.storage import FileSystem, ShardStorage
+
+
+def read_files(storage):
+    for filename in sorted(os.listdir(storage.root_dir)):
+        with open(os.path.join(storage.root_dir, filename), "rb") as fin:
+            yield filename, fin.read()
+
+
+def run(name, num, size):
+    root_dir = tempfile.mkdtemp()
+    storage = FileSystem(root_dir) if name == "files" else ShardStorage(root_dir)
+    data = os.urandom(size)
+    start = time.perf_counter()
+    for i in range(num):
+        storage.write_chunks(f"{i:06d}.jpg", [data])
+    storage.flush()
+    write_time = time.perf_counter() - start
+    start = time.perf_counter()
+    total = sum(len(body) for _, body in (read_files(storage) if name == "files" else storage))
+    read_time = time.perf_counter() - start
+    assert total == num * size
+    num_files = len(os.listdir(root_dir))
+    shutil.rmtree(root_dir)
+    return num / write_time, num / read_time, num_files
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark storage backends")
+    parser.add_argument("--num", type=int, default=100000, help="number of images")
+    parser.add_argument("--size", type=int, default=8192, help="bytes per image")
+    args = parser.parse_args()
+    print(f"{'storage':<8}{'writes/s':>12}{'reads/s':>12}{'inodes':>10}")
+    for name in ["files", "shards"]:
+        writes, reads, num_files = run(name, args.num, args.size)
+        print(f"{name:<8}{writes:>12.0f}{reads:>12.0f}{num_files:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Local fake search engines and image CDN used by the benchmarks
+
+The server answers like the sites crawled by the builtin crawlers, in the
+formats their parsers expect:
+
+* ``/search?tbm=isch&start=<i>``: a Google result page, with the urls of
+  100 images in a script.
+* ``/images/async?q=<keyword>&first=<i>``: a Bing result page, with 20
+  images.
+* ``/search/acjson?pn=<i>&rn=30``: a Baidu json result, with the urls of 30
+  images encrypted as Baidu does.
+* ``/services/rest/?method=flickr.photos.search&page=<i>``: a Flickr json
+  result, with 100 photos per page and the urls of the sizes asked for in
+  ``extras`` (unless ``flickr_extras`` is False), and
+  ``/services/rest/?method=flickr.photos.getSizes&photo_id=<id>``: the urls
+  of all the sizes of a photo. The calls of every method are counted in
+  ``calls``.
+* ``/`` and ``/site/<n>.html``: pages of a site, each with
+  ``images_per_page`` images and links to other pages, for
+  :class:`GreedyImageCrawler`.
+* ``/img/<name>.jpg``: images of the synthetic CDN, whose sizes are drawn
+  from ``sizes``. Responses are delayed by ``latency`` seconds on average,
+  and a fraction ``error_rate`` of them are "503 Service Unavailable".
+
+Crawlers are pointed at the server with :func:`route`, which mounts a
+transport adapter rewriting the urls of the real sites, so that the
+builtin feeders are used unchanged.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+from icrawler.utils import PooledAdapter
+
+ENGINE_URLS = ("https://www.google.com", "https://www.bing.com", "http://image.baidu.com", "https://api.flickr.com")
+
+# labels of the Flickr sizes and the suffixes of their extras
+FLICKR_SIZES = (
+    ("Square", "sq"),
+    ("Large Square", "q"),
+    ("Thumbnail", "t"),
+    ("Small", "s"),
+    ("Small 320", "n"),
+    ("Medium", "m"),
+    ("Medium 640", "z"),
+    ("Medium 800", "c"),
+    ("Large", "l"),
+    ("Large 1600", "h"),
+    ("Large 2048", "k"),
+    ("Original", "o"),
+)
+
+# inverse of the character mapping of BaiduParser._decode_url
+_BAIDU_CHARS = "wkv1ju2it3hs4g5rq6fp7eo8dn9cm0bla"
+_BAIDU_PLAIN = "abcdefghijklmnopqrstuvw1234567890"
+_BAIDU_ENCODE = str.maketrans(_BAIDU_PLAIN, _BAIDU_CHARS)
+_BAIDU_TOKENS = ((":", "_z2C$q"), (".", "_z&e3B"), ("/", "AzdH3F"))
+
+
+def baidu_encode(url):
+    """Encrypt an url as the ``objURL`` of a Baidu result."""
+    url = url.translate(_BAIDU_ENCODE)
+    for plain, token in _BAIDU_TOKENS:
+        url = url.replace(plain, token)
+    return url
+
+
+def parse_sizes(spec):
+    """Parse a size distribution such as ``"64x48:1,256x256:2"``.
+
+    Returns:
+        list: ``((width, height), weight)`` pairs.
+    """
+    sizes = []
+    for item in spec.split(","):
+        size, _, weight = item.partition(":")
+        width, height = size.split("x")
+        sizes.append(((int(width), int(height)), float(weight or 1)))
+    return sizes
+
+
+def google_page(urls):
+    """A Google result page with the urls of images in a script."""
+    data = json.dumps([[1, [url, 256, 256]] for url in urls])
+    return f"<html><body><script>AF_initDataCallback({{key: 'ds:1', data:{data}}});</script></body></html>"
+
+
+def bing_page(urls):
+    """A Bing result page with the urls of images in the ``m`` attributes."""
+    divs = "".join(
+        f'<div class="imgpt"><a class="iusc" m="{{&quot;murl&quot;:&quot;{url}&quot;}}" href="#"></a></div>'
+        for url in urls
+    )
+    return f"<html><body>{divs}</body></html>"
+
+
+def baidu_page(urls):
+    """A Baidu json result with encrypted urls of images."""
+    return json.dumps(dict(data=[dict(objURL=baidu_encode(url)) for url in urls]))
+
+
+def flickr_page(photo_ids, extras, image_url):
+    """A Flickr json result of ``flickr.photos.search``.
+
+    Args:
+        photo_ids (list): ids of the photos.
+        extras (list): extras asked for, the ``url_*`` ones are given.
+        image_url (callable): gets the url of a photo in a size, from the
+            photo id and the size suffix.
+    """
+    photos = []
+    for photo_id in photo_ids:
+        photo = dict(id=str(photo_id), owner="0@N00", secret="0", server="0", farm=1, title=f"photo {photo_id}")
+        for _, suffix in FLICKR_SIZES:
+            if f"url_{suffix}" in extras:
+                photo[f"url_{suffix}"] = image_url(photo_id, suffix)
+        photos.append(photo)
+    return json.dumps(dict(photos=dict(page=1, pages=40, perpage=len(photos), photo=photos), stat="ok"))
+
+
+def flickr_sizes(photo_id, image_url):
+    """A Flickr json result of ``flickr.photos.getSizes``."""
+    sizes = [dict(label=label, source=image_url(photo_id, suffix)) for label, suffix in FLICKR_SIZES]
+    return json.dumps(dict(sizes=dict(size=sizes), stat="ok"))
+
+
+def site_page(urls, links):
+    """A page of a site with images and links to other pages."""
+    imgs = "".join(f'<img src="{url}">' for url in urls)
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return f"<html><body>{imgs}{anchors}</body></html>"
+
+
+class FakeEngineHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    page_latency = 0.0
+    error_rate = 0.0
+    sizes = [((256, 256), 1.0)]
+    images_per_page = 10
+    site_pages = 100
+    flickr_extras = True
+    seed = 0
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path.startswith("/img/"):
+            self.image(url.path)
+            return
+        time.sleep(self.page_latency)
+        if url.path == "/search" and query.get("tbm") == "isch":
+            self.google(int(query.get("start", 0)))
+        elif url.path == "/images/async":
+            self.bing(int(query.get("first", 0)))
+        elif url.path == "/search/acjson":
+            self.baidu(int(query.get("pn", 0)), int(query.get("rn", 30)))
+        elif url.path == "/services/rest/":
+            self.flickr(query)
+        elif url.path == "/":
+            self.site(0)
+        elif re.match(r"/site/\d+\.html$", url.path):
+            self.site(int(url.path[6:-5]))
+        else:
+            self.send_error(404)
+
+    @property
+    def base_url(self):
+        return f"http://{self.headers.get('Host') or '127.0.0.1:%d' % self.server.server_port}"
+
+    def image_urls(self, prefix, start, num):
+        return [f"{self.base_url}/img/{prefix}-{i}.jpg" for i in range(start, start + num)]
+
+    def google(self, start):
+        self.reply(google_page(self.image_urls("google", start, 100)).encode(), "text/html")
+
+    def bing(self, first):
+        self.reply(bing_page(self.image_urls("bing", first, 20)).encode(), "text/html")
+
+    def baidu(self, pn, rn):
+        self.reply(baidu_page(self.image_urls("baidu", pn, rn)).encode(), "application/json")
+
+    def flickr(self, query):
+        method = query.get("method")
+        with self.lock:
+            self.calls[method] += 1
+        if method == "flickr.photos.search":
+            per_page = int(query.get("per_page", 100))
+            start = (int(query.get("page", 1)) - 1) * per_page
+            extras = query.get("extras", "").split(",") if self.flickr_extras else []
+            body = flickr_page(range(start, start + per_page), extras, self.flickr_image_url)
+        elif method == "flickr.photos.getSizes":
+            body = flickr_sizes(query["photo_id"], self.flickr_image_url)
+        else:
+            body = json.dumps(dict(stat="fail", code=112, message=f'Method "{method}" not found'))
+        self.reply(body.encode(), "application/json")
+
+    def flickr_image_url(self, photo_id, suffix):
+        return f"{self.base_url}/img/flickr-{photo_id}_{suffix}.jpg"
+
+    def site(self, page):
+        n = self.images_per_page
+        links = [f"/site/{i}.html" for i in (page + 1, 2 * page + 2) if i < self.site_pages]
+        self.reply(site_page(self.image_urls("site", page * n, n), links).encode(), "text/html")
+
+    def image(self, path):
+        time.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        if self.rng.random() < self.error_rate:
+            self.send_error(503)
+            return
+        # every url gets the same size
+        rng = random.Random(zlib.crc32(path.encode()) ^ self.seed)
+        sizes, weights = zip(*self.sizes)
+        self.reply(self.image_data(rng.choices(sizes, weights)[0]), "image/jpeg")
+
+    @classmethod
+    def image_data(cls, size):
+        with cls.lock:
+            if size not in cls.images:
+                buf = BytesIO()
+                Image.effect_noise(size, 32).convert("RGB").save(buf, "JPEG", quality=85)
+                cls.images[size] = buf.getvalue()
+            return cls.images[size]
+
+    def reply(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeEngineServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # clients closing idle keep-alive connections are not errors
+        pass
+
+
+def start_server(
+    latency=0.0,
+    page_latency=0.0,
+    error_rate=0.0,
+    sizes="256x256",
+    images_per_page=10,
+    site_pages=100,
+    flickr_extras=True,
+    seed=0,
+):
+    """Start a fake engine server in a background thread.
+
+    Args:
+        latency (float): Mean delay of the images in seconds.
+        page_latency (float): Delay of the result pages in seconds.
+        error_rate (float): Fraction of the image requests failing.
+        sizes (str): Distribution of the image sizes, e.g.
+            ``"64x48:1,256x256:2,1024x768:1"``.
+        images_per_page (int): Images per page of the site.
+        site_pages (int): Number of pages of the site.
+        flickr_extras (bool): Whether the Flickr search results have the
+            urls of the sizes.
+        seed (int): Seed of the random delays, errors and sizes.
+
+    Returns:
+        tuple: the server and its base url.
+    """
+    attrs = dict(
+        latency=latency,
+        page_latency=page_latency,
+        error_rate=error_rate,
+        sizes=parse_sizes(sizes) if isinstance(sizes, str) else sizes,
+        images_per_page=images_per_page,
+        site_pages=site_pages,
+        flickr_extras=flickr_extras,
+        seed=seed,
+        rng=random.Random(seed),
+        images={},
+        calls=Counter(),
+        lock=threading.Lock(),
+    )
+    handler = type("Handler", (FakeEngineHandler,), attrs)
+    server = FakeEngineServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class LocalAdapter(PooledAdapter):
+    """Transport adapter sending the requests to a local server instead."""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = self.base_url + url.path + (f"?{url.query}" if url.query else "")
+        return super().send(request, **kwargs)
+
+
+def route(crawler, base_url, urls=ENGINE_URLS):
+    """Send the requests of a crawler to the real search engines to a fake
+    engine server."""
+    thread_num = crawler.feeder.thread_num + crawler.parser.thread_num + crawler.downloader.thread_num
+    adapter = LocalAdapter(base_url, pool_connections=10, pool_maxsize=max(10, thread_num))
+    for url in urls:
+        crawler.session.mount(url, adapter)
@@ -0,0 +1,132 @@
+"""The previous implementations of the builtin parsers
+
+The parsers built BeautifulSoup trees of the pages, and the urls of Baidu
+were decoded character by character. They are the reference of the
+current parsers, which must return the same items, see
+``bench_parsers.py`` and ``tests/test_parsers.py``.
+"""
+
+import html
+import json
+import re
+from urllib.parse import urljoin, urlsplit
+
+from bs4 import BeautifulSoup
+
+
+def soup_bing(response):
+    soup = BeautifulSoup(response.content.decode("utf-8", "ignore"), "lxml")
+    pattern = re.compile(r"murl\":\"(.*?)\.jpg")
+    for div in soup.find_all("div", class_="imgpt"):
+        try:
+            href_str = html.unescape(div.a["m"])
+        except KeyError:
+            continue
+        match = pattern.search(href_str)
+        if match:
+            yield dict(file_url=f"{match.group(1)}.jpg")
+
+
+def soup_google(response):
+    soup = BeautifulSoup(response.content.decode("utf-8", "ignore"), "lxml")
+    for div in soup.find_all(name="script"):
+        txt = str(div)
+        uris = re.findall(r"http[^\[]*?.(?:jpg|png|bmp)", txt)
+        if not uris:
+            uris = re.findall(r"http[^\[]*?\.(?:jpg|png|bmp)", txt)
+        uris = [bytes(uri, "utf-8").decode("unicode-escape") for uri in uris]
+        if uris:
+            return [{"file_url": uri} for uri in uris]
+
+
+def soup_greedy(response, domains):
+    pattern = re.compile(r"(http|\/\/)(.*)\.(jpg|jpeg|png|bmp|gif|tiff)")
+    soup = BeautifulSoup(response.content.decode("utf-8", "ignore"), "lxml")
+    for tag in soup.find_all("img", src=True):
+        if re.match(pattern, tag["src"]):
+            yield dict(file_url="http:" + tag["src"] if tag["src"].startswith("//") else tag["src"])
+    base_url = "{0.scheme}://{0.netloc}".format(urlsplit(response.url))
+    for tag in soup.find_all(href=True):
+        href = tag["href"]
+        if len(href) < 2:
+            continue
+        if href[0:2] == "//":
+            href = "http:" + href.rstrip("/")
+        elif href[0] == "/":
+            href = urljoin(base_url, href.strip("/"))
+        elif href[0] == "#":
+            continue
+        else:
+            href = urljoin(base_url, href.rstrip("/"))
+        if re.match(pattern, href):
+            yield dict(file_url=href)
+        else:
+            tmp = href.split("/")[-1].split(".")
+            if len(tmp) > 1 and tmp[-1] not in ["html", "shtml", "shtm", "php", "jsp", "asp"]:
+                continue
+            elif href.find("javascript", 0, 10) == 0:
+                continue
+            elif urlsplit(href).scheme not in ["http", "https", "ftp"]:
+                continue
+            elif any(domain in href for domain in domains):
+                yield href
+
+
+def dict_decode_url(encrypted_url):
+    url = encrypted_url
+    map1 = {"_z2C$q": ":", "_z&e3B": ".", "AzdH3F": "/"}
+    map2 = {
+        "w": "a",
+        "k": "b",
+        "v": "c",
+        "1": "d",
+        "j": "e",
+        "u": "f",
+        "2": "g",
+        "i": "h",
+        "t": "i",
+        "3": "j",
+        "h": "k",
+        "s": "l",
+        "4": "m",
+        "g": "n",
+        "5": "o",
+        "r": "p",
+        "q": "q",
+        "6": "r",
+        "f": "s",
+        "p": "t",
+        "7": "u",
+        "e": "v",
+        "o": "w",
+        "8": "1",
+        "d": "2",
+        "n": "3",
+        "9": "4",
+        "c": "5",
+        "m": "6",
+        "0": "7",
+        "b": "8",
+        "l": "9",
+        "a": "0",
+    }  # yapf: disable
+    for ciphertext, plaintext in map1.items():
+        url = url.replace(ciphertext, plaintext)
+    char_list = [char for char in url]
+    for i in range(len(char_list)):
+        if char_list[i] in map2:
+            char_list[i] = map2[char_list[i]]
+    url = "".join(char_list)
+    return url
+
+
+def dict_baidu(response):
+    content = json.loads(response.content.decode("utf-8", "ignore").replace("\\'", "'"), strict=False)
+    for item in content["data"]:
+        if "objURL" in item:
+            img_url = dict_decode_url(item["objURL"])
+        elif "hoverURL" in item:
+            img_url = item["hoverURL"]
+        else:
+            continue
+        yield dict(file_url=img_url)
@@ -0,0 +1,134 @@
+"""Local http server used by the benchmarks and the tests
+
+It serves result pages at ``/page/<n>`` (each linking to ``images_per_page``
+images) and images at ``/img/<n>.jpg``, every response is delayed by
+``latency`` seconds to simulate a remote server. :class:`StubFeeder` and
+:class:`StubParser` crawl it.
+"""
+
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from PIL import Image
+
+from icrawler import Feeder, Parser
+
+
+def make_image(width=64, height=48, fmt="JPEG"):
+    buf = BytesIO()
+    Image.effect_noise((width, height), 64).convert("RGB").save(buf, fmt)
+    return buf.getvalue()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serve ``/page/<n>`` with links to ``images_per_page`` images,
+    ``/img/<n>.jpg`` and ``/large.png``, also served as ``/image`` without
+    extension.
+
+    ``/flaky/<path>`` responds "503 Service Unavailable" with ``Retry-After: 0``
+    the first time, and ``/<path>`` afterwards. ``/gone/<path>`` is "410 Gone".
+    ``/cached/<path>`` is ``/<path>`` with an ``ETag`` and ``no-cache``, and
+    "304 Not Modified" if requested with its ``ETag``.
+    """
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    images_per_page = 10
+    image = make_image()
+    large_image = make_image(1024, 768, "PNG")
+
+    requests: Counter = Counter()
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self.requests[self.path] += 1
+        path = self.path
+        if path.startswith("/flaky/"):
+            if self.requests[path] == 1:
+                self.send_response(503)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            path = path[6:]
+        self.extra_headers = {}
+        if path.startswith("/cached/"):
+            path = path[7:]
+            self.extra_headers = {"ETag": f'"{path}"', "Cache-Control": "no-cache"}
+            if self.headers.get("If-None-Match") == self.extra_headers["ETag"]:
+                self.send_response(304)
+                for name, value in self.extra_headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+        if path.startswith("/gone/"):
+            self.send_error(410)
+            return
+        match = re.match(r"/page/(\d+)$", path)
+        if match:
+            page = int(match.group(1))
+            n = self.images_per_page
+            imgs = "".join(f'<img src="/img/{page * n + i}.jpg">' for i in range(n))
+            self.reply(f"<html><body>{imgs}</body></html>".encode(), "text/html")
+        elif re.match(r"/img/\d+\.jpg$", path):
+            self.reply(self.image, "image/jpeg")
+        elif path in ("/large.png", "/image"):
+            self.reply(self.large_image, "image/png")
+        else:
+            self.send_error(404)
+
+    def reply(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in self.extra_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # clients closing idle keep-alive connections are not errors
+        pass
+
+
+def start_server(latency=0.0, images_per_page=10, image=None):
+    """Start a stub server in a background thread.
+
+    Returns:
+        tuple: the server and its base url.
+    """
+    attrs = dict(latency=latency, images_per_page=images_per_page)
+    if image is not None:
+        attrs["image"] = image
+    handler = type("Handler", (StubHandler,), attrs)
+    server = StubServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class StubFeeder(Feeder):
+    """Feed the urls of the first ``page_num`` result pages."""
+
+    def feed(self, base_url, page_num):
+        for i in range(page_num):
+            self.output(f"{base_url}/page/{i}")
+
+
+class StubParser(Parser):
+    """Get the images linked from a result page."""
+
+    def parse(self, response, base_url):
+        for src in re.findall(r'src="([^"]+)"', response.text):
+            yield dict(file_url=base_url + src)
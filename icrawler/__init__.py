@@ -1,3 +1,4 @@
+from .async_crawler import AsyncCrawler
 from .crawler import Crawler
 from .downloader import Downloader, ImageDownloader
 from .feeder import Feeder, SimpleSEFeeder, UrlListFeeder
@@ -5,6 +6,7 @@ from .parser import Parser
 from .version import __version__, version
 
 __all__ = [
+    "AsyncCrawler",
     "Crawler",
     "Downloader",
     "ImageDownloader",
@@ -0,0 +1,509 @@
+"""Crawler running on an asyncio event loop"""
+
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .crawler import Crawler
+from .downloader import CHUNK_SIZE
+from .utils import CachedQueue, HostScheduler, PriorityCachedQueue
+from .utils.http_cache import cached_response
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None  # type: ignore
+
+
+class _LoopQueue(CachedQueue):
+    """A CachedQueue whose items are handed over to an asyncio queue.
+
+    Feeders run in ordinary threads and put urls into their ``out_queue``,
+    this queue forwards every non-duplicated url to the event loop, so that
+    ``Feeder.feed`` works unchanged.
+    """
+
+    def __init__(self, loop, async_queue, dedup=None):
+        super().__init__(dedup=dedup)
+        self._loop = loop
+        self._async_queue = async_queue
+
+    def _put(self, item):
+        self._loop.call_soon_threadsafe(self._async_queue.put_nowait, item)
+
+
+def _requests_error(error):
+    """Get the error of requests matching an error of aiohttp, so that the
+    retry policy classifies it, or None."""
+    if isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)):
+        return requests.ConnectionError(error)
+    if isinstance(error, asyncio.TimeoutError):
+        return requests.Timeout(error)
+    return None
+
+
+class _StreamRaw:
+    """``response.raw`` of a streamed response, reading the body of an
+    aiohttp response on the event loop.
+
+    The blocking hooks, which run in executor threads, read the body with
+    it chunk by chunk, as they read ``response.raw`` of requests, so a file
+    rejected by ``Downloader.keep_file`` is not received any further.
+    """
+
+    def __init__(self, loop, resp):
+        self._loop = loop
+        self._resp = resp
+
+    def read(self, amt=None, decode_content=True):
+        future = asyncio.run_coroutine_threadsafe(self._resp.content.read(-1 if amt is None else amt), self._loop)
+        try:
+            return future.result()
+        except Exception as e:
+            error = _requests_error(e)
+            if error is None:
+                raise
+            raise error from e
+
+    def stream(self, amt=CHUNK_SIZE, decode_content=True):
+        while True:
+            chunk = self.read(amt)
+            if not chunk:
+                break
+            yield chunk
+
+    def release_conn(self):
+        # the connection is reused only if the body has been received
+        if self._resp.content.at_eof():
+            self._resp.release()
+        else:
+            self._resp.close()
+
+    close = release_conn
+
+
+class AsyncCrawler(Crawler):
+    """Crawler which fetches pages and files with an async http client.
+
+    The feeder still runs in threads, while all the requests of the parser
+    and the downloader are made by coroutines on a single event loop, so
+    that thousands of concurrent downloads do not need thousands of threads.
+    ``parser_threads`` and ``downloader_threads`` are used as the number of
+    concurrent parser and downloader coroutines. ``Feeder.feed``,
+    ``Parser.parse``, ``Downloader.keep_file`` and the storage backend are
+    used as they are, blocking hooks (parsing pages, checking and saving
+    files) are executed in the default executor of the loop. Files are
+    streamed to them, so that the rejected ones are not received completely.
+
+    Builtin crawlers can be switched to this engine by mixing it in, e.g.
+
+    .. code:: python
+
+        class AsyncBingImageCrawler(BingImageCrawler, AsyncCrawler):
+            pass
+
+    Requires the package ``aiohttp``.
+
+    Attributes:
+        limit_per_host (int): Max number of simultaneous connections to one
+            host, 0 means no limit.
+    """
+
+    def __init__(self, *args, limit_per_host=0, **kwargs):
+        if aiohttp is None:
+            raise ImportError(
+                'AsyncCrawler requires the package "aiohttp", execute "pip install aiohttp" to install it.'
+            )
+        self.limit_per_host = limit_per_host
+        super().__init__(*args, **kwargs)
+
+    def crawl(self, feeder_kwargs=None, parser_kwargs=None, downloader_kwargs=None, resume=False):
+        """Start crawling
+
+        This method will start the feeder threads and run the parser and
+        downloader coroutines until all the tasks are done.
+
+        Args:
+            feeder_kwargs (dict, optional): Arguments to be passed to ``feeder.start()``
+            parser_kwargs (dict, optional): Arguments to be passed to ``parser.start()``
+            downloader_kwargs (dict, optional): Arguments to be passed to
+                ``downloader.start()``
+            resume (bool): Not supported by this engine.
+        """
+        if resume or self.checkpoint is not None:
+            raise ValueError("checkpoints are not supported by AsyncCrawler")
+        if self.parser.process_num > 0 or self.downloader.process_num > 0:
+            raise ValueError("worker processes are not supported by AsyncCrawler")
+        if isinstance(self.downloader.in_queue, HostScheduler):
+            raise ValueError("schedulers are not supported by AsyncCrawler")
+        if isinstance(self.parser.in_queue, PriorityCachedQueue) or isinstance(
+            self.downloader.in_queue, PriorityCachedQueue
+        ):
+            raise ValueError("priority queues are not supported by AsyncCrawler")
+        self.signal.reset()
+        self.parser.out_queue.reopen()
+        self.logger.info("start crawling...")
+        for exporter in self.exporters:
+            exporter.start(self.metrics)
+        if self.profile is not None:
+            self.start_profiler()
+
+        feeder_kwargs = {} if feeder_kwargs is None else feeder_kwargs
+        parser_kwargs = {} if parser_kwargs is None else dict(parser_kwargs)
+        downloader_kwargs = {} if downloader_kwargs is None else dict(downloader_kwargs)
+
+        page_queue = self.parser.in_queue
+        try:
+            asyncio.run(self._crawl(feeder_kwargs, parser_kwargs, downloader_kwargs))
+        finally:
+            # the queue handing urls over to the loop is bound to the closed loop
+            self.feeder.out_queue = self.parser.in_queue = page_queue
+        self.parser.in_queue.flush()
+        self.parser.out_queue.flush()
+        self.storage.flush()
+        for exporter in self.exporters:
+            exporter.stop()
+        if self.profile is not None:
+            self.stop_profiler()
+
+        self.logger.info("Crawling task done!")
+
+    async def _crawl(self, feeder_kwargs, parser_kwargs, downloader_kwargs):
+        loop = asyncio.get_running_loop()
+        page_queue = asyncio.Queue()
+        task_queue = asyncio.Queue(5 * self.downloader.thread_num)
+        stop = asyncio.Event()
+        feeder_exited = asyncio.Event()
+        # coroutines putting back failed items, see _reschedule()
+        self._retries = set()
+
+        self.feeder.out_queue = _LoopQueue(loop, page_queue, dedup=self.parser.in_queue.dedup)
+        self.parser.in_queue = self.feeder.out_queue
+        self.downloader.clear_status()
+        self.downloader.set_file_idx_offset(downloader_kwargs.pop("file_idx_offset", 0))
+        self.downloader.max_num = downloader_kwargs.pop("max_num", 0)
+
+        self.logger.info("starting %d feeder threads...", self.feeder.thread_num)
+        self.feeder.start(**feeder_kwargs)
+        threading.Thread(target=self._wait_feeder, args=(loop, feeder_exited), daemon=True).start()
+
+        connector = aiohttp.TCPConnector(
+            limit=self.parser.thread_num + self.downloader.thread_num, limit_per_host=self.limit_per_host
+        )
+        async with aiohttp.ClientSession(connector=connector, headers=dict(self.session.headers)) as http:
+            self.logger.info("starting %d parser coroutines...", self.parser.thread_num)
+            parsers = [
+                asyncio.ensure_future(self._parser_worker(http, page_queue, task_queue, stop, **parser_kwargs))
+                for _ in range(self.parser.thread_num)
+            ]
+            self.logger.info("starting %d downloader coroutines...", self.downloader.thread_num)
+            downloaders = [
+                asyncio.ensure_future(self._downloader_worker(http, task_queue, stop, **downloader_kwargs))
+                for _ in range(self.downloader.thread_num)
+            ]
+
+            async def drain():
+                await feeder_exited.wait()
+                await page_queue.join()
+                self.signal.set(parser_exited=True)
+                await task_queue.join()
+
+            # the downloaders exit by themselves after max_idle_time
+            waiters = [
+                asyncio.ensure_future(drain()),
+                asyncio.ensure_future(stop.wait()),
+                asyncio.ensure_future(asyncio.wait(downloaders)),
+            ]
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            retries = list(self._retries)
+            for future in waiters + parsers + downloaders + retries:
+                future.cancel()
+            await asyncio.gather(*parsers, *downloaders, *retries, return_exceptions=True)
+        # the feeder threads still running get QueueClosed, they are waited
+        # for before the loop they hand the urls over to is closed
+        self.feeder.out_queue.close()
+        await feeder_exited.wait()
+
+    def _wait_feeder(self, loop, feeder_exited):
+        for worker in self.feeder.workers:
+            worker.join()
+        self.signal.set(feeder_exited=True)
+        try:
+            loop.call_soon_threadsafe(feeder_exited.set)
+        except RuntimeError:
+            # the loop is closed if the crawl failed
+            pass
+
+    def _should_stop(self):
+        return self.signal.reach_max_num or self.signal.exceed_storage_space
+
+    async def fetch(self, http, url, timeout, headers=None, cache=None, stream=False):
+        """Make a GET request and wrap the result as a ``requests.Response``
+
+        Args:
+            http (aiohttp.ClientSession): The http client.
+            url (str): The requested url.
+            timeout (float): Total timeout of the request.
+            headers (dict, optional): Extra headers.
+            cache (HTTPCache, optional): Serve the response from this cache
+                if it is fresh, revalidate it if it is stale, see
+                :class:`CachingAdapter`.
+            stream (bool): Whether to read the body from ``response.raw``
+                when it is used, instead of loading it. The response must be
+                closed then, and it is not cached.
+
+        Returns:
+            Response: a response which can be passed to the hooks written for
+            the threaded engine, with the body loaded unless streamed.
+        """
+        proxy = None
+        if self.proxy_pool is not None:
+            proxy = self.proxy_pool.get_next(protocol=url.split(":", 1)[0])
+        proxy_url = None if proxy is None else f"{proxy.protocol}://{proxy.addr}"
+        start = time.perf_counter()
+        entry = None if cache is None else cache.get(url)
+        if entry is not None:
+            if cache.is_fresh(entry):
+                cache.count("hit")
+                response = cached_response(entry, "hit")
+                response.elapsed = timedelta(seconds=time.perf_counter() - start)
+                return response
+            headers, cached_headers = dict(headers or {}), CaseInsensitiveDict(entry.headers)
+            if "ETag" in cached_headers:
+                headers["If-None-Match"] = cached_headers["ETag"]
+            if "Last-Modified" in cached_headers:
+                headers["If-Modified-Since"] = cached_headers["Last-Modified"]
+        self.session.retry_policy.on_request(url)
+        request = http.get(url, headers=headers, proxy=proxy_url, timeout=aiohttp.ClientTimeout(total=timeout))
+        try:
+            if stream:
+                resp = await request
+                content = None
+            else:
+                async with request as resp:
+                    content = await resp.read()
+        except Exception as e:
+            # raised as the errors of requests, which the retry policy classifies
+            error = _requests_error(e)
+            if error is None:
+                raise
+            raise error from e
+        if entry is not None and resp.status == 304:
+            cache.count("revalidated")
+            response = cached_response(cache.refresh(url, resp.headers) or entry, "revalidated")
+            response.elapsed = timedelta(seconds=time.perf_counter() - start)
+            return response
+        response = requests.Response()
+        response.status_code = resp.status
+        response.reason = resp.reason
+        response.url = str(resp.url)
+        response.headers = CaseInsensitiveDict(resp.headers)
+        response.encoding = resp.charset
+        if stream:
+            response.raw = _StreamRaw(asyncio.get_running_loop(), resp)
+            # the time to the headers, as with requests
+            response.elapsed = timedelta(seconds=time.perf_counter() - start)
+            if resp.status >= 400:
+                response.close()
+            response.raise_for_status()
+            return response
+        response._content = content
+        response._content_consumed = True
+        # the body is already read, so it is included
+        response.elapsed = timedelta(seconds=time.perf_counter() - start)
+        if cache is not None:
+            cache.count("miss")
+            if cache.is_cacheable(response) and cache.set(url, resp.status, resp.reason, resp.headers, content):
+                cache.count("stored")
+        response.raise_for_status()
+        return response
+
+    def _reschedule(self, queue, item, url, error, stage, max_attempts):
+        """Put a failed item back into an asyncio queue, if the retry policy
+        of the session decides to retry it.
+
+        The item is put after the delay by another coroutine, which also
+        marks the failed attempt as done, so that the queue is not joined
+        meanwhile.
+
+        Returns:
+            str: "retry" if the item is put back, the caller must not mark it
+            as done then, or why it is not, see :func:`RetryPolicy.decide`.
+        """
+        policy = self.session.retry_policy
+        delay, reason = policy.decide(url, error, max_attempts)
+        if delay is not None and self._should_stop():
+            policy.forget(url)
+            delay, reason = None, "closed"
+        logger = self.parser.logger if stage == "page" else self.downloader.logger
+        action = "fetching page" if stage == "page" else "downloading file"
+        if delay is None:
+            self.metrics.inc("retries_denied_total", stage=stage, reason=reason)
+            logger.error("Exception caught when %s %s, error: %s, not retried (%s)", action, url, error, reason)
+            return reason
+        self.metrics.inc("retries_total", stage=stage, host=urlsplit(url).hostname or "")
+        logger.error("Exception caught when %s %s, error: %s, retry in %.2f seconds", action, url, error, delay)
+
+        async def put_later():
+            try:
+                await asyncio.sleep(delay)
+                await queue.put(item)
+            finally:
+                queue.task_done()
+
+        future = asyncio.ensure_future(put_later())
+        self._retries.add(future)
+        future.add_done_callback(self._retries.discard)
+        return reason
+
+    async def _parser_worker(
+        self, http, page_queue, task_queue, stop, queue_timeout=2, req_timeout=5, max_retry=None, **kwargs
+    ):
+        loop = asyncio.get_running_loop()
+        while True:
+            url = await page_queue.get()
+            retried = False
+            try:
+                if not self._should_stop():
+                    retried = await self._parse_page(
+                        http, loop, page_queue, task_queue, url, req_timeout, max_retry, kwargs
+                    )
+            except Exception as e:
+                # the worker keeps running, and the url is marked as done
+                self.parser.logger.error("Exception caught when parsing page %s, error: %s", url, e)
+            finally:
+                if not retried:
+                    page_queue.task_done()
+            if self._should_stop():
+                stop.set()
+
+    async def _parse_page(self, http, loop, page_queue, task_queue, url, req_timeout, max_retry, kwargs):
+        host = urlsplit(url).hostname or ""
+        self.metrics.inc("requests_total", stage="page", host=host)
+        try:
+            base_url = "{0.scheme}://{0.netloc}".format(urlsplit(url))
+            response = await self.fetch(http, url, req_timeout, headers={"Referer": base_url}, cache=self.session.cache)
+        except Exception as e:
+            self.metrics.inc("errors_total", stage="page", host=host)
+            return self._reschedule(page_queue, url, url, e, "page", max_retry) == "retry"
+        self.session.retry_policy.forget(url)
+        self.metrics.observe("page_fetch_seconds", response.elapsed.total_seconds())
+        self.metrics.inc("bytes_total", len(response.content), stage="page")
+        if getattr(response, "from_cache", None):
+            self.metrics.inc("cache_hits_total", stage="page", result=response.from_cache)
+        self.parser.logger.info(f"parsing result page {url}")
+        task_list = await loop.run_in_executor(None, functools.partial(self._parse, response, **kwargs))
+        for task in task_list:
+            if self._should_stop():
+                break
+            if isinstance(task, dict):
+                if not self.parser.out_queue.is_duplicated(task):
+                    await task_queue.put(task)
+            elif isinstance(task, str):
+                # the url is fed back for GreedyCrawler
+                if not self.parser.in_queue.is_duplicated(task):
+                    page_queue.put_nowait(task)
+        return False
+
+    def _parse(self, response, **kwargs):
+        with self.metrics.timer("parse_seconds"):
+            task_list = self.parser.parse(response, **kwargs)
+            return [] if task_list is None else list(task_list)
+
+    async def _downloader_worker(
+        self,
+        http,
+        task_queue,
+        stop,
+        default_ext=None,
+        queue_timeout=5,
+        req_timeout=5,
+        max_idle_time=None,
+        max_retry=None,
+        overwrite=False,
+        **kwargs,
+    ):
+        loop = asyncio.get_running_loop()
+        downloader = self.downloader
+        if default_ext is None:
+            default_ext = inspect.signature(downloader.worker_exec).parameters["default_ext"].default
+        last_download_time = time.monotonic()
+        while True:
+            if max_idle_time is None:
+                task = await task_queue.get()
+            else:
+                idle_time = time.monotonic() - last_download_time
+                if idle_time > max_idle_time and downloader.fetched_num > 0:
+                    downloader.logger.info("no new images for %d seconds, a downloader coroutine exits", max_idle_time)
+                    return
+                try:
+                    task = await asyncio.wait_for(task_queue.get(), queue_timeout)
+                except asyncio.TimeoutError:
+                    continue
+            retried = False
+            try:
+                retried = await self._download(
+                    http, loop, task_queue, task, default_ext, req_timeout, max_retry, overwrite, **kwargs
+                )
+                if task["success"]:
+                    last_download_time = time.monotonic()
+                if not retried:
+                    downloader.process_meta(task)
+            except Exception as e:
+                downloader.logger.error("Exception caught when processing task %s, error: %s", task, e)
+            finally:
+                if not retried:
+                    task_queue.task_done()
+            if self._should_stop():
+                stop.set()
+
+    async def _download(self, http, loop, task_queue, task, default_ext, timeout, max_retry, overwrite, **kwargs):
+        downloader = self.downloader
+        task["success"] = False
+        task["filename"] = None
+        # the storage and the caches are blocking, they are used in the executor
+        if not overwrite and await loop.run_in_executor(None, downloader.skip_existing, task, default_ext):
+            return False
+        if self._should_stop():
+            return False
+        file_url = task["file_url"]
+        if downloader.negative_cache is not None and await loop.run_in_executor(
+            None, functools.partial(downloader.skip_known_bad, task, **kwargs)
+        ):
+            downloader.logger.info("skip known bad file %s", file_url)
+            self.metrics.inc("files_total", result="known_bad")
+            return False
+        host = urlsplit(file_url).hostname or ""
+        self.metrics.inc("requests_total", stage="file", host=host)
+        try:
+            response = await self.fetch(http, file_url, timeout, stream=True)
+            try:
+                save = loop.run_in_executor(
+                    None, functools.partial(downloader.save, task, response, default_ext, **kwargs)
+                )
+                try:
+                    await asyncio.shield(save)
+                except asyncio.CancelledError:
+                    # the file being written still reads the body from the loop
+                    await save
+                    raise
+            finally:
+                response.close()
+        except Exception as e:
+            self.metrics.inc("errors_total", stage="file", host=host)
+            # the task is copied as the current one is still processed
+            reason = self._reschedule(task_queue, dict(task), file_url, e, "file", max_retry)
+            if reason == "retry":
+                return True
+            self.metrics.inc("files_total", result="failed")
+            await loop.run_in_executor(None, downloader.remember_failure, file_url, e, reason)
+            return False
+        self.session.retry_policy.forget(file_url)
+        return False
@@ -13,6 +13,7 @@ __all__ = [
     "FlickrImageCrawler",
     "FlickrFeeder",
     "FlickrParser",
+    "FlickrSizeCache",
     "GoogleImageCrawler",
     "GoogleFeeder",
     "GoogleParser",
@@ -79,52 +79,25 @@ class BaiduFeeder(Feeder):
 
 
 class BaiduParser(Parser):
+    # the urls are encrypted by replacing some tokens, then some characters
+    tokens = (("_z2C$q", ":"), ("_z&e3B", "."), ("AzdH3F", "/"))
+    char_table = str.maketrans("wkv1ju2it3hs4g5rq6fp7eo8dn9cm0bla", "abcdefghijklmnopqrstuvw1234567890")
+    # joins the urls of a page, so that they are decoded at once
+    separator = "\n"
+
     def _decode_url(self, encrypted_url):
         url = encrypted_url
-        map1 = {"_z2C$q": ":", "_z&e3B": ".", "AzdH3F": "/"}
-        map2 = {
-            "w": "a",
-            "k": "b",
-            "v": "c",
-            "1": "d",
-            "j": "e",
-            "u": "f",
-            "2": "g",
-            "i": "h",
-            "t": "i",
-            "3": "j",
-            "h": "k",
-            "s": "l",
-            "4": "m",
-            "g": "n",
-            "5": "o",
-            "r": "p",
-            "q": "q",
-            "6": "r",
-            "f": "s",
-            "p": "t",
-            "7": "u",
-            "e": "v",
-            "o": "w",
-            "8": "1",
-            "d": "2",
-            "n": "3",
-            "9": "4",
-            "c": "5",
-            "m": "6",
-            "0": "7",
-            "b": "8",
-            "l": "9",
-            "a": "0",
-        }  # yapf: disable
-        for ciphertext, plaintext in map1.items():
+        for ciphertext, plaintext in self.tokens:
             url = url.replace(ciphertext, plaintext)
-        char_list = [char for char in url]
-        for i in range(len(char_list)):
-            if char_list[i] in map2:
-                char_list[i] = map2[char_list[i]]
-        url = "".join(char_list)
-        return url
+        return url.translate(self.char_table)
+
+    def _decode_urls(self, encrypted_urls):
+        """Decode a list of urls at once."""
+        if not encrypted_urls:
+            return []
+        if any(self.separator in url for url in encrypted_urls):
+            return [self._decode_url(url) for url in encrypted_urls]
+        return self._decode_url(self.separator.join(encrypted_urls)).split(self.separator)
 
     def parse(self, response):
         try:
@@ -133,13 +106,10 @@ class BaiduParser(Parser):
         except:
             self.logger.error("Fail to parse the response in json format")
             return
-        for item in content["data"]:
-            if "objURL" in item:
-                img_url = self._decode_url(item["objURL"])
-            elif "hoverURL" in item:
-                img_url = item["hoverURL"]
-            else:
-                continue
+        items = [item for item in content["data"] if "objURL" in item or "hoverURL" in item]
+        urls = iter(self._decode_urls([item["objURL"] for item in items if "objURL" in item]))
+        for item in items:
+            img_url = next(urls) if "objURL" in item else item["hoverURL"]
             yield dict(file_url=img_url)
 
 
@@ -158,6 +128,7 @@ class BaiduImageCrawler(Crawler):
         file_idx_offset=0,
         overwrite=False,
         max_idle_time=None,
+        resume=False,
     ):
         if offset + max_num > 1000:
             if offset > 1000:
@@ -180,4 +151,4 @@ class BaiduImageCrawler(Crawler):
             overwrite=overwrite,
             max_idle_time=max_idle_time,
         )
-        super().crawl(feeder_kwargs=feeder_kwargs, downloader_kwargs=downloader_kwargs)
+        super().crawl(feeder_kwargs=feeder_kwargs, downloader_kwargs=downloader_kwargs, resume=resume)
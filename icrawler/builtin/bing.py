@@ -2,9 +2,9 @@ import html
 import re
 
 import six
-from bs4 import BeautifulSoup
 
 from .. import Crawler, Feeder, ImageDownloader, Parser
+from .extract import find_all_by_class, html_tree
 from .filter import Filter
 
 
@@ -115,16 +115,18 @@ class BingFeeder(Feeder):
 
 
 class BingParser(Parser):
+    pattern = re.compile(r"murl\":\"(.*?)\.jpg")
+
     def parse(self, response):
-        soup = BeautifulSoup(response.content.decode("utf-8", "ignore"), "lxml")
-        image_divs = soup.find_all("div", class_="imgpt")
-        pattern = re.compile(r"murl\":\"(.*?)\.jpg")
-        for div in image_divs:
-            try:
-                href_str = html.unescape(div.a["m"])
-            except KeyError:
+        tree = html_tree(response.content)
+        if tree is None:
+            return
+        for div in find_all_by_class(tree, "div", "imgpt"):
+            a = next(div.iter("a"), None)
+            if a is None or a.get("m") is None:
                 continue
-            match = pattern.search(href_str)
+            href_str = html.unescape(a.get("m"))
+            match = self.pattern.search(href_str)
             if match:
                 name = match.group(1) if six.PY3 else match.group(1).encode("utf-8")
                 img_url = f"{name}.jpg"
@@ -146,6 +148,7 @@ class BingImageCrawler(Crawler):
         file_idx_offset=0,
         overwrite=False,
         max_idle_time=None,
+        resume=False,
     ):
         if offset + max_num > 1000:
             if offset > 1000:
@@ -168,4 +171,4 @@ class BingImageCrawler(Crawler):
             overwrite=overwrite,
             max_idle_time=max_idle_time,
         )
-        super().crawl(feeder_kwargs=feeder_kwargs, downloader_kwargs=downloader_kwargs)
+        super().crawl(feeder_kwargs=feeder_kwargs, downloader_kwargs=downloader_kwargs, resume=resume)
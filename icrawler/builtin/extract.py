@@ -0,0 +1,86 @@
+"""Extraction helpers of the builtin parsers
+
+The parsers used to build BeautifulSoup trees of the result pages, these
+helpers query plain lxml trees instead, which are built by the same lxml
+parser without the python objects of BeautifulSoup, and return the same
+elements and strings.
+"""
+
+import threading
+from typing import Dict, Tuple
+
+import lxml.html
+from lxml import etree
+
+# lxml locks a parser while it parses, each thread has its own so that
+# the pages are parsed concurrently
+_local = threading.local()
+
+
+def _html_parser():
+    parser = getattr(_local, "html_parser", None)
+    if parser is None:
+        parser = _local.html_parser = lxml.html.HTMLParser(encoding="utf-8")
+    return parser
+
+
+def html_tree(content):
+    """Parse an html page as ``BeautifulSoup(content, "lxml")`` does.
+
+    Args:
+        content (bytes or str): the page, bytes are decoded as utf-8 and
+            undecodable bytes are ignored.
+
+    Returns:
+        Element: the root of the tree, or None if the page is empty.
+    """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", "ignore")
+    try:
+        return etree.fromstring(content.encode("utf-8"), _html_parser())
+    except etree.XMLSyntaxError:
+        return None
+
+
+# compiled xpaths of find_all_by_class, by tag and class
+_class_xpaths: Dict[Tuple[str, str], etree.XPath] = {}
+
+
+def find_all_by_class(tree, tag, class_name):
+    """Find the elements with a class, as ``soup.find_all(tag, class_=class_name)``."""
+    key = (tag, class_name)
+    if key not in _class_xpaths:
+        _class_xpaths[key] = etree.XPath(
+            f"//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+        )
+    return _class_xpaths[key](tree)
+
+
+_find_with_href = etree.XPath("//*[@href]")
+
+
+def find_all_with_href(tree):
+    """Find the elements with a ``href``, as ``soup.find_all(href=True)``."""
+    return _find_with_href(tree)
+
+
+def _attr(value):
+    # the "minimal" formatter of BeautifulSoup
+    value = value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    return '"{}"'.format(value.replace('"', "&quot;"))
+
+
+def outer_html(element):
+    """Get the markup of an element without children, e.g. a script, as
+    ``str(tag)`` of BeautifulSoup."""
+    attrs = ""
+    for key, value in element.attrib.items():
+        if key == "class":
+            # a multi-valued attribute for BeautifulSoup
+            value = " ".join(value.split())
+        attrs += f" {key}={_attr(value)}"
+    return f"<{element.tag}{attrs}>{element.text or ''}</{element.tag}>"
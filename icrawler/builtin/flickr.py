@@ -2,10 +2,85 @@ import datetime
 import json
 import math
 import os
+import os.path as osp
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 from urllib.parse import urlencode
 
 from .. import Crawler, Feeder, ImageDownloader, Parser
 
+# lowercase labels of the sizes returned by flickr.photos.getSizes, from the
+# largest, and the extras of flickr.photos.search giving their urls
+SIZE_EXTRAS = {
+    "original": "url_o",
+    "large 2048": "url_k",
+    "large 1600": "url_h",
+    "large": "url_l",
+    "medium 800": "url_c",
+    "medium 640": "url_z",
+    "medium": "url_m",
+    "small 320": "url_n",
+    "small": "url_s",
+    "thumbnail": "url_t",
+    "large square": "url_q",
+    "square": "url_sq",
+}
+
+
+class FlickrSizeCache:
+    """Cache of the image sizes of Flickr photos, kept across runs.
+
+    The result of ``flickr.photos.getSizes`` of every photo is saved to a
+    SQLite database at ``<root_dir>/<namespace>.sqlite``, so that a photo
+    found again, e.g. when a crawl is resumed or repeated with other search
+    arguments, is not looked up again.
+
+    Args:
+        root_dir (str): Directory of the database.
+        namespace (str): Name of the database file.
+    """
+
+    def __init__(self, root_dir, namespace="flickr_sizes"):
+        os.makedirs(root_dir, exist_ok=True)
+        self.filepath = osp.join(root_dir, f"{namespace}.sqlite")
+        self._lock = Lock()
+        self._pid = None
+        self._connect()
+
+    def _connect(self):
+        # sqlite connections must not be shared with forked processes
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.filepath, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sizes (photo_id TEXT PRIMARY KEY, urls TEXT) WITHOUT ROWID")
+
+    def _execute(self, sql, params=()):
+        if self._pid != os.getpid():
+            self._connect()
+        return self._conn.execute(sql, params)
+
+    def get(self, photo_id):
+        """Get the urls of the sizes of a photo.
+
+        Returns:
+            dict or None: the urls by lowercase size labels, or None if the
+            photo is not cached.
+        """
+        with self._lock:
+            row = self._execute("SELECT urls FROM sizes WHERE photo_id = ?", (str(photo_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, photo_id, urls):
+        """Save the urls of the sizes of a photo."""
+        with self._lock:
+            self._execute("INSERT OR REPLACE INTO sizes VALUES (?, ?)", (str(photo_id), json.dumps(urls)))
+
+    def __len__(self):
+        with self._lock:
+            return self._execute("SELECT COUNT(*) FROM sizes").fetchone()[0]
+
 
 class FlickrFeeder(Feeder):
     def feed(self, apikey, max_num=4000, **kwargs):
@@ -64,45 +139,76 @@ class FlickrFeeder(Feeder):
         page = params.get("page", 1)
         page_max = int(math.ceil(4000.0 / per_page))
         for i in range(page, page + page_max):
-            if self.signal.get("reach_max_num"):
+            if self.signal.reach_max_num:
                 break
             complete_url = f"{url}&page={i}"
-            while True:
-                try:
-                    self.output(complete_url, block=True)
-                except:
-                    if self.signal.get("reach_max_num"):
-                        break
-                else:
-                    break
+            # blocks until there is room, QueueClosed stops the feeder
+            self.output(complete_url, block=True)
             self.logger.debug(f"put url to url_queue: {complete_url}")
 
 
 class FlickrParser(Parser):
-    def parse(self, response, apikey, size_preference=None):
+    """Parser of the results of ``flickr.photos.search``.
+
+    The url of a photo is taken from the ``url_*`` extras of the result when
+    one of the preferred sizes is there, otherwise the sizes are looked up
+    with ``flickr.photos.getSizes``, by ``size_workers`` concurrent requests
+    per page, and saved to ``size_cache`` if any.
+
+    Attributes:
+        size_cache (FlickrSizeCache): Cache of the looked up sizes, or None.
+    """
+
+    size_cache = None
+
+    def get_sizes(self, photo_id, apikey):
+        """Look up the sizes of a photo.
+
+        Returns:
+            dict or None: the urls by lowercase size labels, or None if the
+            lookup failed.
+        """
+        if self.size_cache is not None:
+            urls = self.size_cache.get(photo_id)
+            if urls is not None:
+                return urls
+        base_url = "https://api.flickr.com/services/rest/?"
+        params = {
+            "method": "flickr.photos.getSizes",
+            "api_key": apikey,
+            "photo_id": photo_id,
+            "format": "json",
+            "nojsoncallback": 1,
+        }
+        try:
+            ret = self.session.get(base_url + urlencode(params))
+            info = json.loads(ret.content.decode())
+        except Exception:
+            return None
+        if info.get("stat") != "ok":
+            return None
+        urls = {str(item["label"]).lower(): item["source"] for item in info["sizes"]["size"]}
+        if self.size_cache is not None:
+            self.size_cache.set(photo_id, urls)
+        return urls
+
+    def parse(self, response, apikey, size_preference=None, size_workers=8):
         content = json.loads(response.content.decode("utf-8", "ignore"))
         if content["stat"] != "ok":
             return
+        size_preference = [sz.lower() for sz in size_preference or SIZE_EXTRAS]
         photos = content["photos"]["photo"]
-        for photo in photos:
-            photo_id = photo["id"]
-            base_url = "https://api.flickr.com/services/rest/?"
-            params = {
-                "method": "flickr.photos.getSizes",
-                "api_key": apikey,
-                "photo_id": photo_id,
-                "format": "json",
-                "nojsoncallback": 1,
-            }
-            try:
-                ret = self.session.get(base_url + urlencode(params))
-                info = json.loads(ret.content.decode())
-            except:
-                continue
-            else:
-                if info["stat"] == "ok":
-                    urls = {str(item["label"]).lower(): item["source"] for item in info["sizes"]["size"]}
-                else:
+        extras = [[photo[SIZE_EXTRAS[sz]] for sz in size_preference if photo.get(SIZE_EXTRAS[sz])] for photo in photos]
+        pending = [photo["id"] for photo, urls in zip(photos, extras) if not urls]
+        with ThreadPoolExecutor(max(1, min(size_workers, len(pending))), f"{self.name}-sizes") as executor:
+            # the sizes are yielded in order, as soon as they are looked up
+            sizes = executor.map(self.get_sizes, pending, [apikey] * len(pending))
+            for photo, urls in zip(photos, extras):
+                if urls:
+                    yield dict(file_url=urls[0], meta=photo)
+                    continue
+                urls = next(sizes)
+                if urls is None:
                     continue
                 for sz in size_preference:
                     if sz in urls:
@@ -118,6 +224,7 @@ class FlickrImageCrawler(Crawler):
         parser_cls=FlickrParser,
         downloader_cls=ImageDownloader,
         *args,
+        size_cache=None,
         **kwargs,
     ):
         if apikey is None:
@@ -126,6 +233,19 @@ class FlickrImageCrawler(Crawler):
                 raise RuntimeError("apikey is not specified")
         self.apikey = apikey
         super().__init__(feeder_cls, parser_cls, downloader_cls, *args, **kwargs)
+        self.set_size_cache(size_cache)
+
+    def set_size_cache(self, size_cache=None):
+        """Cache the sizes of the photos looked up with getSizes across runs.
+
+        The cache is kept in ``<root_dir>/.icrawler`` of the storage unless
+        another directory is given, see :class:`FlickrSizeCache`.
+
+        Args:
+            size_cache (dict or FlickrSizeCache, optional): a cache or its
+                arguments.
+        """
+        self.parser.size_cache = self._build_state("size_cache", size_cache, FlickrSizeCache)
 
     def crawl(
         self,
@@ -136,35 +256,29 @@ class FlickrImageCrawler(Crawler):
         file_idx_offset=0,
         overwrite=False,
         max_idle_time=None,
+        resume=False,
+        size_workers=8,
         **kwargs,
     ):
         kwargs["apikey"] = self.apikey
 
-        default_order = [
-            "original",
-            "large 2048",
-            "large 1600",
-            "large",
-            "medium 800",
-            "medium 640",
-            "medium",
-            "small 320",
-            "small",
-            "thumbnail",
-            "large Square",
-            "square",
-        ]
         if size_preference is None:
-            size_preference = default_order
+            size_preference = list(SIZE_EXTRAS)
         elif isinstance(size_preference, str):
-            assert size_preference in default_order
+            assert size_preference.lower() in SIZE_EXTRAS
             size_preference = [size_preference]
         else:
             for sz in size_preference:
-                assert sz in default_order
+                assert sz.lower() in SIZE_EXTRAS
+        # the urls of the preferred sizes come with the search results
+        extras = [extra for extra in kwargs.get("extras", "").split(",") if extra]
+        for sz in size_preference:
+            if SIZE_EXTRAS[sz.lower()] not in extras:
+                extras.append(SIZE_EXTRAS[sz.lower()])
+        kwargs["extras"] = ",".join(extras)
         super().crawl(
             feeder_kwargs=kwargs,
-            parser_kwargs=dict(apikey=self.apikey, size_preference=size_preference),
+            parser_kwargs=dict(apikey=self.apikey, size_preference=size_preference, size_workers=size_workers),
             downloader_kwargs=dict(
                 max_num=max_num,
                 min_size=min_size,
@@ -173,4 +287,5 @@ class FlickrImageCrawler(Crawler):
                 overwrite=overwrite,
                 max_idle_time=max_idle_time,
             ),
+            resume=resume,
         )
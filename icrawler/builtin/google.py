@@ -3,9 +3,8 @@ import json
 import re
 from urllib.parse import urlencode
 
-from bs4 import BeautifulSoup
-
 from .. import Crawler, Feeder, ImageDownloader, Parser
+from .extract import html_tree, outer_html
 from .filter import Filter
 
 
@@ -142,27 +141,24 @@ class GoogleFeeder(Feeder):
 
 
 class GoogleParser(Parser):
+    pattern = re.compile(r"http[^\[]*?.(?:jpg|png|bmp)")
+    strict_pattern = re.compile(r"http[^\[]*?\.(?:jpg|png|bmp)")
+
     def parse(self, response):
-        soup = BeautifulSoup(response.content.decode("utf-8", "ignore"), "lxml")
-        # image_divs = soup.find_all('script')
-        image_divs = soup.find_all(name="script")
-        for div in image_divs:
-            # txt = div.text
-            txt = str(div)
-            # if not txt.startswith('AF_initDataCallback'):
-            # if "AF_initDataCallback" not in txt:
-            #     continue
-            # if "ds:0" in txt or "ds:1" not in txt:
-            #     continue
+        tree = html_tree(response.content)
+        if tree is None:
+            return
+        for script in tree.iter("script"):
+            txt = outer_html(script)
             # txt = re.sub(r"^AF_initDataCallback\({.*key: 'ds:(\d)'.+data:function\(\){return (.+)}}\);?$",
             #             "\\2", txt, 0, re.DOTALL)
             # meta = json.loads(txt)
             # data = meta[31][0][12][2]
             # uris = [img[1][3][0] for img in data if img[0] == 1]
 
-            uris = re.findall(r"http[^\[]*?.(?:jpg|png|bmp)", txt)
+            uris = self.pattern.findall(txt)
             if not uris:
-                uris = re.findall(r"http[^\[]*?\.(?:jpg|png|bmp)", txt)
+                uris = self.strict_pattern.findall(txt)
             uris = [bytes(uri, "utf-8").decode("unicode-escape") for uri in uris]
             if uris:
                 return [{"file_url": uri} for uri in uris]
@@ -186,6 +182,7 @@ class GoogleImageCrawler(Crawler):
         file_idx_offset=0,
         overwrite=False,
         max_idle_time=None,
+        resume=False,
     ):
         if offset + max_num > 1000:
             if offset > 1000:
@@ -209,4 +206,4 @@ class GoogleImageCrawler(Crawler):
             overwrite=overwrite,
             max_idle_time=max_idle_time,
         )
-        super().crawl(feeder_kwargs=feeder_kwargs, downloader_kwargs=downloader_kwargs)
+        super().crawl(feeder_kwargs=feeder_kwargs, downloader_kwargs=downloader_kwargs, resume=resume)
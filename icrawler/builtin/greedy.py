@@ -1,18 +1,16 @@
 import re
-import time
 from urllib.parse import urljoin, urlsplit
 
-from bs4 import BeautifulSoup
-
 from .. import Crawler, Feeder, ImageDownloader, Parser
+from .extract import find_all_with_href, html_tree
 
 
 class GreedyFeeder(Feeder):
     def feed(self, domains):
+        # the pages found are fed back by the parser, which keeps the url
+        # queue open until all of them are parsed
         for domain in domains:
             self.output(domain)
-        while not self.signal.get("reach_max_num"):
-            time.sleep(1)
 
 
 class GreedyParser(Parser):
@@ -27,19 +25,20 @@ class GreedyParser(Parser):
         return False
 
     def parse(self, response, domains):
-        soup = BeautifulSoup(response.content.decode("utf-8", "ignore"), "lxml")
-        tags = soup.find_all("img", src=True)
-        for tag in tags:
-            if re.match(self.pattern, tag["src"]):
-                if tag["src"].startswith("//"):
-                    img_url = "http:" + tag["src"]
+        tree = html_tree(response.content)
+        if tree is None:
+            return
+        for tag in tree.iter("img"):
+            src = tag.get("src")
+            if src is not None and self.pattern.match(src):
+                if src.startswith("//"):
+                    img_url = "http:" + src
                 else:
-                    img_url = tag["src"]
+                    img_url = src
                 yield dict(file_url=img_url)
-        tags = soup.find_all(href=True)
         base_url = "{0.scheme}://{0.netloc}".format(urlsplit(response.url))
-        for tag in tags:
-            href = tag["href"]
+        for tag in find_all_with_href(tree):
+            href = tag.get("href")
             # deal with urls start with '//' or '/' or '#'
             if len(href) < 2:
                 continue
@@ -52,7 +51,7 @@ class GreedyParser(Parser):
             else:
                 href = urljoin(base_url, href.rstrip("/"))
             # if it is a image url
-            if re.match(self.pattern, href):
+            if self.pattern.match(href):
                 yield dict(file_url=href)
             else:
                 # discard urls such as 'www.example.com/file.zip'
@@ -76,8 +75,13 @@ class GreedyImageCrawler(Crawler):
         self, feeder_cls=GreedyFeeder, parser_cls=GreedyParser, downloader_cls=ImageDownloader, *args, **kwargs
     ):
         super().__init__(feeder_cls, parser_cls, downloader_cls, *args, **kwargs)
+        # the parser puts the urls it finds into its own queue, which must
+        # not be bounded or the parser threads wait for themselves
+        self.parser.in_queue.resize(0)
 
-    def crawl(self, domains, max_num=0, min_size=None, max_size=None, file_idx_offset=0, max_idle_time=None):
+    def crawl(
+        self, domains, max_num=0, min_size=None, max_size=None, file_idx_offset=0, max_idle_time=None, resume=False
+    ):
         if isinstance(domains, str):
             domains = [domains]
         elif not isinstance(domains, list):
@@ -96,4 +100,5 @@ class GreedyImageCrawler(Crawler):
                 file_idx_offset=file_idx_offset,
                 max_idle_time=max_idle_time,
             ),
+            resume=resume,
         )
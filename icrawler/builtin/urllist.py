@@ -2,34 +2,43 @@ import queue
 import threading
 
 from .. import Crawler, ImageDownloader, Parser, UrlListFeeder
+from ..utils import QueueClosed
 
 
 class PseudoParser(Parser):
     def worker_exec(self, queue_timeout=2, **kwargs):
         while True:
-            if self.signal.get("reach_max_num"):
+            if self.retiring():
+                break
+            if self.signal.reach_max_num:
                 self.logger.info("downloaded image reached max num, thread %s" " exit", threading.current_thread().name)
                 break
-            if self.signal.get("exceed_storage_space"):
+            if self.signal.exceed_storage_space:
                 self.logger.info(
                     "downloaded image reached max storage space, thread %s" " exit", threading.current_thread().name
                 )
                 break
             try:
                 url = self.in_queue.get(timeout=queue_timeout)
+            except QueueClosed:
+                self.logger.info("no more page urls to parse, thread %s" " exit", threading.current_thread().name)
+                break
             except queue.Empty:
-                if self.signal.get("feeder_exited"):
-                    self.logger.info("no more page urls to parse, thread %s" " exit", threading.current_thread().name)
-                    break
-                else:
-                    self.logger.info("%s is waiting for new page urls", threading.current_thread().name)
-                    continue
+                self.logger.debug("%s is waiting for new page urls", threading.current_thread().name)
+                continue
             except Exception as e:
                 self.logger.error("exception caught in thread %s: %s", threading.current_thread().name, e)
                 continue
             else:
                 self.logger.debug(f"start downloading page {url}")
-            self.output({"file_url": url})
+            start = self.stats.begin()
+            try:
+                self.output({"file_url": url})
+            except QueueClosed:
+                break
+            finally:
+                self.stats.end(start)
+                self.in_queue.task_done()
 
 
 class UrlListCrawler(Crawler):
@@ -38,10 +47,11 @@ class UrlListCrawler(Crawler):
     ):
         super().__init__(feeder_cls, parser_cls, downloader_cls, *args, **kwargs)
 
-    def crawl(self, url_list, max_num=1000, file_idx_offset=0, overwrite=False, max_idle_time=None):
+    def crawl(self, url_list, max_num=1000, file_idx_offset=0, overwrite=False, max_idle_time=None, resume=False):
         super().crawl(
             feeder_kwargs=dict(url_list=url_list),
             downloader_kwargs=dict(
                 file_idx_offset=file_idx_offset, max_num=max_num, overwrite=overwrite, max_idle_time=max_idle_time
             ),
+            resume=resume,
         )
@@ -1,9 +1,11 @@
 """Crawler base class"""
 
+import inspect
 import logging
+import os.path as osp
 import sys
-import time
 from importlib import import_module
+from threading import Thread
 
 from . import defaults
 from . import storage as storage_package
@@ -11,7 +13,24 @@ from .downloader import Downloader
 from .feeder import Feeder
 from .parser import Parser
 from .storage import BaseStorage
-from .utils import ProxyPool, Session, Signal
+from .storage.base import STATE_DIR
+from .utils import (
+    Checkpoint,
+    ContentIndex,
+    HostScheduler,
+    HTTPCache,
+    NegativeCache,
+    PriorityCachedQueue,
+    ProxyPool,
+    RetryPolicy,
+    Session,
+    Signal,
+)
+from .utils import dedup as dedup_module
+from .utils.autoscale import AutoScaler
+from .utils.metrics import EXPORTERS, BaseExporter, Metrics
+from .utils.profiler import SamplingProfiler
+from .utils.thread_pool import get_mp_context, start_manager
 
 
 class Crawler:
@@ -40,6 +59,20 @@ class Crawler:
         extra_feeder_args=None,
         extra_parser_args=None,
         extra_downloader_args=None,
+        dedup=None,
+        checkpoint=None,
+        parser_processes=0,
+        downloader_processes=0,
+        connection=None,
+        scheduler=None,
+        content_index=None,
+        priority=None,
+        autoscale=None,
+        metrics=None,
+        profile=None,
+        retry=None,
+        negative_cache=None,
+        http_cache=None,
     ):
         """Init components with class names and other arguments.
 
@@ -52,6 +85,39 @@ class Crawler:
             downloader_threads: thread number used by downloader
             storage (dict or BaseStorage): storage backend configuration
             log_level: logging level for the logger
+            dedup (dict, optional): deduplication backend configuration of
+                the url and task queues, see :func:`set_dedup`
+            checkpoint (dict or Checkpoint, optional): where to journal the
+                crawl so that it can be resumed, see :func:`set_checkpoint`
+            parser_processes: number of parser processes, each running
+                ``parser_threads`` threads. 0 means running the threads in
+                the current process.
+            downloader_processes: number of downloader processes, each
+                running ``downloader_threads`` threads.
+            connection (dict, optional): connection pool configuration of
+                the session, see :func:`set_connection_pools`
+            scheduler (dict or HostScheduler, optional): per-host politeness
+                of the downloader, see :func:`set_scheduler`
+            content_index (dict or ContentIndex, optional): skip the files
+                duplicating downloaded ones, see :func:`set_content_index`
+            priority (dict, optional): the order of taking page urls and
+                download tasks, see :func:`set_priority`
+            autoscale (dict or bool, optional): resize the parser and
+                downloader threads during the crawl, ``True`` or the
+                arguments of :class:`AutoScaler`, e.g.
+                ``{"max_downloader_threads": 32}``. The thread numbers above
+                are the initial ones.
+            metrics (dict, optional): exporters of the metrics of the crawl,
+                see :func:`set_metrics`
+            profile (dict or bool, optional): profile the CPU time of the
+                crawl, see :func:`set_profile`
+            retry (dict or RetryPolicy, optional): when failed requests are
+                retried, see :func:`set_retry`
+            negative_cache (dict or NegativeCache, optional): skip the file
+                urls which failed or were rejected recently, see
+                :func:`set_negative_cache`
+            http_cache (dict or HTTPCache, optional): serve the result pages
+                from an on-disk cache, see :func:`set_http_cache`
         """
 
         self.set_logger(log_level)
@@ -70,6 +136,21 @@ class Crawler:
         )
         # connect all components
         self.feeder.connect(self.parser).connect(self.downloader)
+        self.parser.process_num = parser_processes
+        self.downloader.process_num = downloader_processes
+        self.manager = None
+        self.autoscale = {} if autoscale is True else autoscale or None
+        self.set_connection_pools(connection)
+        self.set_scheduler(scheduler)
+        self.set_priority(priority)
+        self.set_dedup(dedup)
+        self.set_checkpoint(checkpoint)
+        self.set_content_index(content_index)
+        self.set_metrics(metrics)
+        self.set_profile(profile)
+        self.set_retry(retry)
+        self.set_negative_cache(negative_cache)
+        self.set_http_cache(http_cache)
 
     def set_logger(self, log_level=logging.INFO):
         """Configure the logger with log_level."""
@@ -116,6 +197,314 @@ class Crawler:
         else:
             raise TypeError('"storage" must be a storage object or dict')
 
+    def set_scheduler(self, scheduler=None):
+        """Schedule the download tasks per host
+
+        The task queue is replaced by a :class:`HostScheduler`, which takes
+        tasks of different hosts in turn and limits the request rate and
+        the concurrency of every host, e.g.
+        ``{"rate": 2, "burst": 4, "concurrency": 4}``. Hosts responding with
+        "429 Too Many Requests" are paused as long as they ask.
+
+        Args:
+            scheduler (dict or HostScheduler, optional): a scheduler or its
+                arguments.
+        """
+        if scheduler is None:
+            return
+        elif isinstance(scheduler, dict):
+            scheduler = HostScheduler(**scheduler)
+        elif not isinstance(scheduler, HostScheduler):
+            raise TypeError('"scheduler" must be a HostScheduler object or dict')
+        scheduler.dedup = self.downloader.in_queue.dedup
+        self.parser.out_queue = self.downloader.in_queue = scheduler
+
+    def set_priority(self, priority=None):
+        """Take the page urls and the download tasks by priority
+
+        By default they are taken in the order they are found. The url
+        queue and the task queue can be replaced by a
+        :class:`PriorityCachedQueue` with a discipline each, e.g.
+        ``{"page": "depth", "task": "size"}``, which crawls the shallow
+        pages and downloads the largest images first, if the parser gives
+        the sizes of the images in their tasks (the builtin parsers do
+        not, see :func:`by_size`). A discipline is
+        ``"depth"``, ``"host"``, ``"size"`` or a function
+        ``score(item, depth)``, higher scores are taken first.
+
+        Args:
+            priority (dict, optional): disciplines of the ``"page"`` and
+                ``"task"`` queues.
+        """
+        if priority is None:
+            return
+        if not isinstance(priority, dict):
+            raise TypeError('"priority" must be a dict')
+        unknown = set(priority) - {"page", "task"}
+        if unknown:
+            raise ValueError(f"unknown queues {sorted(unknown)}, choose from page and task")
+        if "page" in priority:
+            queue = PriorityCachedQueue(self.parser.in_queue.maxsize, score=priority["page"])
+            queue.dedup = self.parser.in_queue.dedup
+            self.feeder.out_queue = self.parser.in_queue = queue
+        if "task" in priority:
+            if isinstance(self.downloader.in_queue, HostScheduler):
+                raise ValueError("the task queue cannot be both a scheduler and a priority queue")
+            queue = PriorityCachedQueue(self.downloader.in_queue.maxsize, score=priority["task"])
+            queue.dedup = self.downloader.in_queue.dedup
+            self.parser.out_queue = self.downloader.in_queue = queue
+
+    def set_dedup(self, dedup=None):
+        """Set deduplication backends for the url queue and the task queue
+
+        By default seen urls and tasks are kept in memory. For large crawls
+        or crawls that will be resumed, other backends in
+        :mod:`icrawler.utils.dedup` can be used, e.g.
+        ``{"backend": "SQLiteDedup"}``, which is kept in
+        ``<root_dir>/.icrawler`` of the storage unless another directory is
+        given. The url queue and the task queue get their own backend, with
+        the namespace ``"page"`` and ``"task"`` respectively.
+
+        Args:
+            dedup (dict, optional): backend name and its arguments.
+        """
+        if dedup is None:
+            return
+        if not isinstance(dedup, dict):
+            raise TypeError('"dedup" must be a dict')
+        kwargs = dedup.copy()
+        backend = kwargs.pop("backend", "MemoryDedup")
+        try:
+            backend_cls = getattr(dedup_module, backend)
+        except AttributeError:
+            self.logger.error("cannot find dedup backend %s", backend)
+            sys.exit()
+        self.parser.in_queue.dedup = self._build_state("dedup", kwargs, backend_cls, namespace="page")
+        self.downloader.in_queue.dedup = self._build_state("dedup", kwargs, backend_cls, namespace="task")
+
+    def set_checkpoint(self, checkpoint=None):
+        """Set the checkpoint journal used to resume crawls
+
+        Once set, the url queue and the task queue are journaled during
+        crawling, and ``crawl(resume=True)`` continues from where the last
+        crawl stopped. The journal decides which urls and tasks have been
+        seen when resuming, so in-memory deduplication backends should be
+        used with it. The journal is kept in ``<root_dir>/.icrawler`` of the
+        storage unless another directory is given.
+
+        Args:
+            checkpoint (dict or Checkpoint, optional): a :class:`Checkpoint`
+                or its arguments, e.g. ``{"interval": 5}``.
+        """
+        self.checkpoint = self._build_state("checkpoint", checkpoint, Checkpoint)
+        if self.checkpoint is None:
+            return
+        self.checkpoint.signal = self.signal
+        self.checkpoint.downloader = self.downloader
+        for name, in_queue in (("page", self.parser.in_queue), ("task", self.downloader.in_queue)):
+            in_queue.journal = self.checkpoint
+            in_queue.journal_name = name
+
+    def _build_state(self, name, value, cls, **kwargs):
+        """Build an object keeping crawl state, e.g. a cache, from its
+        arguments, in the state directory of the storage by default if its
+        class requires a ``root_dir``.
+
+        Args:
+            name (str): name of the argument, for the error message.
+            value (dict or cls, optional): the object or its arguments.
+            cls (type): class of the object.
+            **kwargs: other arguments of the class.
+
+        Returns:
+            cls or None: the object.
+        """
+        if value is None or isinstance(value, cls):
+            return value
+        if not isinstance(value, dict):
+            raise TypeError(f'"{name}" must be a {cls.__name__} object or dict')
+        kwargs.update(value)
+        root_dir = inspect.signature(cls).parameters.get("root_dir")
+        if "root_dir" not in kwargs and root_dir is not None and root_dir.default is root_dir.empty:
+            kwargs["root_dir"] = osp.join(getattr(self.storage, "root_dir", "."), STATE_DIR)
+        return cls(**kwargs)
+
+    def set_content_index(self, content_index=None):
+        """Index the downloaded files by their content
+
+        Files with the same body as a downloaded one, e.g. the same image
+        hosted at several urls, are not written again, and with
+        ``{"perceptual": True}`` neither are the images resized or compressed
+        again. The url of every file is mapped to the file it is stored as,
+        see :class:`ContentIndex`. The index is kept in
+        ``<root_dir>/.icrawler`` of the storage unless another directory is
+        given.
+
+        Args:
+            content_index (dict or ContentIndex, optional): an index or its
+                arguments.
+        """
+        self.downloader.content_index = self._build_state("content_index", content_index, ContentIndex)
+
+    def set_negative_cache(self, negative_cache=None):
+        """Remember the file urls which failed or were rejected
+
+        The urls which were missing, failed after the retries, were not
+        images or were rejected by ``keep_file`` are not requested again by
+        later crawls, until their failures expire, see
+        :class:`NegativeCache`. Images rejected by their size are requested
+        again if the size limits of the crawl accept them. The cache is kept
+        in ``<root_dir>/.icrawler`` of the storage unless another directory
+        is given.
+
+        Args:
+            negative_cache (dict or NegativeCache, optional): a cache or its
+                arguments, e.g. ``{"ttls": {"error": 3600}}``.
+        """
+        self.downloader.negative_cache = self._build_state("negative_cache", negative_cache, NegativeCache)
+
+    def set_http_cache(self, http_cache=None):
+        """Cache the result pages on disk
+
+        Pages are served from the cache while they are fresh, and stale ones
+        are revalidated with conditional requests, see :class:`HTTPCache`.
+        Search pages are rarely cacheable by their headers, ``force_ttl``
+        keeps them for a fixed time, so that crawling the same keywords
+        again, e.g. while working on a parser, does not request them again.
+        Files are not cached. The cache is kept in ``<root_dir>/.icrawler``
+        of the storage unless another directory is given.
+
+        Args:
+            http_cache (dict or HTTPCache, optional): a cache or its
+                arguments, e.g. ``{"force_ttl": 3600, "max_size": 2**30}``.
+        """
+        self.session.set_cache(self._build_state("http_cache", http_cache, HTTPCache))
+
+    def set_metrics(self, metrics=None):
+        """Export the metrics of the crawl
+
+        The feeder, the parser and the downloader share a :class:`Metrics`
+        registry, ``self.metrics``, which counts the requests, errors, bytes
+        and files and times every stage of the pipeline. It can be exported
+        during the crawl by exporters started with :func:`crawl`, e.g.
+        ``{"prometheus": {"port": 9100}, "jsonl": {"path": "metrics.jsonl"}}``.
+        The exporters are ``"prometheus"``, ``"jsonl"`` and ``"callback"``,
+        see :mod:`icrawler.utils.metrics`. They are not supported with worker
+        processes, whose metrics are recorded in the processes.
+
+        Args:
+            metrics (dict or list, optional): exporter names and their
+                arguments, or a list of :class:`BaseExporter` objects.
+        """
+        self.metrics = Metrics()
+        for component in (self.feeder, self.parser, self.downloader):
+            component.metrics = self.metrics
+        # the queues are looked up when exporting as they may be replaced
+        self.metrics.gauge("queue_size", lambda: self.parser.in_queue.qsize(), queue="page")
+        self.metrics.gauge("queue_size", lambda: self.downloader.in_queue.qsize(), queue="task")
+        for component in (self.feeder, self.parser, self.downloader):
+            self.metrics.gauge("threads", lambda c=component: c.thread_num, pool=component.name)
+        if metrics is None:
+            self.exporters = []
+        elif isinstance(metrics, dict):
+            self.exporters = []
+            for name, kwargs in metrics.items():
+                if name not in EXPORTERS:
+                    raise ValueError(f'unknown metrics exporter "{name}", choose from {sorted(EXPORTERS)}')
+                self.exporters.append(EXPORTERS[name](**kwargs))
+        elif isinstance(metrics, (list, tuple)) and all(isinstance(e, BaseExporter) for e in metrics):
+            self.exporters = list(metrics)
+        else:
+            raise TypeError('"metrics" must be a dict or a list of exporters')
+
+    def set_profile(self, profile=None):
+        """Profile the CPU time of the crawls
+
+        The threads of the crawl are sampled by a :class:`SamplingProfiler`,
+        which attributes their CPU time to the feeder, parser and downloader
+        stages and to the hooks, ``feed``, ``parse``, ``keep_file``,
+        ``get_filename``, ``process_meta``, the writes of the storage and
+        the deduplication of the queues. A report is logged after every
+        crawl, and with a ``path``, e.g.
+        ``{"path": "crawl.folded", "interval": 0.005}``, the samples are
+        written as collapsed stacks for flamegraphs. The profiler of the
+        last crawl is kept as ``self.profiler``.
+
+        Args:
+            profile (dict or bool, optional): ``True`` or the arguments of
+                :class:`SamplingProfiler`.
+        """
+        if profile is None or profile is False:
+            self.profile = None
+        elif profile is True:
+            self.profile = {}
+        elif isinstance(profile, dict):
+            self.profile = dict(profile)
+        else:
+            raise TypeError('"profile" must be a dict or bool')
+        self.profiler = None
+
+    def start_profiler(self):
+        """Start sampling the threads of a crawl, see :func:`set_profile`."""
+        self.profiler = SamplingProfiler(**self.profile)
+        self.profiler.add_hooks(self.feeder, "feed", stage="feeder")
+        self.profiler.add_hooks(self.parser, "parse", stage="parser")
+        self.profiler.add_hooks(
+            self.downloader, "keep_file", "get_filename", "process_meta", "save", stage="downloader"
+        )
+        self.profiler.add_hooks(self.storage, "write", "write_chunks")
+        self.profiler.add_hooks(self.parser.in_queue, "is_duplicated")
+        self.profiler.add_hooks(self.downloader.in_queue, "is_duplicated")
+        self.profiler.start()
+
+    def stop_profiler(self):
+        self.profiler.stop()
+        self.logger.info("profile of the crawl\n%s", self.profiler.report())
+        if self.profiler.path is not None:
+            self.logger.info("collapsed stacks written to %s", self.profiler.path)
+
+    def resume_checkpoint(self, resume, downloader_kwargs):
+        """Open the checkpoint journal and restore the state of the last crawl
+
+        Args:
+            resume (bool): whether to restore the state.
+            downloader_kwargs (dict): arguments of ``downloader.start()``,
+                the file index offset and fetched number are updated in place.
+        """
+        self.downloader.set_file_idx_offset(downloader_kwargs.get("file_idx_offset", 0))
+        state = self.checkpoint.open(resume, self.downloader.file_idx_offset)
+        downloader_kwargs["file_idx_offset"] = self.checkpoint.file_idx_offset
+        downloader_kwargs["fetched_num"] = self.checkpoint.fetched_num
+        if state is None:
+            return
+        for name, in_queue in (("page", self.parser.in_queue), ("task", self.downloader.in_queue)):
+            for fp in state["seen"].get(name, ()):
+                in_queue.dedup.add(bytes.fromhex(fp))
+            in_queue.restore(state["pending"].get(name, []), state["depths"].get(name))
+        self.logger.info(
+            "resume crawling with %d page urls and %d tasks left, %d files fetched",
+            len(state["pending"].get("page", [])),
+            len(state["pending"].get("task", [])),
+            self.checkpoint.fetched_num,
+        )
+
+    def share_state(self):
+        """Share the queues and the signal with worker processes
+
+        The url queue and the task queue (with their deduplication backends)
+        are moved to a manager process and replaced by proxies, and the
+        signals are moved to shared memory. It is done once, so the state is
+        kept between crawls like in threads.
+        """
+        if self.manager is not None:
+            return
+        for pool in (self.parser, self.downloader):
+            pool.in_queue.maxsize *= max(1, pool.process_num)
+        self.manager = start_manager(page_queue=self.parser.in_queue, task_queue=self.downloader.in_queue)
+        self.signal.share(get_mp_context())
+        self.feeder.out_queue = self.parser.in_queue = self.manager.page_queue()
+        self.parser.out_queue = self.downloader.in_queue = self.manager.task_queue()
+
     def set_proxy_pool(self, pool=None):
         """Construct a proxy pool
 
@@ -141,42 +530,145 @@ class Crawler:
         self.session = Session(self.proxy_pool)
         self.session.headers.update(headers)
 
-    def crawl(self, feeder_kwargs=None, parser_kwargs=None, downloader_kwargs=None):
+    def set_retry(self, retry=None):
+        """Set the retry policy of the session
+
+        Failed requests of pages and files are classified, requests which
+        may succeed later, e.g. timeouts or "503 Service Unavailable", are
+        retried after a backoff or their ``Retry-After``, while the others,
+        e.g. "404 Not Found", are not. Retries are limited by a budget of
+        all hosts and one of every host, so that a dead host does not get
+        several requests per url. Failed pages and tasks are put back into
+        their queues instead of keeping the threads waiting.
+
+        Args:
+            retry (dict or RetryPolicy, optional): a policy or the arguments
+                of :class:`RetryPolicy`, e.g. ``{"max_attempts": 5,
+                "host_budget_ratio": 0.5}``.
+        """
+        if retry is None:
+            retry = RetryPolicy()
+        elif isinstance(retry, dict):
+            retry = RetryPolicy(**retry)
+        elif not isinstance(retry, RetryPolicy):
+            raise TypeError('"retry" must be a RetryPolicy object or dict')
+        self.session.retry_policy = retry
+
+    def set_connection_pools(self, connection=None):
+        """Size the connection pools of the session
+
+        All the threads share the session, so by default it keeps as many
+        connections per host as there are threads, and the pools of as many
+        hosts, so that connections are reused instead of being set up again.
+        With autoscaling, the pools are sized for the max numbers of parser
+        and downloader threads.
+
+        Args:
+            connection (dict, optional): arguments of
+                :func:`Session.configure_pools`, e.g.
+                ``{"host_limits": {"i.example.com": 8}, "http2": True}``.
+        """
+        kwargs = {} if connection is None else dict(connection)
+        parser_num, downloader_num = self.parser.thread_num, self.downloader.thread_num
+        if self.autoscale is not None:
+            bounds = inspect.signature(AutoScaler).parameters
+            parser_num = max(parser_num, self.autoscale.get("max_parser_threads", bounds["max_parser_threads"].default))
+            downloader_num = max(
+                downloader_num, self.autoscale.get("max_downloader_threads", bounds["max_downloader_threads"].default)
+            )
+        thread_num = self.feeder.thread_num + parser_num + downloader_num
+        kwargs.setdefault("pool_maxsize", max(10, thread_num))
+        kwargs.setdefault("pool_connections", max(10, thread_num))
+        self.session.configure_pools(**kwargs)
+
+    def finish_stage(self, component, signal_name, queue):
+        """Wait for the workers of a component, then finish its output queue
+
+        Args:
+            component (ThreadPool): the feeder or the parser.
+            signal_name (str): the signal set when the workers have exited.
+            queue (CachedQueue): the output queue of the component.
+        """
+        component.join()
+        self.signal.set(**{signal_name: True})
+        queue.finish()
+
+    def crawl(self, feeder_kwargs=None, parser_kwargs=None, downloader_kwargs=None, resume=False):
         """Start crawling
 
         This method will start feeder, parser and download and wait
-        until all threads exit.
+        until all threads exit. Completion is propagated through the queues:
+        when all the feeder threads exit, the url queue is closed as soon as
+        all its urls are parsed, and when all the parser threads exit, the
+        task queue is closed as soon as all its tasks are downloaded.
 
         Args:
             feeder_kwargs (dict, optional): Arguments to be passed to ``feeder.start()``
             parser_kwargs (dict, optional): Arguments to be passed to ``parser.start()``
             downloader_kwargs (dict, optional): Arguments to be passed to
                 ``downloader.start()``
+            resume (bool): Whether to continue the last crawl journaled by
+                the checkpoint.
         """
+        if resume and self.checkpoint is None:
+            raise ValueError('"resume" requires a checkpoint, see Crawler.set_checkpoint()')
+        if self.parser.process_num > 0 or self.downloader.process_num > 0:
+            if self.checkpoint is not None:
+                raise ValueError("checkpoints are not supported with worker processes")
+            if self.autoscale is not None:
+                raise ValueError("autoscaling is not supported with worker processes")
+            if self.profile is not None:
+                raise ValueError("profiling is not supported with worker processes")
+            if self.exporters:
+                raise ValueError("metrics exporters are not supported with worker processes")
+            self.share_state()
         self.signal.reset()
+        self.parser.in_queue.reopen()
+        self.downloader.in_queue.reopen()
         self.logger.info("start crawling...")
+        if self.profile is not None:
+            self.start_profiler()
 
         feeder_kwargs = {} if feeder_kwargs is None else feeder_kwargs
         parser_kwargs = {} if parser_kwargs is None else parser_kwargs
-        downloader_kwargs = {} if downloader_kwargs is None else downloader_kwargs
+        downloader_kwargs = {} if downloader_kwargs is None else dict(downloader_kwargs)
+        if self.checkpoint is not None:
+            self.resume_checkpoint(resume, downloader_kwargs)
 
-        self.logger.info("starting %d feeder threads...", self.feeder.thread_num)
-        self.feeder.start(**feeder_kwargs)
+        # worker processes are forked before the feeder threads start
+        self.logger.info(
+            "starting %d downloader threads...", self.downloader.thread_num * max(1, self.downloader.process_num)
+        )
+        self.downloader.start(**downloader_kwargs)
 
-        self.logger.info("starting %d parser threads...", self.parser.thread_num)
+        self.logger.info("starting %d parser threads...", self.parser.thread_num * max(1, self.parser.process_num))
         self.parser.start(**parser_kwargs)
+        for exporter in self.exporters:
+            exporter.start(self.metrics)
 
-        self.logger.info("starting %d downloader threads...", self.downloader.thread_num)
-        self.downloader.start(**downloader_kwargs)
+        self.logger.info("starting %d feeder threads...", self.feeder.thread_num)
+        self.feeder.start(**feeder_kwargs)
 
-        while True:
-            if not self.feeder.is_alive():
-                self.signal.set(feeder_exited=True)
-            if not self.parser.is_alive():
-                self.signal.set(parser_exited=True)
-            if not self.downloader.is_alive():
-                break
-            time.sleep(1)
+        watchers = [
+            Thread(target=self.finish_stage, args=(self.feeder, "feeder_exited", self.parser.in_queue), daemon=True),
+            Thread(
+                target=self.finish_stage, args=(self.parser, "parser_exited", self.downloader.in_queue), daemon=True
+            ),
+        ]
+        if self.autoscale is not None:
+            watchers.append(AutoScaler(self.parser, self.downloader, **self.autoscale))
+        for watcher in watchers:
+            watcher.start()
+        self.downloader.join()
+        if self.autoscale is not None:
+            watchers[-1].stop()
+        # stop the feeder and the parser if the downloader stopped early
+        self.parser.in_queue.close()
+        self.downloader.in_queue.close()
+        self.parser.join()
+        self.feeder.join()
+        for watcher in watchers:
+            watcher.join()
 
         if not self.feeder.in_queue.empty():
             self.feeder.clear_buffer()
@@ -184,5 +676,30 @@ class Crawler:
             self.parser.clear_buffer()
         if not self.downloader.in_queue.empty():
             self.downloader.clear_buffer(True)
+        self.parser.in_queue.flush()
+        self.downloader.in_queue.flush()
+        self.storage.flush()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+        for exporter in self.exporters:
+            exporter.stop()
+        if self.profile is not None:
+            self.stop_profiler()
 
+        if self.manager is None:
+            stats = self.session.connection_stats()
+            self.logger.info("%d requests sent over %d connections", stats["requests"], stats["connections"])
+        else:
+            self.logger.info("connection statistics are not collected from worker processes")
         self.logger.info("Crawling task done!")
+
+    def close(self):
+        """Release the resources kept between crawls
+
+        The manager process sharing the queues with worker processes, if
+        any, is shut down and the connections of the session are closed.
+        The crawler cannot crawl again afterwards.
+        """
+        if self.manager is not None:
+            self.manager.shutdown()
+        self.session.close()
@@ -1,13 +1,89 @@
 import errno
+import hashlib
+import os.path as osp
 import queue
+import tempfile
 import time
+from functools import partial
 from io import BytesIO
 from threading import current_thread
 from urllib.parse import urlparse
 
 from PIL import Image
 
-from .utils import ThreadPool
+from .utils import QueueClosed, ThreadPool, probe_image
+from .utils.image_probe import FORMAT_EXTENSIONS, image_signature
+from .utils.scheduler import retry_after
+from .utils.thread_pool import get_mp_context
+
+CHUNK_SIZE = 64 * 1024
+# bodies hashed for the content index are kept in memory up to this size
+_SPOOL_SIZE = 2**20
+
+
+class _PeekableRaw:
+    """Wrapper of ``response.raw`` which replays the bytes already peeked.
+
+    It makes :func:`Downloader.peek_content` transparent to later readers of
+    the response, such as ``response.content`` or ``response.iter_content()``.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.head = b""
+
+    def peek(self, size):
+        if len(self.head) < size:
+            # joined once, as concatenating every chunk copies the head again
+            chunks = [self.head]
+            received = len(self.head)
+            while received < size:
+                chunk = self._raw.read(size - received, decode_content=True)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                received += len(chunk)
+            self.head = b"".join(chunks)
+        return self.head[:size]
+
+    def read(self, amt=None, decode_content=None):
+        head, self.head = self.head, b""
+        if amt is not None and len(head) >= amt:
+            self.head = head[amt:]
+            return head[:amt]
+        rest = self._raw.read(None if amt is None else amt - len(head), decode_content=True)
+        return head + rest
+
+    def stream(self, amt=CHUNK_SIZE, decode_content=None):
+        head, self.head = self.head, b""
+        if head:
+            yield head
+        yield from self._raw.stream(amt, decode_content=True)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class _MeteredChunks:
+    """Iterator over the chunks of a body, counting the bytes and the time
+    spent receiving them."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self.size = 0
+        self.elapsed = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            chunk = next(self._chunks)
+        finally:
+            self.elapsed += time.perf_counter() - start
+        self.size += len(chunk)
+        return chunk
 
 
 class Downloader(ThreadPool):
@@ -26,6 +102,12 @@ class Downloader(ThreadPool):
         thread_num (int): The number of downloader threads.
         lock (Lock): A threading.Lock object.
         storage (BaseStorage): storage backend.
+        fetched_num (int): The number of files fetched, kept as a counter
+            of ``signal`` so that it is shared by all worker processes.
+        content_index (ContentIndex): If set, files whose content has been
+            downloaded from other urls are not written again.
+        negative_cache (NegativeCache): If set, file urls which failed or
+            were rejected recently are not requested again.
     """
 
     def __init__(self, thread_num, signal, session, storage):
@@ -35,8 +117,18 @@ class Downloader(ThreadPool):
         self.session = session
         self.storage = storage
         self.file_idx_offset = 0
+        self.content_index = None
+        self.negative_cache = None
         self.clear_status()
 
+    @property
+    def fetched_num(self):
+        return self.signal.fetched_num
+
+    @fetched_num.setter
+    def fetched_num(self, value):
+        self.signal.set(fetched_num=value)
+
     def clear_status(self):
         """Reset fetched_num to 0."""
         self.fetched_num = 0
@@ -82,7 +174,7 @@ class Downloader(ThreadPool):
         Returns:
             bool: if downloaded images reached max num.
         """
-        if self.signal.get("reach_max_num"):
+        if self.signal.reach_max_num:
             return True
         if self.max_num > 0 and self.fetched_num >= self.max_num:
             return True
@@ -92,67 +184,260 @@ class Downloader(ThreadPool):
     def keep_file(self, task, response, **kwargs):
         return True
 
-    def download(self, task, default_ext, timeout=5, max_retry=3, overwrite=False, **kwargs):
+    def peek_content(self, response, size):
+        """Get the first bytes of a response body.
+
+        Files are requested with ``stream=True``, so :func:`keep_file` can
+        make the decision with only the head of the file. The peeked bytes
+        are not lost, ``response.content`` and ``response.iter_content()``
+        still return the full body.
+
+        Args:
+            response (Response): response of requests.
+            size (int): number of bytes wanted.
+
+        Returns:
+            bytes: the first ``size`` bytes, or the whole body if it is
+            shorter than that.
+        """
+        if response._content is not False:
+            return response.content[:size]
+        if not isinstance(response.raw, _PeekableRaw):
+            response.raw = _PeekableRaw(response.raw)
+        return response.raw.peek(size)
+
+    def download(self, task, default_ext, timeout=5, max_retry=None, overwrite=False, **kwargs):
         """Download the image and save it to the corresponding path.
 
+        A failed download is not retried at once, the task is put back into
+        ``in_queue`` to be taken again later, as the retry policy of the
+        session decides, see :class:`RetryPolicy`.
+
         Args:
             task (dict): The task dict got from ``task_queue``.
             timeout (int): Timeout of making requests for downloading images.
-            max_retry (int): the max retry times if the request fails.
+            max_retry (int, optional): the max attempts of a file, the
+                ``max_attempts`` of the retry policy if None.
             **kwargs: reserved arguments for overriding.
+
+        Returns:
+            bool: whether the task is put back to be retried.
         """
         file_url = task["file_url"]
         task["success"] = False
         task["filename"] = None
-        retry = max_retry
 
-        if not overwrite:
-            with self.lock:
-                self.fetched_num += 1
-                filename = self.get_filename(task, default_ext)
-                if self.storage.exists(filename):
-                    self.logger.info("skip downloading file %s", filename)
-                    return
-                self.fetched_num -= 1
-
-        while retry > 0 and not self.signal.get("reach_max_num") and not self.signal.get("exceed_storage_space"):
-            try:
-                response = self.session.get(file_url, timeout=timeout)
-            except Exception as e:
+        if not overwrite and self.skip_existing(task, default_ext):
+            return False
+        if self.signal.reach_max_num or self.signal.exceed_storage_space:
+            return False
+        if self.negative_cache is not None and self.skip_known_bad(task, **kwargs):
+            self.logger.info("skip known bad file %s", file_url)
+            self.metrics.inc("files_total", result="known_bad")
+            return False
+
+        host = urlparse(file_url).hostname or ""
+        policy = self.session.retry_policy
+        try:
+            self.metrics.inc("requests_total", stage="file", host=host)
+            with self.session.get(file_url, timeout=timeout, stream=True, retry=False) as response:
+                self.save(task, response, default_ext, **kwargs)
+        except Exception as e:
+            self.stats.error()
+            self.metrics.inc("errors_total", stage="file", host=host)
+            response = getattr(e, "response", None)
+            if response is not None and response.status_code == 429 and hasattr(self.in_queue, "backoff"):
+                self.in_queue.backoff(task, retry_after(response))
+            # the task is copied as the current one is still processed
+            delay, reason = self.reschedule(dict(task), file_url, e, policy, "file", max_retry)
+            if delay is None:
                 self.logger.error(
-                    "Exception caught when downloading file %s, " "error: %s, remaining retry times: %d",
-                    file_url,
-                    e,
-                    retry - 1,
+                    "Exception caught when downloading file %s, error: %s, not retried (%s)", file_url, e, reason
                 )
-            else:
-                if self.reach_max_num():
-                    self.signal.set(reach_max_num=True)
-                    break
-                elif 200 <= response.status_code < 300:
-                    self.logger.error("Response status code %d, file %s", response.status_code, file_url)
-                    break
-                elif not self.keep_file(task, response, **kwargs):
-                    break
-                with self.lock:
-                    self.fetched_num += 1
-                    filename = self.get_filename(task, default_ext)
-                self.logger.info("image #%s\t%s %s", self.fetched_num, filename, file_url)
+                self.metrics.inc("files_total", result="failed")
+                self.remember_failure(file_url, e, reason)
+                return False
+            self.logger.error(
+                "Exception caught when downloading file %s, error: %s, retry in %.2f seconds", file_url, e, delay
+            )
+            return True
+        policy.forget(file_url)
+        return False
+
+    def skip_known_bad(self, task, **kwargs):
+        """Check whether the file url failed or was rejected recently, see
+        :class:`NegativeCache`.
+
+        Args:
+            task (dict): The task dict got from ``task_queue``.
+            **kwargs: Arguments of :func:`keep_file`, which may be used to
+                check a rejected file again without requesting it.
 
-                task["success"] = False
+        Returns:
+            bool: whether the download should be skipped.
+        """
+        return self.negative_cache.get(task["file_url"]) is not None
+
+    def remember_failure(self, url, error, reason):
+        """Record a request given up to the negative cache, if any.
+
+        Only the urls which failed for good, or as many times as allowed,
+        are recorded. Retries denied by the budgets or a long
+        ``Retry-After`` tell nothing about the url itself.
+
+        Args:
+            url (str): the requested url.
+            error (Exception): the exception raised by the request.
+            reason (str): why it is not retried, see
+                :func:`RetryPolicy.decide`.
+        """
+        if self.negative_cache is None or reason not in ("permanent", "attempts"):
+            return
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        reason = "missing" if status in (404, 410) else "error"
+        self.negative_cache.add(url, reason, None if status is None else dict(status=status))
+
+    def remember_rejected(self, task):
+        """Record a file rejected by :func:`keep_file` to the negative
+        cache, if any."""
+        if self.negative_cache is not None:
+            self.negative_cache.add(task["file_url"], "rejected")
+
+    def skip_existing(self, task, default_ext):
+        """Check whether the file to be downloaded next already exists.
+
+        If it exists, its index is consumed so that the next file gets a new
+        name. The storage is checked without holding the lock, so that the
+        threads do not wait for the lookups of each other, and checked again
+        if another file has been fetched meanwhile.
+
+        Returns:
+            bool: whether the download should be skipped.
+        """
+        while True:
+            with self.lock:
+                fetched_num = self.fetched_num
+                # named as the next file without counting it, which the
+                # unlocked max_num checks of the other threads would see
+                self.file_idx_offset += 1
                 try:
-                    task["filename"] = filename  # may be zero bytes if OSError happened during write()
-                    self.storage.write(filename, response.content)
-                    task["success"] = True
-                except OSError as o:
-                    # errno.EINVAL -- name too long
-                    if o.errno == errno.ENOSPC:
-                        self.signal.set(exceed_storage_space=True)
-                    else:
-                        raise
-                break
-            finally:
-                retry -= 1
+                    filenames = self.existing_filenames(task, default_ext)
+                finally:
+                    self.file_idx_offset -= 1
+            existing = self.storage.first_existing(filenames)
+            with self.lock:
+                if self.fetched_num != fetched_num:
+                    continue
+                if existing is None:
+                    return False
+                self.signal.incr("fetched_num")
+            self.logger.info("skip downloading file %s", existing)
+            return True
+
+    def existing_filenames(self, task, default_ext):
+        """Get the names the next file may have been saved as by a former
+        crawl, before it is fetched.
+
+        Returns:
+            list: the names, by default the one given by :func:`get_filename`.
+        """
+        return [self.get_filename(task, default_ext)]
+
+    def save(self, task, response, default_ext, **kwargs):
+        """Filter a fetched file and write it to the storage.
+
+        This is the part of :func:`download` after the request succeeded, it
+        is shared by all crawl engines. Rejected files are not read any
+        further, accepted ones are written to the storage chunk by chunk.
+        With a :attr:`content_index`, the body is hashed while it is received
+        into a spooled temporary file, and duplicated files only get their
+        url recorded.
+
+        Args:
+            task (dict): The task dict got from ``task_queue``.
+            response (Response): The response of the file url.
+            default_ext (str): Extension used when it cannot be inferred.
+            **kwargs: Arguments passed to the :func:`keep_file` method.
+        """
+        if self.reach_max_num():
+            self.stop(reach_max_num=True)
+            return
+        elif not 200 <= response.status_code < 300:
+            self.logger.error("Response status code %d, file %s", response.status_code, task["file_url"])
+            self.metrics.inc("files_total", result="failed")
+            return
+        with self.metrics.timer("keep_file_seconds"):
+            keep = self.keep_file(task, response, **kwargs)
+        if not keep:
+            self.metrics.inc("files_total", result="rejected")
+            self.remember_rejected(task)
+            return
+        body = _MeteredChunks(response.iter_content(CHUNK_SIZE))
+        if self.content_index is None:
+            self._write(task, response, default_ext, body)
+            return
+        with tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE) as spool:
+            sha = hashlib.sha256()
+            for chunk in body:
+                sha.update(chunk)
+                spool.write(chunk)
+            spool.seek(0)
+            digest, duplicate = self.content_index.claim(spool, sha.digest())
+            if duplicate is not None:
+                self.logger.info("skip duplicate of %s\t%s", duplicate or "a file being written", task["file_url"])
+                task["filename"] = duplicate or None
+                task["duplicate"] = True
+                if duplicate:
+                    self.content_index.add_url(task["file_url"], duplicate)
+                self.metrics.inc("bytes_total", body.size, stage="file")
+                self.metrics.inc("files_total", result="duplicate")
+                return
+            spool.seek(0)
+            self._write(task, response, default_ext, body, iter(partial(spool.read, CHUNK_SIZE), b""), digest)
+
+    def _write(self, task, response, default_ext, body, chunks=None, digest=None):
+        with self.lock:
+            # checked again as other threads may have fetched files meanwhile
+            if self.max_num > 0 and self.fetched_num >= self.max_num:
+                if digest is not None:
+                    self.content_index.release(digest)
+                self.stop(reach_max_num=True)
+                return
+            self.signal.incr("fetched_num")
+            filename = self.get_filename(task, default_ext)
+        self.logger.info("image #%s\t%s %s", self.fetched_num, filename, task["file_url"])
+
+        task["success"] = False
+        # the body may have been received before, into a spooled file
+        received = body.elapsed
+        start = time.perf_counter()
+        try:
+            task["filename"] = filename  # may be zero bytes if OSError happened during write()
+            self.storage.write_chunks(filename, body if chunks is None else chunks)
+            task["success"] = True
+            # time to the headers and time receiving the body
+            self.metrics.observe("file_fetch_seconds", response.elapsed.total_seconds() + body.elapsed)
+            self.metrics.observe("storage_write_seconds", time.perf_counter() - start - body.elapsed + received)
+            self.metrics.inc("files_total", result="saved")
+        except OSError as o:
+            # errno.EINVAL -- name too long
+            if o.errno == errno.ENOSPC:
+                self.stop(exceed_storage_space=True)
+            else:
+                raise
+        finally:
+            self.metrics.inc("bytes_total", body.size, stage="file")
+            if digest is not None:
+                if task["success"]:
+                    self.content_index.add(digest, filename, task["file_url"])
+                else:
+                    self.content_index.release(digest)
+
+    def stop(self, **signals):
+        """Set the signals telling why the crawling stops, and close
+        ``task_queue`` to wake up the threads waiting for tasks."""
+        self.signal.set(**signals)
+        self.in_queue.close()
 
     def process_meta(self, task):
         """Process some meta data of the images.
@@ -166,27 +451,48 @@ class Downloader(ThreadPool):
         """
         pass
 
-    def start(self, file_idx_offset=0, *args, **kwargs):
+    def start(self, file_idx_offset=0, *args, fetched_num=0, **kwargs):
+        """Start downloader threads.
+
+        Args:
+            file_idx_offset (int or str): see :func:`set_file_idx_offset`.
+            fetched_num (int): number of files fetched by the crawl being
+                resumed.
+            *args, **kwargs: Arguments passed to :func:`worker_exec`.
+        """
+        if self.process_num > 0:
+            self.lock = get_mp_context().Lock()
         self.clear_status()
+        self.fetched_num = fetched_num
         self.set_file_idx_offset(file_idx_offset)
         self.init_workers(*args, **kwargs)
         for worker in self.workers:
             worker.start()
             self.logger.debug("thread %s started", worker.name)
 
+    def init_process(self):
+        # pooled connections of the parent process must not be reused
+        self.session.close()
+
+    def exit_process(self):
+        # every process writes its own buffers
+        self.storage.flush()
+
     def worker_exec(self, max_num, default_ext="", queue_timeout=5, req_timeout=5, max_idle_time=None, **kwargs):
         """Target method of workers.
 
         Get task from ``task_queue`` and then download files and process meta
         data. A downloader thread will exit in either of the following cases:
 
-        1. All parser threads have exited and the task_queue is empty.
+        1. The task_queue is closed, i.e. all parser threads have exited and
+           all the tasks have been processed, or the crawling is stopped.
         2. Downloaded image number has reached required number(max_num).
         3. No new downloads for max_idle_time seconds.
 
         Args:
             max_num (int): Maximum number of images to download
-            queue_timeout (int): Timeout of getting tasks from ``task_queue``.
+            queue_timeout (int): Interval of checking the signals while
+                waiting for tasks from ``task_queue``.
             req_timeout (int): Timeout of making requests for downloading pages.
             max_idle_time (int): Maximum time (in seconds) to wait without receiving new images
             **kwargs: Arguments passed to the :func:`download` method.
@@ -194,10 +500,17 @@ class Downloader(ThreadPool):
         self.max_num = max_num
         last_download_time = time.time()
 
+        signal = self.signal
         while True:
-            if self.signal.get("reach_max_num"):
+            if self.retiring():
+                self.logger.info("thread %s is retired", current_thread().name)
+                break
+            if signal.reach_max_num:
                 self.logger.info("downloaded images reach max num, thread %s is ready to exit", current_thread().name)
                 break
+            if signal.exceed_storage_space:
+                self.logger.info("no more storage space, thread %s is ready to exit", current_thread().name)
+                break
 
             current_time = time.time()
             if max_idle_time is not None and current_time - last_download_time > max_idle_time and self.fetched_num > 0:
@@ -206,23 +519,29 @@ class Downloader(ThreadPool):
 
             try:
                 task = self.in_queue.get(timeout=queue_timeout)
+            except QueueClosed:
+                self.logger.info("no more download task for thread %s", current_thread().name)
+                break
             except queue.Empty:
-                if self.signal.get("parser_exited"):
-                    self.logger.info("no more download task for thread %s", current_thread().name)
-                    break
-                elif self.fetched_num == 0:
-                    self.logger.info("%s is waiting for new download tasks", current_thread().name)
-                else:
-                    self.logger.info("no more images available, thread %s exit", current_thread().name)
-                    break
+                self.logger.debug("%s is waiting for new download tasks", current_thread().name)
             except:
                 self.logger.error("exception in thread %s", current_thread().name)
             else:
-                success = self.download(task, default_ext, req_timeout, **kwargs)
-                if success:
-                    last_download_time = time.time()
-                self.process_meta(task)
-                self.in_queue.task_done()
+                start = self.stats.begin()
+                # the task is always marked as done so that the queue can be
+                # finished
+                try:
+                    retried = self.download(task, default_ext, req_timeout, **kwargs)
+                    if task["success"]:
+                        last_download_time = time.time()
+                    if not retried:
+                        self.process_meta(task)
+                except Exception as e:
+                    self.stats.error()
+                    self.logger.error("Exception caught when processing task %s, error: %s", task, e)
+                finally:
+                    self.stats.end(start)
+                    self.in_queue.task_done()
 
         self.logger.info("thread %s exit", current_thread().name)
 
@@ -231,7 +550,14 @@ class Downloader(ThreadPool):
 
 
 class ImageDownloader(Downloader):
-    """Downloader specified for images."""
+    """Downloader specified for images.
+
+    Attributes:
+        max_head_size (int): Max number of bytes read by :func:`keep_file`
+            to find the size of an image, larger headers are rejected.
+    """
+
+    max_head_size = 1024 * 1024
 
     def _size_lt(self, sz1, sz2):
         return max(sz1) <= max(sz2) and min(sz1) <= min(sz2)
@@ -242,7 +568,11 @@ class ImageDownloader(Downloader):
     def keep_file(self, task, response, min_size=None, max_size=None):
         """Decide whether to keep the image
 
-        Compare image size with ``min_size`` and ``max_size`` to decide.
+        Compare image size with ``min_size`` and ``max_size`` to decide. Only
+        the head of the file is read to get the size, so a rejected image is
+        not downloaded completely. The size and the format are parsed from
+        the header by :func:`probe_image`, with PIL as the fallback, and set
+        as ``img_size`` and ``img_format`` of the task.
 
         Args:
             response (Response): response of requests.
@@ -251,18 +581,66 @@ class ImageDownloader(Downloader):
         Returns:
             bool: whether to keep the image.
         """
-        try:
-            img = Image.open(BytesIO(response.content))
-        except OSError:
+        head_size = 16 * 1024
+        while True:
+            head = self.peek_content(response, head_size)
+            info = probe_image(head)
+            if info is not None:
+                break
+            # other formats or unusual headers are left to PIL
+            try:
+                img = Image.open(BytesIO(head))
+            except OSError:
+                # the header is not complete, or it is not an image at all,
+                # more is read only for the headers of known image formats
+                if len(head) < head_size or head_size >= self.max_head_size or image_signature(head) is None:
+                    return False
+                head_size *= 4
+            else:
+                info = img.format, img.size
+                break
+        task["img_format"], task["img_size"] = info
+        return self._size_ok(task["img_size"], min_size, max_size)
+
+    def _size_ok(self, size, min_size=None, max_size=None):
+        if min_size and not self._size_gt(size, min_size):
             return False
-        task["img_size"] = img.size
-        if min_size and not self._size_gt(img.size, min_size):
+        if max_size and not self._size_lt(size, max_size):
             return False
-        if max_size and not self._size_lt(img.size, max_size):
+        return True
+
+    def skip_known_bad(self, task, min_size=None, max_size=None, **kwargs):
+        """Check whether the file url failed or was rejected recently.
+
+        Images rejected by their size are checked again with the current
+        ``min_size`` and ``max_size``, without requesting them.
+        """
+        failure = self.negative_cache.get(task["file_url"])
+        if failure is None:
             return False
+        reason, info = failure
+        if reason == "rejected" and info.get("img_size"):
+            return not self._size_ok(tuple(info["img_size"]), min_size, max_size)
         return True
 
+    def remember_rejected(self, task):
+        """Record an image rejected by its size, or a file which is not an
+        image, to the negative cache, if any."""
+        if self.negative_cache is None:
+            return
+        if task.get("img_size"):
+            self.negative_cache.add(task["file_url"], "rejected", dict(img_size=list(task["img_size"])))
+        else:
+            self.negative_cache.add(task["file_url"], "invalid")
+
     def get_filename(self, task, default_ext):
+        """Name the image with the extension of its format, found by
+        :func:`keep_file`, or with the one of the url before the file is
+        fetched, or ``default_ext``."""
+        extension = FORMAT_EXTENSIONS.get(task.get("img_format"))
+        if extension is not None:
+            file_idx = self.fetched_num + self.file_idx_offset
+            return f"{file_idx:06d}.{extension}"
         url_path = urlparse(task["file_url"])[2]
         if "." in url_path:
             extension = url_path.split(".")[-1]
@@ -273,5 +651,14 @@ class ImageDownloader(Downloader):
         file_idx = self.fetched_num + self.file_idx_offset
         return f"{file_idx:06d}.{extension}"
 
+    def existing_filenames(self, task, default_ext):
+        """The name given before the file is fetched, and the same name with
+        the extensions of the other formats, which the file may have been
+        named with by its format."""
+        filename = self.get_filename(task, default_ext)
+        stem = osp.splitext(filename)[0]
+        others = [f"{stem}.{extension}" for extension in FORMAT_EXTENSIONS.values()]
+        return [filename] + [name for name in others if name != filename]
+
     def worker_exec(self, max_num, default_ext="jpg", queue_timeout=5, req_timeout=5, max_idle_time=None, **kwargs):
         super().worker_exec(max_num, default_ext, queue_timeout, req_timeout, max_idle_time, **kwargs)
@@ -1,7 +1,7 @@
 import os.path as osp
 from threading import current_thread
 
-from .utils import ThreadPool
+from .utils import QueueClosed, ThreadPool
 
 
 class Feeder(ThreadPool):
@@ -37,7 +37,10 @@ class Feeder(ThreadPool):
 
     def worker_exec(self, **kwargs):
         """Target function of workers"""
-        self.feed(**kwargs)
+        try:
+            self.feed(**kwargs)
+        except QueueClosed:
+            self.logger.info("crawling stopped, thread %s stops feeding", current_thread().name)
         self.logger.info(f"thread {current_thread().name} exit")
 
     def __exit__(self):
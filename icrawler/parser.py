@@ -1,10 +1,10 @@
 import logging
 import queue
-import time
 from threading import current_thread
 from urllib.parse import urlsplit
 
-from .utils import ThreadPool
+from .utils import QueueClosed, ThreadPool
+from .utils.metrics import timed_iter
 
 
 class Parser(ThreadPool):
@@ -40,67 +40,97 @@ class Parser(ThreadPool):
         """
         raise NotImplementedError
 
-    def worker_exec(self, queue_timeout=2, req_timeout=5, max_retry=3, **kwargs):
+    def init_process(self):
+        # pooled connections of the parent process must not be reused
+        self.session.close()
+
+    def worker_exec(self, queue_timeout=2, req_timeout=5, max_retry=None, **kwargs):
         """Target method of workers.
 
         Firstly download the page and then call the :func:`parse` method.
         A parser thread will exit in either of the following cases:
 
-        1. All feeder threads have exited and the ``url_queue`` is empty.
+        1. The ``url_queue`` is closed, i.e. all feeder threads have exited
+           and all the urls have been parsed, or the crawling is stopped.
         2. Downloaded image number has reached required number.
 
         Args:
-            queue_timeout (int): Timeout of getting urls from ``url_queue``.
+            queue_timeout (int): Interval of checking the signals while
+                waiting for urls from ``url_queue``.
             req_timeout (int): Timeout of making requests for downloading pages.
-            max_retry (int): Max retry times if the request fails.
+            max_retry (int, optional): Max attempts of a page, the
+                ``max_attempts`` of the retry policy if None. A failed page
+                is put back into ``in_queue`` to be fetched again later, as
+                the retry policy of the session decides, see
+                :class:`RetryPolicy`.
             **kwargs: Arguments to be passed to the :func:`parse` method.
         """
+        signal = self.signal
         while True:
-            if self.signal.get("reach_max_num"):
+            if self.retiring():
+                self.logger.info("thread %s is retired", current_thread().name)
+                break
+            if signal.reach_max_num:
                 self.logger.info(
                     "downloaded image reached max num, thread %s " "is ready to exit", current_thread().name
                 )
                 break
-            if self.signal.get("exceed_storage_space"):
+            if signal.exceed_storage_space:
                 self.logger.info("no more storage space, thread %s " "is ready to exit", current_thread().name)
                 break
             # get the page url
             try:
                 url = self.in_queue.get(timeout=queue_timeout)
+            except QueueClosed:
+                self.logger.info("no more page urls for thread %s to parse", current_thread().name)
+                break
             except queue.Empty:
-                if self.signal.get("feeder_exited"):
-                    self.logger.info("no more page urls for thread %s to parse", current_thread().name)
-                    break
-                self.logger.info("%s is waiting for new page urls", current_thread().name)
+                self.logger.debug("%s is waiting for new page urls", current_thread().name)
                 continue
             except:
                 self.logger.error("exception in thread %s", current_thread().name)
                 continue
             else:
                 self.logger.debug(f"start fetching page {url}")
-            # fetch and parse the page
-            retry = max_retry
-            while retry > 0:
+            start = self.stats.begin()
+            # fetch and parse the page, the url is always marked as done so
+            # that the queue can be finished
+            try:
+                host = urlsplit(url).hostname or ""
+                policy = self.session.retry_policy
                 try:
                     base_url = "{0.scheme}://{0.netloc}".format(urlsplit(url))
-                    response = self.session.get(url, timeout=req_timeout, headers={"Referer": base_url})
+                    self.metrics.inc("requests_total", stage="page", host=host)
+                    with self.metrics.timer("page_fetch_seconds"):
+                        response = self.session.get(
+                            url, timeout=req_timeout, headers={"Referer": base_url}, retry=False
+                        )
                 except Exception as e:
-                    self.logger.error(
-                        "Exception caught when fetching page %s, " "error: %s, remaining retry times: %d",
-                        url,
-                        e,
-                        retry - 1,
-                    )
+                    self.stats.error()
+                    self.metrics.inc("errors_total", stage="page", host=host)
+                    delay, reason = self.reschedule(url, url, e, policy, "page", max_retry)
+                    if delay is None:
+                        self.logger.error(
+                            "Exception caught when fetching page %s, error: %s, not retried (%s)", url, e, reason
+                        )
+                    else:
+                        self.logger.error(
+                            "Exception caught when fetching page %s, error: %s, retry in %.2f seconds", url, e, delay
+                        )
                 else:
+                    policy.forget(url)
                     self.logger.info(f"parsing result page {url}")
+                    self.metrics.inc("bytes_total", len(response.content), stage="page")
+                    if getattr(response, "from_cache", None):
+                        self.metrics.inc("cache_hits_total", stage="page", result=response.from_cache)
                     task_list = self.parse(response, **kwargs)
                     if not task_list:
                         self.logger.debug("self.parse() returned no tasks")
                         with open("task_list_error.log", "ab") as f:
                             f.write(response.content)
 
-                    for task in task_list:
-                        while not self.signal.get("reach_max_num") and not self.signal.get("exceed_storage_space"):
+                    for task in timed_iter(task_list, self.metrics, "parse_seconds"):
+                        while not signal.reach_max_num and not signal.exceed_storage_space:
                             try:
                                 if isinstance(task, dict):
                                     self.output(task, timeout=1)
@@ -110,21 +140,23 @@ class Parser(ThreadPool):
                                     # url_queue, dirty implementation
                                     self.input(task, timeout=1)
                             except queue.Full:
-                                time.sleep(1)
+                                continue
+                            except QueueClosed:
+                                break
                             except Exception as e:
                                 self.logger.error(
                                     "Exception caught when put task %s into " "queue, error: %s", task, url
                                 )
                             else:
                                 break
-                        if self.signal.get("reach_max_num"):
-                            break
-                        if self.signal.get("exceed_storage_space"):
+                        if signal.reach_max_num or signal.exceed_storage_space:
                             break
-                    self.in_queue.task_done()
-                    break
-                finally:
-                    retry -= 1
+            except Exception as e:
+                self.stats.error()
+                self.logger.error("Exception caught when parsing page %s, error: %s", url, e)
+            finally:
+                self.stats.end(start)
+                self.in_queue.task_done()
         self.logger.info(f"thread {current_thread().name} exit")
 
     def __exit__(self, exc_type, exc_val, exc_tb):
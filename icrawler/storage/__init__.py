@@ -1,5 +1,7 @@
 from .base import BaseStorage
 from .filesystem import FileSystem
 from .google_storage import GoogleStorage
+from .object_storage import ObjectStorage
+from .shards import ShardStorage
 
-__all__ = ["BaseStorage", "FileSystem", "GoogleStorage"]
+__all__ = ["BaseStorage", "FileSystem", "GoogleStorage", "ObjectStorage", "ShardStorage"]
@@ -1,5 +1,9 @@
 from abc import ABCMeta, abstractmethod
 
+# directory of the crawl state under the root_dir of a storage, e.g. the
+# caches and indexes of the crawlers, which is not part of the stored files
+STATE_DIR = ".icrawler"
+
 
 class BaseStorage:
     """Base class of backend storage"""
@@ -16,6 +20,26 @@ class BaseStorage:
         """
         return
 
+    def write_chunks(self, id, chunks):
+        """Write data given as an iterable of chunks
+
+        Backends which can write incrementally should override it, so that
+        large files need not to be loaded in memory at once.
+
+        Args:
+            id (str): unique id of the data in the storage.
+            chunks (iterable): bytes chunks of the data.
+        """
+        self.write(id, b"".join(chunks))
+
+    def flush(self):
+        """Finish the pending writes
+
+        It is called when a crawl ends. Backends buffering data should
+        override it, the storage may still be written afterwards.
+        """
+        pass
+
     @abstractmethod
     def exists(self, id):
         """Check the existence of some data
@@ -28,6 +52,20 @@ class BaseStorage:
         """
         return False
 
+    def first_existing(self, ids):
+        """Get the first of some ids whose data exists
+
+        Backends whose :func:`exists` is costly should override it, so that
+        the ids need not to be checked one by one.
+
+        Args:
+            ids (list): unique ids of the data in the storage.
+
+        Returns:
+            str: the first existing id, or None.
+        """
+        return next((id for id in ids if self.exists(id)), None)
+
     @abstractmethod
     def max_file_idx(self):
         """Get the max existing file index
@@ -1,36 +1,131 @@
 import os
 import os.path as osp
+from threading import Lock
 
 import six
 
-from .base import BaseStorage
+from .base import STATE_DIR, BaseStorage
+from .manifest import Manifest
+
+MANIFEST_NAME = "manifest"
 
 
 class FileSystem(BaseStorage):
     """Use filesystem as storage backend.
 
     The id is filename and data is stored as text files or binary files.
+
+    Args:
+        root_dir (str): Directory of the files.
+        manifest (bool): Whether to log the written files in
+            ``<root_dir>/.icrawler/manifest``, so that :func:`exists` and
+            :func:`max_file_idx` need no disk access, which matters with
+            millions of files. The log is rebuilt if it is missing, files
+            added or removed by others are not noticed until then.
+            Without it, :func:`first_existing` lists a directory once per
+            crawl instead of checking the files one by one.
     """
 
-    def __init__(self, root_dir):
+    def __init__(self, root_dir, manifest=False):
         self.root_dir = root_dir
+        self.manifest = None
+        # the names of the files in the directories listed by
+        # first_existing(), by directory, until the next flush()
+        self._listed = {}
+        self._listed_lock = Lock()
+        if manifest:
+            os.makedirs(osp.join(root_dir, STATE_DIR), exist_ok=True)
+            self.manifest = Manifest(osp.join(root_dir, STATE_DIR, MANIFEST_NAME), self._scan)
 
-    def write(self, id, data):
-        filepath = osp.join(self.root_dir, id)
+    def _scan(self):
+        for dirpath, dirnames, filenames in os.walk(self.root_dir):
+            if dirpath == self.root_dir and STATE_DIR in dirnames:
+                dirnames.remove(STATE_DIR)
+            for filename in filenames:
+                if filename.endswith(".part"):
+                    continue
+                yield osp.relpath(osp.join(dirpath, filename), self.root_dir)
+
+    def _make_dirs(self, filepath):
         folder = osp.dirname(filepath)
         if not osp.isdir(folder):
             try:
                 os.makedirs(folder)
             except OSError:
                 pass
+
+    def _added(self, id):
+        id = osp.normpath(id)
+        if self.manifest is not None:
+            self.manifest.add(id)
+        with self._listed_lock:
+            names = self._listed.get(osp.dirname(id))
+            if names is not None:
+                names.add(osp.basename(id))
+
+    def write(self, id, data):
+        filepath = osp.join(self.root_dir, id)
+        self._make_dirs(filepath)
         mode = "w" if isinstance(data, str) else "wb"
         with open(filepath, mode) as fout:
             fout.write(data)
+        self._added(id)
+
+    def write_chunks(self, id, chunks):
+        filepath = osp.join(self.root_dir, id)
+        self._make_dirs(filepath)
+        # write to a temporary file first, so that an interrupted download
+        # will not be taken as an existing file
+        tmp_filepath = filepath + ".part"
+        try:
+            with open(tmp_filepath, "wb") as fout:
+                for chunk in chunks:
+                    fout.write(chunk)
+        except BaseException:
+            try:
+                os.remove(tmp_filepath)
+            except OSError:
+                pass
+            raise
+        os.replace(tmp_filepath, filepath)
+        self._added(id)
+
+    def flush(self):
+        if self.manifest is not None:
+            self.manifest.close()
+        # files may be added or removed by others before the next crawl
+        with self._listed_lock:
+            self._listed = {}
 
     def exists(self, id):
+        if self.manifest is not None:
+            return osp.normpath(id) in self.manifest
         return osp.exists(osp.join(self.root_dir, id))
 
+    def _listdir(self, dirname):
+        with self._listed_lock:
+            names = self._listed.get(dirname)
+            if names is None:
+                try:
+                    names = set(os.listdir(osp.join(self.root_dir, dirname)))
+                except OSError:
+                    names = set()
+                self._listed[dirname] = names
+            return names
+
+    def first_existing(self, ids):
+        if self.manifest is not None:
+            return super().first_existing(ids)
+        for id in ids:
+            normpath = osp.normpath(id)
+            if osp.basename(normpath) in self._listdir(osp.dirname(normpath)):
+                return id
+        return None
+
     def max_file_idx(self):
+        if self.manifest is not None:
+            self.manifest.refresh()
+            return self.manifest.max_idx
         max_idx = 0
         for filename in os.listdir(self.root_dir):
             try:
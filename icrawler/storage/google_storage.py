@@ -1,40 +1,41 @@
-from io import BytesIO
+from .object_storage import ObjectStorage
 
-from .base import BaseStorage
 
-
-class GoogleStorage(BaseStorage):
+class GoogleStorage(ObjectStorage):
     """Google Storage backend.
 
     The id is filename and data is stored as text files or binary files.
     The root_dir is the bucket address such as gs://<your_bucket>/<your_directory>.
+    Files are uploaded in the background, see :class:`ObjectStorage`.
+
+    Args:
+        root_dir (str): the bucket address.
+        client (google.cloud.storage.Client, optional): client of the
+            storage, e.g. one of a local emulator.
+        **kwargs: Arguments of :class:`ObjectStorage`.
     """
 
-    def __init__(self, root_dir):
+    def __init__(self, root_dir, client=None, **kwargs):
         try:
             from google.cloud import storage
         except ImportError:
-            print(
+            raise ImportError(
                 "GoogleStorage backend requires the package "
                 '"google-cloud-storage", execute '
                 '"pip install google-cloud-storage" to install it.'
             )
 
-        self.client = storage.Client()
         bucket_str = root_dir[5:].split("/")[0]
-        self.bucket = self.client.get_bucket(bucket_str)
-        self.folder_str = root_dir[6 + len(bucket_str) :]
-        if self.folder_str[0] == "/":
-            self.folder_str = self.folder_str[1:]
-
-    def write(self, id, data):
-        blob = self.bucket.blob(self.folder_str + "/" + id)
-        data_buffer = BytesIO(data)
-        blob.upload_from_file(file_obj=data_buffer, size=len(data))
-
-    def exists(self, id):
-        blob = self.bucket.blob(self.folder_str + "/" + id)
-        return blob.exists()
-
-    def max_file_idx(self):
-        return len(self.bucket.list_blobs(prefix=self.folder_str))
+        super().__init__(prefix=root_dir[5 + len(bucket_str) :], **kwargs)
+        self.client = storage.Client() if client is None else client
+        self.bucket = self.client.bucket(bucket_str)
+        self.folder_str = self.prefix
+
+    def upload(self, key, data):
+        # small files are sent in a single multipart request
+        self.bucket.blob(key).upload_from_string(data, content_type="application/octet-stream")
+
+    def list_keys(self):
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        for blob in self.client.list_blobs(self.bucket, prefix=prefix):
+            yield blob.name[len(prefix) :]
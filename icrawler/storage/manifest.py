@@ -0,0 +1,105 @@
+import os
+import os.path as osp
+from threading import Lock
+
+
+def file_idx(id):
+    """Get the index of a file named after it, or 0.
+
+    >>> file_idx("images/000042.jpg")
+    42
+    """
+    try:
+        return int(osp.splitext(osp.basename(id))[0])
+    except ValueError:
+        return 0
+
+
+class Manifest:
+    """Append-only log of the ids written to a storage.
+
+    It is loaded once, after which checking an id and getting the max file
+    index are memory lookups. Every id is appended as a line with a single
+    write to a handle kept open until :func:`close`, so processes sharing
+    the storage can append to the same log, and :func:`refresh` reads the
+    lines appended by others. If the log is missing, it is rebuilt from
+    ``scan``.
+
+    Args:
+        filepath (str): Path of the log.
+        scan (callable): Returns all the ids in the storage.
+    """
+
+    def __init__(self, filepath, scan):
+        self.filepath = filepath
+        self.scan = scan
+        self.ids = set()
+        self.max_idx = 0
+        self._offset = 0
+        self._fout = None
+        self._lock = Lock()
+        if not osp.isfile(filepath):
+            self.rebuild()
+        self.refresh()
+
+    def _add(self, id):
+        self.ids.add(id)
+        # only the files at the top level are numbered, as without a manifest
+        if not osp.dirname(id):
+            self.max_idx = max(self.max_idx, file_idx(id))
+
+    def rebuild(self):
+        """Write the log again with the ids of the storage."""
+        with self._lock:
+            self._close()
+            tmp_filepath = self.filepath + ".tmp"
+            with open(tmp_filepath, "w", encoding="utf-8") as fout:
+                for id in self.scan():
+                    fout.write(id + "\n")
+            os.replace(tmp_filepath, self.filepath)
+            self.ids = set()
+            self.max_idx = 0
+            self._offset = 0
+
+    def refresh(self):
+        """Load the ids appended since the last refresh."""
+        with self._lock:
+            with open(self.filepath, "rb") as fin:
+                fin.seek(self._offset)
+                data = fin.read()
+            # skip the last line if it is being written
+            end = data.rfind(b"\n") + 1
+            for id in data[:end].decode("utf-8").splitlines():
+                self._add(id)
+            self._offset += end
+
+    def add(self, id):
+        """Append an id to the log."""
+        if "\n" in id:
+            raise ValueError(f"invalid id {id!r}")
+        with self._lock:
+            if id in self.ids:
+                return
+            self._add(id)
+            if self._fout is None:
+                # unbuffered, so that a line is never split between writes
+                self._fout = open(self.filepath, "ab", buffering=0)
+            self._fout.write(id.encode("utf-8") + b"\n")
+
+    def _close(self):
+        if self._fout is not None:
+            os.fsync(self._fout.fileno())
+            self._fout.close()
+            self._fout = None
+
+    def close(self):
+        """Flush the log to disk and close it, it is opened again by the
+        next :func:`add`."""
+        with self._lock:
+            self._close()
+
+    def __contains__(self, id):
+        return id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
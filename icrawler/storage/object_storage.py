@@ -0,0 +1,128 @@
+import logging
+import os
+import time
+from queue import Queue
+from threading import Lock, Thread
+
+from .base import BaseStorage
+from .manifest import file_idx
+
+
+class ObjectStorage(BaseStorage):
+    """Base class of object store backends, such as cloud storage buckets.
+
+    Files are uploaded by background threads, so the downloader threads do
+    not wait for the network. :func:`write` puts the file in a bounded
+    queue and only blocks when ``max_pending`` files are waiting, which
+    keeps the memory bounded when the uploads are slower than the
+    downloads. The keys of the existing objects are listed once and
+    cached, so :func:`exists` and :func:`max_file_idx` make no requests.
+
+    Subclasses implement :func:`upload` and :func:`list_keys`.
+
+    Args:
+        prefix (str): Prefix of the keys, i.e. the folder of the files.
+        upload_threads (int): Number of uploader threads.
+        max_pending (int): Max number of files waiting to be uploaded.
+        max_retry (int): Max attempts of an upload.
+    """
+
+    def __init__(self, prefix="", upload_threads=8, max_pending=64, max_retry=3):
+        self.prefix = prefix.strip("/")
+        self.upload_threads = upload_threads
+        self.max_pending = max_pending
+        self.max_retry = max_retry
+        self.logger = logging.getLogger(__name__)
+        self.failed = []
+        self._keys = None
+        self._lock = Lock()
+        self._pid = None
+        self._queue = None
+        self._threads = []
+
+    def key(self, id):
+        """Get the key of the object storing a file."""
+        return f"{self.prefix}/{id}" if self.prefix else id
+
+    def upload(self, key, data):
+        """Upload an object.
+
+        Args:
+            key (str): key of the object.
+            data (bytes): content of the object.
+        """
+        raise NotImplementedError
+
+    def list_keys(self):
+        """List the keys of the objects under ``prefix``.
+
+        Returns:
+            iterable: the keys without the prefix, i.e. the file ids.
+        """
+        raise NotImplementedError
+
+    def _start_threads(self):
+        # threads and pending files of the parent process are not inherited
+        # by forked processes
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._queue = Queue(self.max_pending)
+        self._threads = []
+        for i in range(self.upload_threads):
+            thread = Thread(target=self._upload_loop, name=f"uploader-{i + 1:03d}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _upload_loop(self):
+        while True:
+            id, data = self._queue.get()
+            try:
+                for retry in range(self.max_retry):
+                    try:
+                        self.upload(self.key(id), data)
+                    except Exception as e:
+                        self.logger.error(
+                            "Exception caught when uploading file %s, error: %s, remaining retry times: %d",
+                            id,
+                            e,
+                            self.max_retry - retry - 1,
+                        )
+                        if retry + 1 < self.max_retry:
+                            time.sleep(0.5 * 2**retry)
+                    else:
+                        break
+                else:
+                    with self._lock:
+                        self._keys.discard(id)
+                        self.failed.append(id)
+            finally:
+                self._queue.task_done()
+
+    def _load_keys(self):
+        with self._lock:
+            if self._keys is None:
+                self._keys = set(self.list_keys())
+            return self._keys
+
+    def write(self, id, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._load_keys()
+        with self._lock:
+            self._start_threads()
+            self._keys.add(id)
+        self._queue.put((id, data))
+
+    def exists(self, id):
+        return id in self._load_keys()
+
+    def max_file_idx(self):
+        return max((file_idx(id) for id in list(self._load_keys())), default=0)
+
+    def flush(self):
+        """Wait until all the pending files are uploaded."""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+        if self.failed:
+            self.logger.error("%d files failed to be uploaded", len(self.failed))
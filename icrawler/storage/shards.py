@@ -0,0 +1,178 @@
+import mmap
+import os
+import os.path as osp
+import re
+import tarfile
+from threading import Lock
+
+from .base import BaseStorage
+from .manifest import file_idx
+
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+class ShardStorage(BaseStorage):
+    """Pack files into tar shards instead of writing one file each.
+
+    Files are appended to ``<root_dir>/<prefix>-<n>.tar`` until a shard
+    reaches ``shard_size`` bytes, then a new shard is started. The shards
+    are plain tar archives as used by WebDataset, and every shard has a
+    sidecar index ``<prefix>-<n>.idx`` whose lines are
+    ``<id>\\t<offset>\\t<size>``, giving the position of the data of each
+    file in the shard, so that :func:`exists` is a dict lookup and
+    :func:`read` is a slice of the memory-mapped shard.
+
+    Shards are never appended to once finished by :func:`flush`, every
+    crawl and every worker process starts its own shards. The files
+    written by other processes are seen after :func:`refresh`.
+
+    Args:
+        root_dir (str): Directory of the shards.
+        shard_size (int): Max size of a shard in bytes.
+        prefix (str): Prefix of the shard filenames.
+    """
+
+    def __init__(self, root_dir, shard_size=1 << 30, prefix="shard"):
+        self.root_dir = root_dir
+        self.shard_size = shard_size
+        self.prefix = prefix
+        self._pattern = re.compile(rf"^{re.escape(prefix)}-(\d+)\.idx$")
+        self._index = {}
+        self._loaded = {}
+        self._maps = {}
+        self._lock = Lock()
+        self._pid = os.getpid()
+        self._shard = None
+        self._fout = None
+        self._index_fout = None
+        os.makedirs(root_dir, exist_ok=True)
+        self.refresh()
+
+    def _shard_path(self, shard, ext="tar"):
+        return osp.join(self.root_dir, f"{self.prefix}-{shard:06d}.{ext}")
+
+    def _open_shard(self):
+        # shard numbers are claimed with O_EXCL, so that processes never
+        # write to the same shard
+        shard = max((int(m.group(1)) for m in map(self._pattern.match, os.listdir(self.root_dir)) if m), default=-1)
+        while True:
+            shard += 1
+            try:
+                fd = os.open(self._shard_path(shard), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            except FileExistsError:
+                continue
+            break
+        self._shard = shard
+        self._fout = os.fdopen(fd, "wb")
+        self._index_fout = open(self._shard_path(shard, "idx"), "a", encoding="utf-8")
+        self._loaded[self._shard_path(shard, "idx")] = 0
+
+    def _close_shard(self):
+        # two zero blocks end a tar archive
+        self._fout.write(b"\0" * (2 * BLOCK_SIZE))
+        self._fout.close()
+        self._index_fout.close()
+        self._shard = self._fout = self._index_fout = None
+
+    def _check_pid(self):
+        # the files of the parent process must not be written by forked ones
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._shard = self._fout = self._index_fout = None
+            self._maps = {}
+
+    def write(self, id, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if "\t" in id or "\n" in id:
+            raise ValueError(f"invalid id {id!r}")
+        info = tarfile.TarInfo(id)
+        info.size = len(data)
+        header = info.tobuf(format=tarfile.GNU_FORMAT)
+        padding = b"\0" * (-len(data) % BLOCK_SIZE)
+        with self._lock:
+            self._check_pid()
+            if (
+                self._fout is not None
+                and self._fout.tell() + len(header) + len(data) + len(padding) + 2 * BLOCK_SIZE > self.shard_size
+            ):
+                self._close_shard()
+            if self._fout is None:
+                self._open_shard()
+            offset = self._fout.tell() + len(header)
+            self._fout.write(header + data + padding)
+            self._fout.flush()
+            # the index is written after the data, so it never points to
+            # missing data
+            self._index_fout.write(f"{id}\t{offset}\t{len(data)}\n")
+            self._index_fout.flush()
+            self._index[id] = (self._shard, offset, len(data))
+
+    def exists(self, id):
+        return id in self._index
+
+    def refresh(self):
+        """Load the index entries written since the last refresh, e.g. by
+        other processes."""
+        with self._lock:
+            for filename in sorted(os.listdir(self.root_dir)):
+                match = self._pattern.match(filename)
+                if not match:
+                    continue
+                path = osp.join(self.root_dir, filename)
+                with open(path, "rb") as fin:
+                    fin.seek(self._loaded.get(path, 0))
+                    data = fin.read()
+                # skip the last line if it is being written
+                end = data.rfind(b"\n") + 1
+                for line in data[:end].decode("utf-8").splitlines():
+                    id, offset, size = line.split("\t")
+                    self._index[id] = (int(match.group(1)), int(offset), int(size))
+                self._loaded[path] = self._loaded.get(path, 0) + end
+
+    def _map(self, shard, end):
+        mapped = self._maps.get(shard)
+        if mapped is None or len(mapped) < end:
+            # shards being written grow, so they are mapped again
+            with open(self._shard_path(shard), "rb") as fin:
+                mapped = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[shard] = mapped
+        return mapped
+
+    def read(self, id):
+        """Read the data of a file.
+
+        Args:
+            id (str): unique id of the data in the storage.
+
+        Returns:
+            bytes: the data.
+        """
+        if id not in self._index:
+            self.refresh()
+        shard, offset, size = self._index[id]
+        with self._lock:
+            self._check_pid()
+            return self._map(shard, offset + size)[offset : offset + size]
+
+    def __iter__(self):
+        """Iterate over ``(id, data)`` of all files, shard by shard in the
+        order they were written, which is the fastest way to read them."""
+        self.refresh()
+        for id, (shard, offset, size) in sorted(self._index.items(), key=lambda item: item[1]):
+            with self._lock:
+                data = self._map(shard, offset + size)[offset : offset + size]
+            yield id, data
+
+    def __len__(self):
+        return len(self._index)
+
+    def max_file_idx(self):
+        self.refresh()
+        return max((file_idx(id) for id in self._index), default=0)
+
+    def flush(self):
+        """Finish the shard being written."""
+        with self._lock:
+            if self._fout is not None and self._pid == os.getpid():
+                self._close_shard()
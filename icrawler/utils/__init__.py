@@ -1,7 +1,56 @@
-from .cached_queue import CachedQueue
+from .adapters import HTTP2Adapter, PooledAdapter
+from .autoscale import AutoScaler
+from .cached_queue import CachedQueue, QueueClosed
+from .checkpoint import Checkpoint
+from .content_index import ContentIndex
+from .dedup import BaseDedup, BloomDedup, MemoryDedup, SQLiteDedup, normalize_url, url_fingerprint
+from .http_cache import CachingAdapter, HTTPCache
+from .image_probe import probe_image
+from .metrics import BaseExporter, CallbackExporter, JSONLinesExporter, Metrics, PrometheusExporter
+from .negative_cache import NegativeCache
+from .priority import PriorityCachedQueue
+from .profiler import SamplingProfiler
 from .proxy_pool import Proxy, ProxyPool, ProxyScanner
+from .retry import RetryBudget, RetryPolicy
+from .scheduler import HostScheduler, TokenBucket
 from .session import Session
 from .signal import Signal
-from .thread_pool import ThreadPool
+from .thread_pool import ThreadPool, WorkerStats
 
-__all__ = ["CachedQueue", "Proxy", "ProxyPool", "ProxyScanner", "Session", "Signal", "ThreadPool"]
+__all__ = [
+    "AutoScaler",
+    "BaseDedup",
+    "BaseExporter",
+    "BloomDedup",
+    "CachedQueue",
+    "CachingAdapter",
+    "CallbackExporter",
+    "Checkpoint",
+    "ContentIndex",
+    "HTTP2Adapter",
+    "HTTPCache",
+    "HostScheduler",
+    "JSONLinesExporter",
+    "MemoryDedup",
+    "Metrics",
+    "NegativeCache",
+    "PooledAdapter",
+    "PriorityCachedQueue",
+    "PrometheusExporter",
+    "Proxy",
+    "ProxyPool",
+    "ProxyScanner",
+    "QueueClosed",
+    "RetryBudget",
+    "RetryPolicy",
+    "SQLiteDedup",
+    "SamplingProfiler",
+    "Session",
+    "Signal",
+    "ThreadPool",
+    "TokenBucket",
+    "WorkerStats",
+    "normalize_url",
+    "probe_image",
+    "url_fingerprint",
+]
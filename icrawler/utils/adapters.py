@@ -0,0 +1,281 @@
+"""Transport adapters of :class:`Session` with tunable connection pools"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from http.client import HTTPMessage
+from threading import Lock
+from types import SimpleNamespace
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.poolmanager import PoolManager
+
+try:
+    import httpx
+except ImportError:
+    httpx = None  # type: ignore
+
+
+class ConnectionStats:
+    """Counters of the requests made and the connections opened."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self._lock = Lock()
+
+    def add(self, num_requests=0, num_connections=0):
+        with self._lock:
+            self.requests += num_requests
+            self.connections += num_connections
+
+
+class _BoundedWaitMixin:
+    """Connection pool waiting at most ``pool_timeout`` seconds for a free
+    connection when it blocks, requests do not give a timeout for it."""
+
+    pool_timeout = None
+
+    def _get_conn(self, timeout=None):
+        return super()._get_conn(self.pool_timeout if timeout is None else timeout)
+
+
+class _HTTPConnectionPool(_BoundedWaitMixin, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSConnectionPool(_BoundedWaitMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PoolManager(PoolManager):
+    """PoolManager with per-host pool sizes, which keeps the counters of
+    the pools it discards.
+
+    Requests to the hosts with a limit wait for a free connection for at
+    most ``pool_timeout`` seconds, then raise ``EmptyPoolError``.
+    """
+
+    def __init__(self, *args, host_limits=None, pool_timeout=None, stats=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_classes_by_scheme = {"http": _HTTPConnectionPool, "https": _HTTPSConnectionPool}
+        self.host_limits = {} if host_limits is None else dict(host_limits)
+        self.pool_timeout = pool_timeout
+        self.stats = ConnectionStats() if stats is None else stats
+        self.pools.dispose_func = self._dispose_pool
+        self._live_pools = set()
+        self._live_lock = Lock()
+
+    def _dispose_pool(self, pool):
+        with self._live_lock:
+            self._live_pools.discard(pool)
+        self.stats.add(pool.num_requests, pool.num_connections)
+        pool.close()
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        limit = self.host_limits.get(host)
+        if limit:
+            request_context = dict(self.connection_pool_kw if request_context is None else request_context)
+            request_context.update(maxsize=limit, block=True)
+        pool = super()._new_pool(scheme, host, port, request_context)
+        pool.pool_timeout = self.pool_timeout
+        with self._live_lock:
+            self._live_pools.add(pool)
+        return pool
+
+    def live_stats(self):
+        with self._live_lock:
+            pools = list(self._live_pools)
+        return sum(pool.num_requests for pool in pools), sum(pool.num_connections for pool in pools)
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter which can limit the connections to some hosts.
+
+    Args:
+        pool_connections (int): Number of hosts whose pools are kept.
+        pool_maxsize (int): Number of connections kept per host, it should
+            be no less than the number of threads requesting the same host,
+            otherwise connections are closed after use and set up again.
+        host_limits (dict, optional): Max number of connections to some
+            hosts, e.g. ``{"i.example.com": 4}``. Requests to these hosts
+            wait for a free connection instead of opening a new one.
+        pool_timeout (float): Max seconds to wait for a free connection to
+            these hosts, ``urllib3.exceptions.EmptyPoolError`` is raised
+            afterwards.
+    """
+
+    __attrs__ = HTTPAdapter.__attrs__ + ["host_limits", "pool_timeout"]
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, host_limits=None, pool_timeout=60, **kwargs):
+        self.host_limits = host_limits
+        self.pool_timeout = pool_timeout
+        self.stats = ConnectionStats()
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize, **kwargs)
+
+    def __setstate__(self, state):
+        self.stats = ConnectionStats()
+        super().__setstate__(state)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _PoolManager(
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            host_limits=self.host_limits,
+            pool_timeout=self.pool_timeout,
+            stats=self.stats,
+            **pool_kwargs,
+        )
+
+    def connection_stats(self):
+        """Get the number of requests made and connections opened.
+
+        Returns:
+            tuple: ``(requests, connections)``
+        """
+        num_requests, num_connections = self.poolmanager.live_stats()
+        return self.stats.requests + num_requests, self.stats.connections + num_connections
+
+
+class _HTTPXRaw:
+    """File-like body of an httpx response, in place of ``response.raw``."""
+
+    def __init__(self, response):
+        self._response = response
+        self._chunks = None
+        self._buffer = b""
+        self._original_response = SimpleNamespace(msg=HTTPMessage())
+        for name, value in response.headers.multi_items():
+            self._original_response.msg[name] = value
+
+    def _iter_chunks(self):
+        if self._chunks is None:
+            self._chunks = self._response.iter_bytes()
+        try:
+            yield from self._chunks
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ChunkedEncodingError(e) from e
+
+    def read(self, amt=None, decode_content=True):
+        chunks = self._iter_chunks()
+        while amt is None or len(self._buffer) < amt:
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if amt is None:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def stream(self, amt=65536, decode_content=True):
+        while True:
+            data = self.read(amt)
+            if not data:
+                break
+            yield data
+
+    def close(self):
+        self._response.close()
+
+    release_conn = close
+
+
+class HTTP2Adapter(BaseAdapter):
+    """Adapter sending requests with httpx, which supports HTTP/2.
+
+    All the requests to a host share a few multiplexed connections. Requests
+    through a proxy or with client certificates are sent by ``fallback``.
+    Requires the packages ``httpx`` and ``h2``.
+
+    Args:
+        fallback (PooledAdapter): adapter for the requests httpx cannot send.
+        max_connections (int): Max number of connections of the client.
+    """
+
+    def __init__(self, fallback=None, max_connections=10):
+        if httpx is None:
+            raise ImportError('HTTP/2 requires the package "httpx", execute "pip install httpx[http2]" to install it.')
+        super().__init__()
+        self.fallback = PooledAdapter() if fallback is None else fallback
+        self.max_connections = max_connections
+        self.stats = ConnectionStats()
+        self.client = None
+
+    def _get_client(self):
+        # created lazily, as the adapter can be used again after close()
+        if self.client is None:
+            limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            self.client = httpx.Client(http2=True, limits=limits)
+        return self.client
+
+    def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.add(num_connections=1)
+
+    @staticmethod
+    def _timeout(timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(timeout)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if cert is not None or verify is not True or any((proxies or {}).values()):
+            return self.fallback.send(request, stream, timeout, verify, cert, proxies)
+        headers = request.headers.items() if isinstance(request.headers, Mapping) else request.headers
+        client = self._get_client()
+        httpx_request = client.build_request(
+            request.method,
+            request.url,
+            headers=list(headers),
+            content=request.body,
+            timeout=self._timeout(timeout),
+            extensions={"trace": self._trace},
+        )
+        try:
+            httpx_response = client.send(httpx_request, stream=True)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request) from e
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e, request=request) from e
+        self.stats.add(num_requests=1)
+        return self.build_response(request, httpx_response)
+
+    def build_response(self, request, httpx_response):
+        response = requests.Response()
+        response.status_code = httpx_response.status_code
+        response.reason = httpx_response.reason_phrase
+        response.headers = CaseInsensitiveDict(httpx_response.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _HTTPXRaw(httpx_response)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        extract_cookies_to_jar(response.cookies, request, response.raw)
+        return response
+
+    def connection_stats(self):
+        """Get the number of requests made and connections opened.
+
+        Returns:
+            tuple: ``(requests, connections)``
+        """
+        num_requests, num_connections = self.fallback.connection_stats()
+        return self.stats.requests + num_requests, self.stats.connections + num_connections
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        self.fallback.close()
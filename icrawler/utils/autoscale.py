@@ -0,0 +1,143 @@
+"""Controller resizing the parser and downloader thread pools during a crawl"""
+
+import logging
+from threading import Event, Thread
+
+
+class AutoScaler(Thread):
+    """Grow and shrink the parser and downloader threads while crawling.
+
+    Every ``interval`` seconds, the controller compares the utilization of
+    the workers (the fraction of time they spent processing items), their
+    error rate and the depth of the queues with the last check:
+
+    * Downloaders are added when the task queue is filling up and they are
+      busy, and removed when they are idle with an empty queue, or when
+      too many requests fail, which usually means that the hosts are
+      overloaded.
+    * Parsers are added when the task queue runs low while pages are
+      waiting, so that they do not starve the downloaders, and removed when
+      the task queue is full or they are idle.
+
+    Threads are added or removed by a quarter at a time, within the bounds,
+    and the capacity of every queue follows ``queue_factor`` times the
+    number of its consumers, unless it is unbounded. Threads are removed
+    once they finish their current item.
+
+    Args:
+        parser (Parser): the parser pool.
+        downloader (Downloader): the downloader pool.
+        interval (float): Seconds between two checks.
+        min_parser_threads (int): Lower bound of parser threads.
+        max_parser_threads (int): Upper bound of parser threads.
+        min_downloader_threads (int): Lower bound of downloader threads.
+        max_downloader_threads (int): Upper bound of downloader threads.
+        queue_factor (int): Queue capacity per consumer thread.
+        max_error_rate (float): Fraction of failed requests above which
+            downloaders are removed.
+    """
+
+    def __init__(
+        self,
+        parser,
+        downloader,
+        interval=2.0,
+        min_parser_threads=1,
+        max_parser_threads=16,
+        min_downloader_threads=1,
+        max_downloader_threads=64,
+        queue_factor=5,
+        max_error_rate=0.3,
+    ):
+        super().__init__(name="autoscaler", daemon=True)
+        self.parser = parser
+        self.downloader = downloader
+        self.interval = interval
+        self.bounds = {
+            parser: (min_parser_threads, max_parser_threads),
+            downloader: (min_downloader_threads, max_downloader_threads),
+        }
+        self.queue_factor = queue_factor
+        self.max_error_rate = max_error_rate
+        self.logger = logging.getLogger(__name__)
+        self._stopped = Event()
+        self._last = {}
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        for pool in self.bounds:
+            self._last[pool] = pool.stats.snapshot()
+        while not self._stopped.wait(self.interval):
+            self.step()
+
+    def measure(self, pool):
+        """Get the utilization and the error rate of a pool since the last
+        measure."""
+        done, errors, busy_time, now = snapshot = pool.stats.snapshot()
+        last_done, last_errors, last_busy_time, last_now = self._last.get(pool, snapshot)
+        self._last[pool] = snapshot
+        elapsed = max(now - last_now, 1e-6) * max(pool.thread_num, 1)
+        utilization = min(1.0, (busy_time - last_busy_time) / elapsed)
+        attempts = (done - last_done) + (errors - last_errors)
+        error_rate = (errors - last_errors) / attempts if attempts else 0.0
+        return utilization, error_rate
+
+    @staticmethod
+    def fill(queue):
+        if queue.maxsize <= 0:
+            return 0.0
+        return queue.qsize() / queue.maxsize
+
+    def resize(self, pool, delta):
+        """Add or remove threads of a pool within its bounds.
+
+        Returns:
+            int: the number of threads added (negative if removed).
+        """
+        low, high = self.bounds[pool]
+        target = max(low, min(high, pool.thread_num + delta))
+        if target > pool.thread_num:
+            delta = pool.add_workers(target - pool.thread_num)
+        elif target < pool.thread_num:
+            delta = -pool.retire_workers(pool.thread_num - target)
+        else:
+            delta = 0
+        if delta:
+            if pool.in_queue.maxsize > 0:
+                pool.in_queue.resize(self.queue_factor * pool.thread_num)
+            self.logger.info("%s threads: %d (%+d)", pool.name, pool.thread_num, delta)
+        return delta
+
+    def step(self):
+        """Check the pools once and resize them if needed."""
+        parser, downloader = self.parser, self.downloader
+        page_queue, task_queue = parser.in_queue, downloader.in_queue
+        if task_queue.closed:
+            return
+        parser_util, _ = self.measure(parser)
+        downloader_util, error_rate = self.measure(downloader)
+        task_fill = self.fill(task_queue)
+        self.logger.debug(
+            "parser utilization %.2f, downloader utilization %.2f, error rate %.2f, task queue %.2f full",
+            parser_util,
+            downloader_util,
+            error_rate,
+            task_fill,
+        )
+
+        step = max(1, downloader.thread_num // 4)
+        if error_rate > self.max_error_rate:
+            self.resize(downloader, -step)
+        elif task_fill > 0.5 and downloader_util > 0.8:
+            self.resize(downloader, step)
+        elif task_queue.qsize() == 0 and downloader_util < 0.3 and downloader.stats.done > 0:
+            # not before the first tasks arrive
+            self.resize(downloader, -step)
+
+        step = max(1, parser.thread_num // 4)
+        if task_fill < 0.2 and page_queue.qsize() > 0 and parser_util > 0.8:
+            self.resize(parser, step)
+        elif task_fill > 0.9 or (page_queue.qsize() == 0 and parser_util < 0.3 and parser.stats.done > 0):
+            self.resize(parser, -step)
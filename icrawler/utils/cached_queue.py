@@ -1,6 +1,16 @@
-import json
-from collections import OrderedDict
-from queue import Queue
+import heapq
+from itertools import count
+from queue import Empty, Full, Queue
+from threading import current_thread
+from time import monotonic
+
+from .dedup import MemoryDedup, url_fingerprint
+
+
+class QueueClosed(Exception):
+    """Raised when putting an item into, or getting an item from, a closed queue."""
+
+    pass
 
 
 class CachedQueue(Queue):
@@ -8,55 +18,279 @@ class CachedQueue(Queue):
 
     This queue is used in :class:`ThreadPool`, it enables parser and downloader
     to check if the page url or the task has been seen or processed before.
+    Items are identified by :func:`url_fingerprint`, and the fingerprints are
+    kept by a deduplication backend, see :mod:`icrawler.utils.dedup`.
 
     Attributes:
-        _cache (OrderedDict): cache, elements are stored as keys of it.
-        cache_capacity (int): maximum size of cache.
+        dedup (BaseDedup): the deduplication backend, by default a
+            :class:`MemoryDedup` with ``cache_capacity``.
+        cache_capacity (int): maximum size of the default in-memory cache.
+        journal (Checkpoint): if set, items put into the queue and items
+            marked as done by :func:`task_done` are recorded to it.
+        journal_name (str): name of the queue in the journal.
+        closed (bool): whether the queue is closed. Getting items from or
+            putting items into a closed queue raises :class:`QueueClosed`,
+            so that the threads waiting for it do not rely on timeouts.
+        finished (bool): whether no more items will be put by the producer,
+            the queue will be closed once all its items are processed.
 
+    Items which failed can be put back with :func:`retry`, to be taken again
+    after a delay. They count as unfinished until then, so that the queue is
+    not closed meanwhile.
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, cache_capacity=0, dedup=None, **kwargs):
         super().__init__(*args, **kwargs)
-        if "cache_capacity" in kwargs:
-            self.cache_capacity = kwargs["cache_capacity"]
-        else:
-            self.cache_capacity = 0
-        self._cache = OrderedDict()
+        self.cache_capacity = cache_capacity
+        self.dedup = MemoryDedup(cache_capacity) if dedup is None else dedup
+        self.journal = None
+        self.journal_name = None
+        self.closed = False
+        self.finished = False
+        self._in_progress = {}
+        self._delayed = []
+        self._delayed_counter = count()
+        # slots taken by the items being checked for duplicates
+        self._reserved = 0
 
     def is_duplicated(self, item):
         """Check whether the item has been in the cache
 
-        If the item has not been seen before, then hash it and put it into
-        the cache, otherwise indicates the item is duplicated. When the cache
-        size exceeds capacity, discard the earliest items in the cache.
+        If the item has not been seen before, then put its fingerprint into
+        the cache, otherwise indicates the item is duplicated.
 
         Args:
-            item (object): The item to be checked and stored in cache. It must
-                be immutable or a list/dict.
+            item (object): The item to be checked and stored in cache. It
+                should be an url, a task dict or a list of them.
         Returns:
             bool: Whether the item has been in cache.
         """
-        if isinstance(item, dict):
-            hashable_item = json.dumps(item, sort_keys=True)
-        elif isinstance(item, list):
-            hashable_item = frozenset(item)
-        else:
-            hashable_item = item
-        if hashable_item in self._cache:
+        return not self.dedup.add(url_fingerprint(item))
+
+    @staticmethod
+    def _deadline(timeout):
+        if timeout is None:
+            return None
+        if timeout < 0:
+            raise ValueError("'timeout' must be a non-negative number")
+        return monotonic() + timeout
+
+    def _wait(self, condition, block, deadline, exception, limit=None):
+        """Wait for the condition until the deadline, or raise the exception.
+
+        It waits for at most ``limit`` seconds if given, e.g. until a
+        delayed item is due.
+        """
+        if not block:
+            raise exception
+        if deadline is None:
+            condition.wait(limit)
+            return
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            raise exception
+        condition.wait(remaining if limit is None else min(limit, remaining))
+
+    def _release_due(self):
+        """Put the delayed items which are due into the queue.
+
+        Returns:
+            float: seconds until the next delayed item is due, or None.
+        """
+        now = monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, item, depth = heapq.heappop(self._delayed)
+            self._put_at(item, depth)
+        return self._delayed[0][0] - now if self._delayed else None
+
+    def retry(self, item, delay):
+        """Put back an item got by the current thread, to be taken again
+        after some seconds.
+
+        The item is not checked for duplicates, and it is not marked as done
+        in the journal by the following :func:`task_done`, which must still
+        be called for the failed attempt.
+
+        Args:
+            item (object): the item, e.g. a page url or a task.
+            delay (float): seconds to wait.
+
+        Returns:
+            bool: whether the item is put back, it is not if the queue is
+            closed.
+        """
+        with self.mutex:
+            if self.closed:
+                return False
+            # the item is put back at the depth it was got at
+            depth = self._current_depth()
+            heapq.heappush(self._delayed, (monotonic() + delay, next(self._delayed_counter), item, depth))
+            self.unfinished_tasks += 1
+            self._in_progress.pop(current_thread().name, None)
+            # the threads waiting for items must wake up when it is due
+            self.not_empty.notify_all()
             return True
-        else:
-            if self.cache_capacity > 0 and len(self._cache) >= self.cache_capacity:
-                self._cache.popitem(False)
-            self._cache[hashable_item] = 1
-            return False
+
+    def _current_depth(self):
+        """Get the depth of the item got by the current thread, -1 if it has
+        got none, or None if the queue does not track the depths of its
+        items, see :class:`PriorityCachedQueue`."""
+        return None
+
+    def _put_at(self, item, depth):
+        """Put an item at a depth, which is ignored unless tracked."""
+        self._put(item)
+
+    def delayed(self):
+        """Get the number of items waiting to be retried."""
+        with self.mutex:
+            return len(self._delayed)
+
+    def empty(self):
+        with self.mutex:
+            return not self._qsize() and not self._delayed
 
     def put(self, item, block=True, timeout=None, dup_callback=None):
-        """Put an item to queue if it is not duplicated."""
-        if not self.is_duplicated(item):
-            super().put(item, block, timeout)
-        else:
-            if dup_callback:
-                dup_callback(item)
+        """Put an item to queue if it is not duplicated.
+
+        A slot is reserved before the item is checked, so that an item which
+        cannot be put because the queue is full is not taken as seen. The
+        check is made without holding the lock of the queue, as the
+        deduplication backends may write to disk.
+        """
+        deadline = self._deadline(timeout)
+        with self.not_full:
+            while True:
+                if self.closed:
+                    raise QueueClosed
+                if self.maxsize <= 0 or self._qsize() + self._reserved < self.maxsize:
+                    break
+                self._wait(self.not_full, block, deadline, Full)
+            self._reserved += 1
+        try:
+            duplicated = self.is_duplicated(item)
+        except BaseException:
+            with self.not_full:
+                self._reserved -= 1
+                self.not_full.notify()
+            raise
+        with self.not_full:
+            self._reserved -= 1
+            if duplicated:
+                self.not_full.notify()
+            else:
+                if self.closed:
+                    raise QueueClosed
+                depth = self._current_depth()
+                if depth is not None:
+                    depth += 1
+                self._put_at(item, depth)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+                if self.journal is not None:
+                    self.journal.record_put(self.journal_name, item, depth)
+        if duplicated and dup_callback:
+            dup_callback(item)
+
+    def get(self, block=True, timeout=None):
+        """Remove and return an item from the queue.
+
+        Raises:
+            QueueClosed: if the queue is closed.
+            Empty: if no item is available within ``timeout`` seconds.
+        """
+        deadline = self._deadline(timeout)
+        with self.not_empty:
+            while True:
+                if self.closed:
+                    raise QueueClosed
+                due = self._release_due() if self._delayed else None
+                if self._qsize():
+                    break
+                self._wait(self.not_empty, block, deadline, Empty, due)
+            item = self._get()
+            self.not_full.notify()
+            return item
 
     def put_nowait(self, item, dup_callback=None):
         self.put(item, block=False, dup_callback=dup_callback)
+
+    def _get(self):
+        item = super()._get()
+        if self.journal is not None:
+            self._in_progress[current_thread().name] = item
+        return item
+
+    def task_done(self):
+        """Indicate that the item got by the current thread is processed."""
+        if self.journal is not None:
+            item = self._in_progress.pop(current_thread().name, None)
+            if item is not None:
+                self.journal.record_done(self.journal_name, item)
+        super().task_done()
+        with self.mutex:
+            if self.finished and self.unfinished_tasks == 0:
+                self._close()
+
+    def _close(self):
+        self.closed = True
+        self.not_empty.notify_all()
+        self.not_full.notify_all()
+
+    def close(self):
+        """Close the queue and wake up all the threads waiting for it."""
+        with self.mutex:
+            self._close()
+
+    def finish(self):
+        """Indicate that the producers have exited.
+
+        Items can still be put by the consumers, e.g. urls found when
+        parsing pages. The queue is closed as soon as all the items put are
+        processed, which tells the consumers to exit.
+        """
+        with self.mutex:
+            self.finished = True
+            if self.unfinished_tasks == 0:
+                self._close()
+
+    def reopen(self):
+        """Open a closed queue again for another crawl."""
+        with self.mutex:
+            self.closed = False
+            self.finished = False
+
+    def clear(self):
+        """Remove all the items left in the queue, delayed ones included."""
+        with self.mutex:
+            self.unfinished_tasks = max(0, self.unfinished_tasks - len(self.queue) - len(self._delayed))
+            self.queue.clear()
+            self._delayed.clear()
+            if self.unfinished_tasks == 0:
+                self.all_tasks_done.notify_all()
+                if self.finished:
+                    self._close()
+            self.not_full.notify_all()
+
+    def resize(self, maxsize):
+        """Change the max number of items, 0 means unlimited."""
+        with self.mutex:
+            self.maxsize = maxsize
+            self.not_full.notify_all()
+
+    def flush(self):
+        """Persist the keys of the deduplication backend."""
+        self.dedup.flush()
+
+    def restore(self, items, depths=None):
+        """Put items into the queue regardless of its size and the cache.
+
+        Args:
+            items (list): the items.
+            depths (list, optional): the depths of the items, as journaled,
+                if the queue tracks them.
+        """
+        with self.mutex:
+            self.queue.extend(items)
+            self.unfinished_tasks += len(items)
+            self.not_empty.notify_all()
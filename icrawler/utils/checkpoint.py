@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import os.path as osp
+import threading
+
+from .dedup import url_fingerprint
+
+
+class Checkpoint:
+    """Journal of a crawl, used to resume it after the process is killed.
+
+    Every item put into the url queue or the task queue, and every item
+    processed, is appended to ``<root_dir>/journal.jsonl``. The journal is
+    flushed to disk every ``interval`` seconds. When resuming, the items put
+    but not processed are restored into the queues, the processed ones are
+    marked as seen in the deduplication backends, and the downloader
+    counters are restored, so no result page or file is fetched twice.
+
+    The journal is compacted atomically (written to a temporary file and
+    renamed) each time a crawl is resumed, and by the flusher every
+    ``compact_records`` records, so that the items put and processed only
+    take a line each.
+
+    Attributes:
+        root_dir (str): Directory of the journal.
+        interval (float): Seconds between two flushes.
+        compact_records (int): Number of records appended between two
+            compactions of the journal.
+        signal (Signal): The signal shared by all components.
+        downloader (Downloader): The downloader whose ``fetched_num`` is
+            recorded with every processed item.
+        fetched_num (int): Number of files fetched, as recorded by the
+            latest processed task.
+        file_idx_offset (int): File index offset of the journaled crawl.
+    """
+
+    def __init__(self, root_dir, interval=10, compact_records=100000):
+        self.root_dir = root_dir
+        self.interval = interval
+        self.compact_records = compact_records
+        self.filepath = osp.join(root_dir, "journal.jsonl")
+        self.signal = None
+        self.downloader = None
+        self.fetched_num = 0
+        self.file_idx_offset = 0
+        self.logger = logging.getLogger(__name__)
+        self._fout = None
+        self._records = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = None
+
+    def _write(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._fout is not None:
+                self._fout.write(line)
+                self._records += 1
+
+    def record_put(self, name, item, depth=None):
+        """Record an item put into the queue ``name``, with its depth if
+        the queue tracks it."""
+        record = {"q": name, "put": item}
+        if depth is not None:
+            record["d"] = depth
+        self._write(record)
+
+    def record_done(self, name, item):
+        """Record an item of the queue ``name`` that has been processed.
+
+        Items finished after ``reach_max_num`` is set are not recorded, as
+        they were skipped rather than processed.
+        """
+        if self.signal is not None and self.signal.reach_max_num:
+            return
+        record = {"q": name, "done": url_fingerprint(item).hex()}
+        if self.downloader is not None:
+            record["n"] = self.downloader.fetched_num
+        self._write(record)
+
+    def load(self):
+        """Read the journal.
+
+        Returns:
+            dict: with keys ``pending`` (items to be processed of each
+            queue), ``depths`` (their depths, None if not recorded),
+            ``seen`` (fingerprints of all the items of each queue),
+            ``fetched_num`` and ``file_idx_offset``.
+        """
+        pending = {}
+        seen = {}
+        fetched_num = 0
+        file_idx_offset = 0
+        if not osp.isfile(self.filepath):
+            return dict(pending=pending, depths={}, seen=seen, fetched_num=fetched_num, file_idx_offset=file_idx_offset)
+        with open(self.filepath) as fin:
+            for line in fin:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line may be incomplete if the process was killed
+                    continue
+                if "file_idx_offset" in record:
+                    file_idx_offset = record["file_idx_offset"]
+                    fetched_num = record.get("n", 0)
+                    continue
+                name = record["q"]
+                if "put" in record:
+                    fp = url_fingerprint(record["put"]).hex()
+                    pending.setdefault(name, {})[fp] = (record["put"], record.get("d"))
+                else:
+                    fp = record["done"]
+                    pending.get(name, {}).pop(fp, None)
+                    if "n" in record:
+                        fetched_num = max(fetched_num, record["n"])
+                seen.setdefault(name, set()).add(fp)
+        depths = {name: [depth for _, depth in items.values()] for name, items in pending.items()}
+        pending = {name: [item for item, _ in items.values()] for name, items in pending.items()}
+        return dict(pending=pending, depths=depths, seen=seen, fetched_num=fetched_num, file_idx_offset=file_idx_offset)
+
+    def open(self, resume=False, file_idx_offset=0):
+        """Start journaling.
+
+        Args:
+            resume (bool): If True, load and compact the existing journal,
+                otherwise start an empty one.
+            file_idx_offset (int): File index offset of a new crawl.
+
+        Returns:
+            dict or None: the loaded state if resuming, see :func:`load`.
+        """
+        os.makedirs(self.root_dir, exist_ok=True)
+        state = self.load() if resume else None
+        if state is not None:
+            self.fetched_num = state["fetched_num"]
+            self.file_idx_offset = state["file_idx_offset"]
+        else:
+            self.fetched_num = 0
+            self.file_idx_offset = file_idx_offset
+        self._rewrite(
+            state
+            or dict(pending={}, depths={}, seen={}, fetched_num=self.fetched_num, file_idx_offset=self.file_idx_offset)
+        )
+        self._fout = open(self.filepath, "a")
+        self._records = 0
+        self._stop.clear()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="checkpoint", daemon=True)
+        self._flusher.start()
+        return state
+
+    def _rewrite(self, state):
+        tmp_filepath = self.filepath + ".tmp"
+        with open(tmp_filepath, "w") as fout:
+            fout.write(json.dumps({"file_idx_offset": state["file_idx_offset"], "n": state["fetched_num"]}) + "\n")
+            for name, fps in state["seen"].items():
+                pending = {url_fingerprint(item).hex() for item in state["pending"].get(name, [])}
+                for fp in fps - pending:
+                    fout.write(json.dumps({"q": name, "done": fp}) + "\n")
+            for name, items in state["pending"].items():
+                depths = state["depths"].get(name) or [None] * len(items)
+                for item, depth in zip(items, depths):
+                    record = {"q": name, "put": item}
+                    if depth is not None:
+                        record["d"] = depth
+                    fout.write(json.dumps(record, default=str) + "\n")
+            fout.flush()
+            os.fsync(fout.fileno())
+        os.replace(tmp_filepath, self.filepath)
+
+    def compact(self):
+        """Rewrite the journal with a line per item, the records appended
+        meanwhile wait for it."""
+        with self._lock:
+            if self._fout is None:
+                return
+            self._fout.close()
+            self._rewrite(self.load())
+            self._fout = open(self.filepath, "a")
+            self._records = 0
+
+    def flush(self):
+        """Write the buffered records to disk."""
+        with self._lock:
+            if self._fout is not None:
+                self._fout.flush()
+                os.fsync(self._fout.fileno())
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+                if self._records >= self.compact_records:
+                    self.compact()
+            except OSError as e:
+                self.logger.error("failed to flush the checkpoint journal: %s", e)
+
+    def close(self):
+        """Stop journaling and flush the journal."""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+        with self._lock:
+            if self._fout is not None:
+                self._fout.close()
+                self._fout = None
@@ -0,0 +1,208 @@
+"""Index of downloaded files by content, used to skip duplicated files"""
+
+import hashlib
+import os
+import os.path as osp
+import sqlite3
+from io import BytesIO
+from threading import Lock
+
+from PIL import Image
+
+
+def dhash(img, hash_size=8):
+    """Get the difference hash of an image.
+
+    Similar images, e.g. the same image resized or compressed again, have
+    hashes differing by a few bits.
+
+    Args:
+        img (Image): a PIL image.
+        hash_size (int): the hash has ``hash_size ** 2`` bits.
+
+    Returns:
+        int: the hash.
+    """
+    pixels = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR).tobytes()
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def _signed(value):
+    # sqlite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class ContentIndex:
+    """Index of downloaded files by the hashes of their content.
+
+    Every file is identified by the SHA-256 of its body, and optionally by
+    the difference hash of the image, so that the same image from another
+    url, or compressed again, is not written twice. The url of every
+    downloaded file, duplicated or not, is mapped to the file it is stored
+    as. The index is a SQLite database at ``<root_dir>/<namespace>.sqlite``,
+    whose lookups are primary key searches, so it stays fast with millions
+    of files, and it is shared by threads and forked worker processes.
+
+    Bodies being written are reserved in a table of their own, the
+    reservations left by a crawl which was killed are dropped when the
+    index is opened.
+
+    Near-duplicated images are found with the multi-index hashing: the
+    64-bit hash is split into ``max_distance + 1`` bands, and two hashes
+    differing by at most ``max_distance`` bits have at least one band in
+    common.
+
+    Args:
+        root_dir (str): Directory of the database.
+        perceptual (bool): Whether to find near-duplicated images.
+        max_distance (int): Max number of different bits of the difference
+            hashes of near-duplicated images.
+        namespace (str): Name of the database file.
+    """
+
+    def __init__(self, root_dir, perceptual=False, max_distance=4, namespace="content"):
+        os.makedirs(root_dir, exist_ok=True)
+        self.filepath = osp.join(root_dir, f"{namespace}.sqlite")
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        self.num_bands = max_distance + 1
+        self.band_bits = -(-64 // self.num_bands)
+        self._lock = Lock()
+        self._pid = None
+        self._connect()
+        self._drop_reservations()
+
+    def _connect(self):
+        # sqlite connections must not be shared with forked processes
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.filepath, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS files (digest BLOB PRIMARY KEY, filename TEXT) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pending (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, filename TEXT) WITHOUT ROWID")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dhashes (band INTEGER, value INTEGER, hash INTEGER, digest BLOB)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS dhashes_band ON dhashes (band, value)")
+
+    def _execute(self, sql, params=()):
+        if self._pid != os.getpid():
+            self._connect()
+        return self._conn.execute(sql, params)
+
+    def _drop_reservations(self):
+        with self._lock:
+            self._execute("BEGIN IMMEDIATE")
+            self._execute("DELETE FROM dhashes WHERE digest IN (SELECT digest FROM pending)")
+            self._execute("DELETE FROM pending")
+            self._execute("COMMIT")
+
+    def _bands(self, value):
+        mask = (1 << self.band_bits) - 1
+        return [(band, (value >> (band * self.band_bits)) & mask) for band in range(self.num_bands)]
+
+    def _similar(self, value):
+        for band, band_value in self._bands(value):
+            rows = self._execute(
+                "SELECT hash, digest FROM dhashes WHERE band = ? AND value = ?", (band, band_value)
+            ).fetchall()
+            for other, digest in rows:
+                if bin((other ^ _signed(value)) & ((1 << 64) - 1)).count("1") <= self.max_distance:
+                    return digest
+        return None
+
+    def claim(self, content, digest=None):
+        """Look up a file body, and reserve it if it is new.
+
+        A new body is reserved until :func:`add` or :func:`release` is
+        called, so that the other threads and processes downloading the same
+        body take it as duplicated.
+
+        Args:
+            content (bytes or file): the file body, or a file object to read
+                it from if ``digest`` is given.
+            digest (bytes, optional): the SHA-256 digest of the body, e.g.
+                computed while receiving it.
+
+        Returns:
+            tuple: the SHA-256 digest of the content, and the filename of
+            its duplicate ("" if the duplicate is being written) or None if
+            it is new.
+        """
+        if digest is None:
+            digest = hashlib.sha256(content).digest()
+        value = None
+        if self.perceptual:
+            try:
+                value = dhash(Image.open(content if hasattr(content, "read") else BytesIO(content)))
+            except OSError:
+                value = None
+        with self._lock:
+            self._execute("BEGIN IMMEDIATE")
+            try:
+                duplicate = self._claim(digest, value)
+            except BaseException:
+                self._execute("ROLLBACK")
+                raise
+            self._execute("COMMIT")
+        return digest, duplicate
+
+    def _claim(self, digest, value):
+        row = self._execute("SELECT filename FROM files WHERE digest = ?", (digest,)).fetchone()
+        if row is not None:
+            return row[0]
+        if not self._execute("INSERT OR IGNORE INTO pending VALUES (?)", (digest,)).rowcount:
+            return ""
+        if value is None:
+            return None
+        similar = self._similar(value)
+        if similar is None:
+            self._conn.executemany(
+                "INSERT INTO dhashes VALUES (?, ?, ?, ?)",
+                [(band, band_value, _signed(value), digest) for band, band_value in self._bands(value)],
+            )
+            return None
+        self._execute("DELETE FROM pending WHERE digest = ?", (digest,))
+        row = self._execute("SELECT filename FROM files WHERE digest = ?", (similar,)).fetchone()
+        if row is None:
+            # the similar image is being written
+            return ""
+        # exact copies of this body are taken as duplicates directly next time
+        self._execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (digest, row[0]))
+        return row[0]
+
+    def add(self, digest, filename, url=None):
+        """Record the filename of a claimed body, and the url of the file."""
+        with self._lock:
+            self._execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (digest, filename))
+            self._execute("DELETE FROM pending WHERE digest = ?", (digest,))
+            if url is not None:
+                self._execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, filename))
+
+    def release(self, digest):
+        """Cancel the reservation of a body which was not written."""
+        with self._lock:
+            self._execute("DELETE FROM pending WHERE digest = ?", (digest,))
+            self._execute("DELETE FROM dhashes WHERE digest = ?", (digest,))
+
+    def add_url(self, url, filename):
+        """Map the url of a duplicated file to the file it duplicates."""
+        with self._lock:
+            self._execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, filename))
+
+    def lookup_url(self, url):
+        """Get the filename of the file downloaded from an url, or None."""
+        with self._lock:
+            row = self._execute("SELECT filename FROM urls WHERE url = ?", (url,)).fetchone()
+        return None if row is None else row[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._execute("SELECT COUNT(*) FROM files").fetchone()[0]
@@ -0,0 +1,270 @@
+"""Backends used by :class:`CachedQueue` to remember the items it has seen"""
+
+import hashlib
+import json
+import math
+import os
+import os.path as osp
+import sqlite3
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443, "ftp": 21}
+
+
+def normalize_url(url):
+    """Normalize an url so that equivalent urls are the same string.
+
+    The scheme and host are lowercased, the default port and the fragment
+    are removed and the query parameters are sorted.
+
+    >>> normalize_url("HTTP://Example.com:80/a.jpg?b=2&a=1#top")
+    'http://example.com/a.jpg?a=1&b=2'
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    try:
+        host = parts.hostname or ""
+        port = parts.port
+    except ValueError:
+        netloc = parts.netloc.lower()
+    else:
+        netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+        if parts.username is not None:
+            userinfo = parts.username if parts.password is None else f"{parts.username}:{parts.password}"
+            netloc = f"{userinfo}@{netloc}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+def url_fingerprint(item):
+    """Get the fingerprint of a page url or a task.
+
+    Tasks (dicts) are identified by their ``file_url``, so that the same file
+    will not be downloaded twice even if the tasks carry different meta data.
+
+    Args:
+        item (str or dict or list): A url, a task or a list of them.
+
+    Returns:
+        bytes: A 16-byte digest.
+    """
+    if isinstance(item, dict):
+        key = normalize_url(item["file_url"]) if "file_url" in item else json.dumps(item, sort_keys=True)
+    elif isinstance(item, str):
+        key = normalize_url(item)
+    elif isinstance(item, (list, tuple, set, frozenset)):
+        key = json.dumps(sorted(str(i) for i in item))
+    else:
+        key = repr(item)
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class BaseDedup:
+    """Base class of deduplication backends
+
+    A backend is a set of fingerprints, different backends trade memory,
+    accuracy and persistence differently.
+    """
+
+    def add(self, key):
+        """Add a key to the set.
+
+        Args:
+            key (bytes): The fingerprint of an item.
+
+        Returns:
+            bool: True if the key is new, False if it has been added before.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Persist the keys added so far, if the backend is persistent."""
+        pass
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class MemoryDedup(BaseDedup):
+    """Keep the fingerprints in memory.
+
+    Args:
+        capacity (int): Maximum number of keys, the earliest keys are
+            discarded when it is exceeded. 0 means unlimited.
+        namespace (str): Name of the set, unused.
+    """
+
+    def __init__(self, capacity=0, namespace="default"):
+        self.capacity = capacity
+        self._keys = OrderedDict()
+        self._lock = Lock()
+
+    def add(self, key):
+        with self._lock:
+            if key in self._keys:
+                return False
+            if self.capacity > 0 and len(self._keys) >= self.capacity:
+                self._keys.popitem(False)
+            self._keys[key] = None
+            return True
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class _BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key):
+        bits = self.bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+
+class BloomDedup(BaseDedup):
+    """A scalable Bloom filter.
+
+    It uses a small fraction of the memory of :class:`MemoryDedup` at the
+    cost of a small false positive rate, i.e. a few new items may be taken
+    as duplicated. When a filter is full, a larger one with a tighter error
+    rate is appended, so the overall error rate stays below ``error_rate``.
+
+    Args:
+        capacity (int): Number of keys of the first filter.
+        error_rate (float): Upper bound of the false positive rate.
+        root_dir (str, optional): If specified, the filter is saved to
+            ``<root_dir>/<namespace>.bloom`` by :func:`flush` and loaded from
+            it when created.
+        namespace (str): Name of the set.
+    """
+
+    growth = 2
+    tightening = 0.5
+
+    def __init__(self, capacity=1000000, error_rate=0.001, root_dir=None, namespace="default"):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.filepath = None if root_dir is None else osp.join(root_dir, f"{namespace}.bloom")
+        self._filters = []
+        self._lock = Lock()
+        if self.filepath is not None and osp.isfile(self.filepath):
+            self._load()
+        else:
+            self._grow()
+
+    def _grow(self):
+        n = len(self._filters)
+        capacity = self.capacity * self.growth**n
+        error_rate = self.error_rate * (1 - self.tightening) * self.tightening**n
+        self._filters.append(_BloomFilter(capacity, error_rate))
+
+    def add(self, key):
+        with self._lock:
+            for bloom in self._filters:
+                if key in bloom:
+                    return False
+            if self._filters[-1].count >= self._filters[-1].capacity:
+                self._grow()
+            self._filters[-1].add(key)
+            return True
+
+    def flush(self):
+        if self.filepath is None:
+            return
+        os.makedirs(osp.dirname(self.filepath) or ".", exist_ok=True)
+        with self._lock:
+            header = [
+                dict(capacity=bloom.capacity, error_rate=bloom.error_rate, count=bloom.count) for bloom in self._filters
+            ]
+            tmp_filepath = self.filepath + ".tmp"
+            with open(tmp_filepath, "wb") as fout:
+                fout.write(json.dumps(header).encode() + b"\n")
+                for bloom in self._filters:
+                    fout.write(bloom.bits)
+            os.replace(tmp_filepath, self.filepath)
+
+    def _load(self):
+        with open(self.filepath, "rb") as fin:
+            header = json.loads(fin.readline())
+            for info in header:
+                bloom = _BloomFilter(info["capacity"], info["error_rate"])
+                bloom.bits = bytearray(fin.read(len(bloom.bits)))
+                bloom.count = info["count"]
+                self._filters.append(bloom)
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self._filters)
+
+
+class SQLiteDedup(BaseDedup):
+    """Keep the fingerprints in a SQLite database on disk.
+
+    The memory usage does not grow with the number of keys, and the keys are
+    kept across restarts.
+
+    Args:
+        root_dir (str): Directory of the database files.
+        namespace (str): Name of the set, each set is saved to
+            ``<root_dir>/<namespace>.sqlite``.
+        commit_interval (int): Number of new keys between two commits.
+    """
+
+    def __init__(self, root_dir, namespace="default", commit_interval=1000):
+        os.makedirs(root_dir, exist_ok=True)
+        self.filepath = osp.join(root_dir, f"{namespace}.sqlite")
+        self.commit_interval = commit_interval
+        self._uncommitted = 0
+        self._lock = Lock()
+        self._pid = None
+        self._connect()
+
+    def _connect(self):
+        # sqlite connections must not be shared with forked processes
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.filepath, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        self._conn.commit()
+        self._uncommitted = 0
+
+    def add(self, key):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._connect()
+            cursor = self._conn.execute("INSERT OR IGNORE INTO seen VALUES (?)", (key,))
+            if cursor.rowcount != 1:
+                return False
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_interval:
+                self._conn.commit()
+                self._uncommitted = 0
+            return True
+
+    def flush(self):
+        with self._lock:
+            self._conn.commit()
+            self._uncommitted = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
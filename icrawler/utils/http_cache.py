@@ -0,0 +1,336 @@
+"""On-disk cache of http responses, mounted under the adapters of Session"""
+
+import json
+import os
+import os.path as osp
+import sqlite3
+import time
+from collections import Counter, namedtuple
+from email.utils import parsedate_to_datetime
+from threading import Lock
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DAY = 24 * 3600
+
+# headers describing the connection or the encoded body, not the content
+# which is cached decoded
+_HOP_HEADERS = frozenset(
+    [
+        "connection",
+        "content-encoding",
+        "content-length",
+        "keep-alive",
+        "set-cookie",
+        "transfer-encoding",
+    ]
+)
+
+CacheEntry = namedtuple("CacheEntry", "url status reason headers body stored")
+
+
+def parse_cache_control(value):
+    """Parse a ``Cache-Control`` header into a dict of its directives.
+
+    >>> parse_cache_control('public, max-age=300, no-cache="Set-Cookie"')
+    {'public': None, 'max-age': '300', 'no-cache': 'Set-Cookie'}
+
+    Args:
+        value (str): the header, or None.
+
+    Returns:
+        dict: directives with lower case names, and their values or None.
+    """
+    directives = {}
+    for directive in (value or "").split(","):
+        name, _, arg = directive.partition("=")
+        name = name.strip().lower()
+        if name:
+            directives[name] = arg.strip().strip('"') if arg else None
+    return directives
+
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers):
+    """Get the seconds a response is fresh for, according to its headers.
+
+    The lifetime is given by ``max-age`` or ``Expires``, or is a tenth of
+    the time since ``Last-Modified``, up to a day, as browsers do. Responses
+    with ``no-cache`` or ``no-store`` are never fresh.
+
+    >>> freshness_lifetime({"Cache-Control": "max-age=300", "Age": "100"})
+    200.0
+    >>> freshness_lifetime({"Cache-Control": "no-cache, max-age=300"})
+    0.0
+
+    Args:
+        headers (dict): the headers of the response.
+
+    Returns:
+        float: the remaining lifetime when the response was received.
+    """
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-cache" in directives or "no-store" in directives:
+        return 0.0
+    try:
+        age = float(headers.get("Age") or 0)
+    except ValueError:
+        age = 0.0
+    date = _http_date(headers.get("Date"))
+    if directives.get("max-age") is not None:
+        try:
+            lifetime = float(directives["max-age"])
+        except ValueError:
+            lifetime = 0.0
+    elif "Expires" in headers:
+        expires = _http_date(headers["Expires"])
+        lifetime = 0.0 if expires is None or date is None else expires - date
+    elif "Last-Modified" in headers:
+        last_modified = _http_date(headers["Last-Modified"])
+        lifetime = 0.0 if last_modified is None or date is None else min(DAY, (date - last_modified) / 10)
+    else:
+        lifetime = 0.0
+    return max(0.0, lifetime - age)
+
+
+def cached_response(entry, from_cache, request=None):
+    """Build a ``requests.Response`` from a cached response.
+
+    Args:
+        entry (CacheEntry): the cached response.
+        from_cache (str): "hit" or "revalidated", set as ``from_cache``.
+        request (PreparedRequest, optional): the request it answers.
+    """
+    response = requests.Response()
+    response.status_code = entry.status
+    response.reason = entry.reason
+    response.headers = CaseInsensitiveDict(entry.headers)
+    response.headers["Content-Length"] = str(len(entry.body))
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = entry.body
+    response.url = entry.url
+    response.request = request
+    response.from_cache = from_cache
+    return response
+
+
+class HTTPCache:
+    """Size-bounded on-disk cache of http responses.
+
+    Responses are stored with their headers, and served without a request
+    while they are fresh (see :func:`freshness_lifetime`). Stale responses
+    with an ``ETag`` or a ``Last-Modified`` header are revalidated with a
+    conditional request, and served from the cache if the server answers
+    "304 Not Modified". Search pages usually forbid caching, ``force_ttl``
+    ignores the headers and keeps every response fresh for a fixed time,
+    e.g. while iterating on a parser.
+
+    The cache is a SQLite database at ``<root_dir>/<namespace>.sqlite``,
+    shared by threads and forked worker processes. When its bodies take
+    more than ``max_size`` bytes, the least recently used responses are
+    evicted.
+
+    Args:
+        root_dir (str): Directory of the database.
+        max_size (int): Max number of bytes of the cached bodies.
+        force_ttl (float, optional): Seconds every response is fresh for,
+            whatever its headers, including ``no-store``.
+        namespace (str): Name of the database file.
+    """
+
+    def __init__(self, root_dir, max_size=256 * 2**20, force_ttl=None, namespace="http_cache"):
+        os.makedirs(root_dir, exist_ok=True)
+        self.filepath = osp.join(root_dir, f"{namespace}.sqlite")
+        self.max_size = max_size
+        self.force_ttl = force_ttl
+        # "hit", "revalidated", "miss" and "stored" responses of this process
+        self.stats = Counter()
+        self._lock = Lock()
+        self._pid = None
+        self._connect()
+
+    def _connect(self):
+        # sqlite connections must not be shared with forked processes
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.filepath, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, status INTEGER, reason TEXT, "
+            "headers TEXT, body BLOB, size INTEGER, stored REAL, accessed REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _execute(self, sql, params=()):
+        if self._pid != os.getpid():
+            self._connect()
+        return self._conn.execute(sql, params)
+
+    def get(self, url):
+        """Look up the response of an url, fresh or not.
+
+        Returns:
+            CacheEntry or None: the cached response.
+        """
+        with self._lock:
+            row = self._execute(
+                "SELECT status, reason, headers, body, stored FROM responses WHERE key = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), url))
+        status, reason, headers, body, stored = row
+        return CacheEntry(url, status, reason, json.loads(headers), body, stored)
+
+    def set(self, url, status, reason, headers, body):
+        """Store the response of an url, then evict the least recently used
+        responses if the cache is full.
+
+        Returns:
+            bool: whether it is stored, i.e. it is no larger than a tenth of
+            ``max_size``.
+        """
+        if len(body) > self.max_size / 10:
+            return False
+        headers = {name: value for name, value in headers.items() if name.lower() not in _HOP_HEADERS}
+        now = time.time()
+        row = (url, status, reason, json.dumps(headers), body, len(body), now, now)
+        with self._lock:
+            self._execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self._evict()
+        return True
+
+    def refresh(self, url, headers):
+        """Update the headers of a response revalidated by the server, and
+        make it fresh again.
+
+        Returns:
+            CacheEntry or None: the updated response, or None if it has been
+            evicted.
+        """
+        entry = self.get(url)
+        if entry is None:
+            return None
+        merged = CaseInsensitiveDict(entry.headers)
+        merged.update((name, value) for name, value in headers.items() if name.lower() not in _HOP_HEADERS)
+        headers = dict(merged.items())
+        now = time.time()
+        with self._lock:
+            self._execute("UPDATE responses SET headers = ?, stored = ? WHERE key = ?", (json.dumps(headers), now, url))
+        return entry._replace(headers=headers, stored=now)
+
+    def _evict(self):
+        size = self._execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if size <= self.max_size:
+            return
+        # evict down to 90% of the max size, not to evict on every insertion
+        excess = size - self.max_size * 0.9
+        keys = []
+        for key, entry_size in self._execute("SELECT key, size FROM responses ORDER BY accessed"):
+            keys.append((key,))
+            excess -= entry_size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+
+    def is_fresh(self, entry):
+        """Tell whether a cached response can be served without a request."""
+        lifetime = self.force_ttl if self.force_ttl is not None else freshness_lifetime(entry.headers)
+        return time.time() - entry.stored < lifetime
+
+    def is_cacheable(self, response):
+        """Tell whether the response of a GET request is worth storing, i.e.
+        it is successful and either fresh or revalidatable."""
+        if response.status_code != 200:
+            return False
+        if self.force_ttl is not None:
+            return True
+        if "no-store" in parse_cache_control(response.headers.get("Cache-Control")):
+            return False
+        return (
+            "ETag" in response.headers
+            or "Last-Modified" in response.headers
+            or freshness_lifetime(response.headers) > 0
+        )
+
+    def count(self, result):
+        """Count a request answered with a ``result`` in :attr:`stats`, which
+        is shared by the threads of the process."""
+        with self._lock:
+            self.stats[result] += 1
+
+    def size(self):
+        """Get the number of bytes of the cached bodies."""
+        with self._lock:
+            return self._execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._execute("DELETE FROM responses")
+
+    def __len__(self):
+        with self._lock:
+            return self._execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class CachingAdapter(BaseAdapter):
+    """Adapter serving the GET requests which are not streamed from an
+    :class:`HTTPCache`, and sending the others with ``adapter``.
+
+    Requests asking for ``Cache-Control: no-cache`` are always revalidated.
+    Responses served from the cache have ``from_cache`` set to "hit" or
+    "revalidated".
+
+    Args:
+        adapter (BaseAdapter): adapter sending the requests.
+        cache (HTTPCache): the cache of the responses.
+    """
+
+    def __init__(self, adapter, cache):
+        super().__init__()
+        self.adapter = adapter
+        self.cache = cache
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if stream or request.method != "GET":
+            return self.adapter.send(request, stream, timeout, verify, cert, proxies)
+        entry = self.cache.get(request.url)
+        if entry is not None:
+            no_cache = "no-cache" in parse_cache_control(request.headers.get("Cache-Control"))
+            if not no_cache and self.cache.is_fresh(entry):
+                self.cache.count("hit")
+                return self.build_response(request, entry, "hit")
+            headers = CaseInsensitiveDict(entry.headers)
+            if "ETag" in headers:
+                request.headers["If-None-Match"] = headers["ETag"]
+            if "Last-Modified" in headers:
+                request.headers["If-Modified-Since"] = headers["Last-Modified"]
+        response = self.adapter.send(request, stream, timeout, verify, cert, proxies)
+        if entry is not None and response.status_code == 304:
+            response.close()
+            entry = self.cache.refresh(request.url, response.headers) or entry
+            self.cache.count("revalidated")
+            return self.build_response(request, entry, "revalidated")
+        self.cache.count("miss")
+        response.from_cache = None
+        if self.cache.is_cacheable(response):
+            if self.cache.set(request.url, response.status_code, response.reason, response.headers, response.content):
+                self.cache.count("stored")
+        return response
+
+    def build_response(self, request, entry, from_cache):
+        response = cached_response(entry, from_cache, request)
+        response.connection = self
+        return response
+
+    def close(self):
+        self.adapter.close()
@@ -0,0 +1,177 @@
+"""Format and size of images, read from the first bytes of their files"""
+
+import struct
+
+# extensions of the files saved in every format, the names are the ones of PIL
+FORMAT_EXTENSIONS = {
+    "BMP": "bmp",
+    "GIF": "gif",
+    "JPEG": "jpg",
+    "PNG": "png",
+    "PPM": "ppm",
+    "TIFF": "tiff",
+    "WEBP": "webp",
+}
+
+# start of frame markers, which are followed by the size of a JPEG image
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _probe_jpeg(data):
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # fill byte
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # markers without a segment
+            pos += 2
+            continue
+        (length,) = struct.unpack(">H", data[pos + 2 : pos + 4])
+        if marker in _JPEG_SOF:
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[pos + 5 : pos + 9])
+            return "JPEG", (width, height)
+        pos += 2 + length
+    return None
+
+
+def _probe_png(data):
+    if len(data) < 24 or data[12:16] != b"IHDR":
+        return None
+    return "PNG", struct.unpack(">II", data[16:24])
+
+
+def _probe_gif(data):
+    if len(data) < 10:
+        return None
+    return "GIF", struct.unpack("<HH", data[6:10])
+
+
+def _probe_bmp(data):
+    if len(data) < 26:
+        return None
+    (header_size,) = struct.unpack("<I", data[14:18])
+    if header_size == 12:
+        return "BMP", struct.unpack("<HH", data[18:22])
+    width, height = struct.unpack("<ii", data[18:26])
+    # the rows are stored top-down if the height is negative
+    return "BMP", (width, abs(height))
+
+
+def _probe_webp(data):
+    if len(data) < 30:
+        return None
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return "WEBP", (width & 0x3FFF, height & 0x3FFF)
+    if chunk == b"VP8L":
+        (bits,) = struct.unpack("<I", data[21:25])
+        return "WEBP", ((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return "WEBP", (width, height)
+    return None
+
+
+def _probe_tiff(data):
+    endian = "<" if data[:2] == b"II" else ">"
+    if len(data) < 8:
+        return None
+    (offset,) = struct.unpack(endian + "I", data[4:8])
+    if offset + 2 > len(data):
+        return None
+    (num_entries,) = struct.unpack(endian + "H", data[offset : offset + 2])
+    size = {}
+    for i in range(num_entries):
+        entry = offset + 2 + i * 12
+        if entry + 12 > len(data):
+            return None
+        tag, field_type = struct.unpack(endian + "HH", data[entry : entry + 4])
+        if tag in (256, 257):
+            # the value is a SHORT or a LONG
+            fmt = endian + ("H" if field_type == 3 else "I")
+            size[tag] = struct.unpack(fmt, data[entry + 8 : entry + 8 + struct.calcsize(fmt)])[0]
+            if len(size) == 2:
+                return "TIFF", (size[256], size[257])
+    return None
+
+
+_PROBES = {
+    "BMP": _probe_bmp,
+    "GIF": _probe_gif,
+    "JPEG": _probe_jpeg,
+    "PNG": _probe_png,
+    "TIFF": _probe_tiff,
+    "WEBP": _probe_webp,
+}
+
+
+def image_signature(data):
+    """Get the format of an image from the magic bytes of its file.
+
+    >>> image_signature(b"\\x89PNG\\r\\n\\x1a\\n")
+    'PNG'
+    >>> image_signature(b"<!DOCTYPE html>") is None
+    True
+
+    Args:
+        data (bytes): the first bytes of the file.
+
+    Returns:
+        str or None: the format, named as in PIL, or None if it is not one
+        of the formats read by :func:`probe_image`.
+    """
+    if data[:3] == b"\xff\xd8\xff":
+        return "JPEG"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "PNG"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    if data[:2] == b"BM":
+        return "BMP"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "WEBP"
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "TIFF"
+    return None
+
+
+def probe_image(data):
+    """Get the format and the size of an image from the head of its file.
+
+    JPEG, PNG, GIF, BMP, WebP and TIFF headers are parsed directly, which is
+    much cheaper than opening the image with PIL. Usually the first few KB
+    are enough, JPEG files with large metadata may need more.
+
+    >>> probe_image(b"GIF89a\\x40\\x01\\xf0\\x00" + bytes(3))
+    ('GIF', (320, 240))
+    >>> probe_image(b"not an image") is None
+    True
+
+    Args:
+        data (bytes): the first bytes of the file.
+
+    Returns:
+        tuple or None: the format, named as in PIL, and ``(width,
+        height)``, or None if the format is not supported or the header is
+        not complete.
+    """
+    probe = _PROBES.get(image_signature(data))
+    try:
+        info = None if probe is None else probe(data)
+    except struct.error:
+        # truncated or corrupted header
+        return None
+    # an empty size is left to PIL, e.g. the height of some JPEG files is
+    # only given after the first scan
+    if info is None or not all(info[1]):
+        return None
+    return info
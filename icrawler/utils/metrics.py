@@ -0,0 +1,305 @@
+"""Counters, histograms and gauges of the crawling pipeline, and their exporters"""
+
+import json
+import logging
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+
+
+class Histogram:
+    """Distribution of durations in fixed buckets, as in Prometheus."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self):
+        return dict(count=self.count, sum=self.sum, buckets=dict(zip(map(str, self.buckets), self.counts)))
+
+
+class Metrics:
+    """Registry of the metrics of a crawler.
+
+    Metrics are identified by a name and some labels, e.g.
+    ``metrics.inc("requests_total", stage="file", host="example.com")``.
+    Every update takes a lock for a few dict operations, so the metrics
+    can be left on. Gauges are functions called when the metrics are
+    exported, e.g. the size of a queue.
+
+    The metrics of the crawler are:
+
+    * ``page_fetch_seconds``, ``parse_seconds``, ``file_fetch_seconds``,
+      ``keep_file_seconds`` and ``storage_write_seconds``: histograms of
+      the duration of every stage.
+    * ``requests_total`` and ``errors_total``: requests and failed
+      attempts, labelled with the ``stage`` (page or file) and the ``host``.
+    * ``bytes_total``: bytes received, labelled with the ``stage``.
+    * ``files_total``: files labelled with the ``result`` (saved,
+      rejected, duplicate, known_bad, i.e. skipped by the negative cache,
+      or failed).
+    * ``queue_size`` and ``threads``: gauges of the queues and the pools.
+
+    Counters and histograms only count the threads of the current process,
+    so the crawlers reject exporters when they fork worker processes.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Add a value to a histogram."""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of a block in a histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def gauge(self, name, func, **labels):
+        """Register a function giving the current value of a gauge."""
+        with self._lock:
+            self._gauges[self._key(name, labels)] = func
+
+    def get(self, name, **labels):
+        """Get the value of a counter, the count of a histogram or the value
+        of a gauge, or 0 if it does not exist."""
+        key = self._key(name, labels)
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            if key in self._histograms:
+                return self._histograms[key].count
+            func = self._gauges.get(key)
+        return func() if func is not None else 0
+
+    def snapshot(self):
+        """Get the current values of all metrics.
+
+        Returns:
+            dict: ``counters``, ``histograms`` and ``gauges``, each of them a
+            list of dicts with the ``name``, the ``labels`` and the value.
+        """
+        with self._lock:
+            counters = [dict(name=n, labels=dict(l), value=v) for (n, l), v in self._counters.items()]
+            histograms = [dict(name=n, labels=dict(l), **h.to_dict()) for (n, l), h in self._histograms.items()]
+            gauges = list(self._gauges.items())
+        values = []
+        for (name, labels), func in gauges:
+            try:
+                value = func()
+            except Exception:
+                continue
+            values.append(dict(name=name, labels=dict(labels), value=value))
+        return dict(time=time.time(), counters=counters, histograms=histograms, gauges=values)
+
+    def prometheus(self, prefix="icrawler_"):
+        """Format the metrics in the Prometheus text format."""
+
+        def labels_str(labels, **extra):
+            labels = dict(labels, **extra)
+            if not labels:
+                return ""
+            items = ",".join(
+                '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels.items()
+            )
+            return "{" + items + "}"
+
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for kind, metric_type in (("counters", "counter"), ("gauges", "gauge")):
+            for metric in sorted(snapshot[kind], key=lambda m: m["name"]):
+                name = prefix + metric["name"]
+                if name not in typed:
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    typed.add(name)
+                lines.append(f"{name}{labels_str(metric['labels'])} {metric['value']}")
+        for metric in sorted(snapshot["histograms"], key=lambda m: m["name"]):
+            name = prefix + metric["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in metric["buckets"].items():
+                cumulative += count
+                le = "+Inf" if bound == "inf" else bound
+                lines.append(f"{name}_bucket{labels_str(metric['labels'], le=le)} {cumulative}")
+            lines.append(f"{name}_sum{labels_str(metric['labels'])} {metric['sum']}")
+            lines.append(f"{name}_count{labels_str(metric['labels'])} {metric['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class BaseExporter:
+    """Base class of metric exporters, started and stopped with a crawl."""
+
+    def start(self, metrics):
+        self.metrics = metrics
+
+    def stop(self):
+        pass
+
+
+class PeriodicExporter(BaseExporter):
+    """Export a snapshot of the metrics every ``interval`` seconds, and a
+    last one when stopped."""
+
+    def __init__(self, interval=10):
+        self.interval = interval
+        self._stopped = Event()
+        self._thread = None
+
+    def export(self, snapshot):
+        raise NotImplementedError
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.export(self.metrics.snapshot())
+
+    def start(self, metrics):
+        super().start(metrics)
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.export(self.metrics.snapshot())
+
+
+class JSONLinesExporter(PeriodicExporter):
+    """Append snapshots of the metrics to a JSON-lines file.
+
+    Args:
+        path (str): path of the file.
+        interval (float): seconds between two snapshots.
+    """
+
+    def __init__(self, path, interval=10):
+        super().__init__(interval)
+        self.path = path
+
+    def export(self, snapshot):
+        with open(self.path, "a", encoding="utf-8") as fout:
+            fout.write(json.dumps(snapshot) + "\n")
+
+
+class CallbackExporter(PeriodicExporter):
+    """Call a function with snapshots of the metrics.
+
+    Args:
+        callback (callable): called with the dict of :func:`Metrics.snapshot`.
+        interval (float): seconds between two calls.
+    """
+
+    def __init__(self, callback, interval=10):
+        super().__init__(interval)
+        self.callback = callback
+
+    def export(self, snapshot):
+        try:
+            self.callback(snapshot)
+        except Exception as e:
+            logging.getLogger(__name__).error("Exception caught in the metrics callback, error: %s", e)
+
+
+class PrometheusExporter(BaseExporter):
+    """Serve the metrics at ``http://<host>:<port>/metrics`` for Prometheus.
+
+    Args:
+        port (int): port of the server, 0 means a free port.
+        host (str): address of the server.
+    """
+
+    def __init__(self, port=9100, host="127.0.0.1"):
+        self.port = port
+        self.host = host
+        self.server = None
+
+    def start(self, metrics):
+        super().start(metrics)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] != "/metrics":
+                    handler.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.server.server_port
+        Thread(target=self.server.serve_forever, name="metrics-server", daemon=True).start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+EXPORTERS = {"prometheus": PrometheusExporter, "jsonl": JSONLinesExporter, "callback": CallbackExporter}
+
+
+def timed_iter(iterable, metrics, name, **labels):
+    """Iterate over ``iterable``, observing the total time spent in it.
+
+    Only the time of producing the items is observed, not the time spent by
+    the caller between them, e.g. for a lazy :func:`Parser.parse`.
+    """
+    iterator = iter(iterable)
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += time.perf_counter() - start
+                return
+            elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        metrics.observe(name, elapsed, **labels)
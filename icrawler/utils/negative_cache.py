@@ -0,0 +1,125 @@
+"""Persistent cache of the file urls which failed or were rejected"""
+
+import json
+import os
+import os.path as osp
+import sqlite3
+import time
+from threading import Lock
+
+from .dedup import url_fingerprint
+
+DAY = 24 * 3600
+
+# seconds for which every class of failures is remembered
+DEFAULT_TTLS = {
+    # "404 Not Found" or "410 Gone"
+    "missing": 30 * DAY,
+    # other failures, e.g. timeouts or retries given up
+    "error": DAY,
+    # bodies which are not images
+    "invalid": 30 * DAY,
+    # files refused by ``keep_file``, e.g. images too small
+    "rejected": 30 * DAY,
+}
+
+
+class NegativeCache:
+    """Cache of the file urls which failed or were rejected, kept across runs.
+
+    The downloader looks up every file url before requesting it, and skips
+    the ones which failed recently, so that crawling the same keywords again
+    does not request the dead links, the pages which are not images and the
+    images rejected by :func:`Downloader.keep_file` again. Every class of
+    failures is remembered for its own time to live, failures which may not
+    last, e.g. timeouts, for less time than missing files.
+
+    Urls are identified by :func:`url_fingerprint`, and the cache is a SQLite
+    database at ``<root_dir>/<namespace>.sqlite``, shared by threads and
+    forked worker processes.
+
+    Args:
+        root_dir (str): Directory of the database.
+        ttls (dict, optional): Seconds to remember every class of failures,
+            overriding :data:`DEFAULT_TTLS`, e.g. ``{"error": 3600}``. A
+            class whose time to live is 0 or None is not remembered.
+        namespace (str): Name of the database file.
+    """
+
+    def __init__(self, root_dir, ttls=None, namespace="negative"):
+        os.makedirs(root_dir, exist_ok=True)
+        self.filepath = osp.join(root_dir, f"{namespace}.sqlite")
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self._lock = Lock()
+        self._pid = None
+        self._connect()
+
+    def _connect(self):
+        # sqlite connections must not be shared with forked processes
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.filepath, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS failures "
+            "(key BLOB PRIMARY KEY, reason TEXT, info TEXT, expires REAL) WITHOUT ROWID"
+        )
+
+    def _execute(self, sql, params=()):
+        if self._pid != os.getpid():
+            self._connect()
+        return self._conn.execute(sql, params)
+
+    def add(self, url, reason, info=None):
+        """Remember a failure of an url.
+
+        Args:
+            url (str): the file url.
+            reason (str): the class of the failure, a key of ``ttls``.
+            info (dict, optional): details, e.g. the size of a rejected
+                image, returned by :func:`get`.
+
+        Returns:
+            bool: whether it is remembered, i.e. the class has a time to
+            live.
+        """
+        ttl = self.ttls.get(reason)
+        if not ttl:
+            return False
+        row = (url_fingerprint(url), reason, json.dumps(info or {}), time.time() + ttl)
+        with self._lock:
+            self._execute("INSERT OR REPLACE INTO failures VALUES (?, ?, ?, ?)", row)
+        return True
+
+    def get(self, url):
+        """Look up an url.
+
+        Returns:
+            tuple or None: the class and the details of its last failure, or
+            None if it has not failed or the failure has expired.
+        """
+        with self._lock:
+            row = self._execute(
+                "SELECT reason, info FROM failures WHERE key = ? AND expires > ?", (url_fingerprint(url), time.time())
+            ).fetchone()
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def remove(self, url):
+        """Forget the failure of an url, e.g. after it succeeded."""
+        with self._lock:
+            self._execute("DELETE FROM failures WHERE key = ?", (url_fingerprint(url),))
+
+    def purge(self):
+        """Delete the expired failures.
+
+        Returns:
+            int: the number of deleted failures.
+        """
+        with self._lock:
+            return self._execute("DELETE FROM failures WHERE expires <= ?", (time.time(),)).rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._execute("SELECT COUNT(*) FROM failures WHERE expires > ?", (time.time(),)).fetchone()[0]
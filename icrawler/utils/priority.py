@@ -0,0 +1,128 @@
+"""Queue taking the items with the highest scores first"""
+
+import heapq
+from itertools import count
+from threading import current_thread
+from urllib.parse import urlsplit
+
+from .cached_queue import CachedQueue
+
+
+def by_depth(item, depth):
+    """Take the shallow pages first, i.e. a breadth-first crawl."""
+    return -depth
+
+
+def by_size(item, depth):
+    """Take the largest images first.
+
+    The size is estimated with the ``img_size`` (width, height), or the
+    ``width`` and ``height`` fields of a task, tasks without them come last.
+    The builtin parsers do not put them in their tasks, so it only orders
+    the tasks of custom parsers which do, otherwise the tasks are taken in
+    the order they are found.
+    """
+    if not isinstance(item, dict):
+        return 0
+    size = item.get("img_size") or (item.get("width"), item.get("height"))
+    try:
+        return int(size[0]) * int(size[1])
+    except (TypeError, ValueError, IndexError):
+        return 0
+
+
+class ByHost:
+    """Take the items of different hosts in turn.
+
+    The score of an item is minus the number of items of its host put
+    before it, so that a page linking to many pages of the same host does
+    not keep the others waiting.
+    """
+
+    def __init__(self):
+        self.counts = {}
+
+    def __call__(self, item, depth):
+        url = item.get("file_url") if isinstance(item, dict) else item
+        host = urlsplit(url).hostname if isinstance(url, str) else None
+        self.counts[host] = self.counts.get(host, 0) + 1
+        return -self.counts[host]
+
+
+DISCIPLINES = {"depth": by_depth, "size": by_size, "host": ByHost}
+
+
+def get_discipline(discipline):
+    """Get a scoring function by its name.
+
+    Args:
+        discipline (str or callable): "depth", "size", "host" or a function
+            ``score(item, depth)``.
+
+    Returns:
+        callable: the scoring function.
+    """
+    if callable(discipline):
+        return discipline
+    try:
+        score = DISCIPLINES[discipline]
+    except KeyError:
+        raise ValueError(f'unknown queue discipline "{discipline}", choose from {sorted(DISCIPLINES)}') from None
+    return score() if isinstance(score, type) else score
+
+
+class PriorityCachedQueue(CachedQueue):
+    """Queue taking the items with the highest scores first.
+
+    Items are scored by ``score(item, depth)`` when they are put, items
+    with equal scores are taken in the order they are put. The depth of an
+    item is 0 if it is put by a producer, and the depth of the item being
+    processed plus 1 if it is put by a consumer, e.g. page urls fed back by
+    the parser of :class:`GreedyImageCrawler`. Items retried or restored
+    from a checkpoint keep their depth.
+
+    Args:
+        maxsize (int): Max number of items, 0 means unlimited.
+        score (str or callable): the queue discipline, see
+            :func:`get_discipline`.
+        **kwargs: Arguments of :class:`CachedQueue`.
+    """
+
+    def __init__(self, maxsize=0, score="depth", **kwargs):
+        self.score = get_discipline(score)
+        self._counter = count()
+        self._depths = {}
+        super().__init__(maxsize, **kwargs)
+
+    def _init(self, maxsize):
+        self.queue = []
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _current_depth(self):
+        # consumers are the threads which have got items from the queue
+        return self._depths.get(current_thread().name, -1)
+
+    def _put(self, item):
+        self._put_at(item, self._current_depth() + 1)
+
+    def _put_at(self, item, depth):
+        heapq.heappush(self.queue, (-self.score(item, depth), next(self._counter), depth, item))
+
+    def _get(self):
+        _, _, depth, item = heapq.heappop(self.queue)
+        self._depths[current_thread().name] = depth
+        if self.journal is not None:
+            self._in_progress[current_thread().name] = item
+        return item
+
+    def restore(self, items, depths=None):
+        if depths is None:
+            depths = [0] * len(items)
+        with self.mutex:
+            for item, depth in zip(items, depths):
+                # the depths of older journals are unknown
+                self._put_at(item, 0 if depth is None else depth)
+            self.unfinished_tasks += len(items)
+            self.not_empty.notify_all()
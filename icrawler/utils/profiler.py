@@ -0,0 +1,167 @@
+"""Sampling profiler attributing the CPU time of a crawl to its stages and hooks"""
+
+import os.path as osp
+import sys
+import threading
+import time
+from collections import Counter
+
+STAGES = ("feeder", "parser", "downloader")
+
+
+def _cpu_clock(ident):
+    """Get a function returning the CPU time of a thread, or None if the
+    platform has no per-thread CPU clocks."""
+    try:
+        clock_id = time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        return None
+    return lambda: time.clock_gettime(clock_id)
+
+
+class SamplingProfiler(threading.Thread):
+    """Sample the stacks of the threads of a crawl.
+
+    Every ``interval`` seconds, the stack of every thread is taken with
+    :func:`sys._current_frames` and weighted by the CPU time the thread used
+    since the last sample, so that threads waiting for the network or for
+    a queue do not count. On platforms without per-thread CPU clocks, the
+    samples are weighted by the wall-clock time instead. The CPU time is
+    attributed to the stack at the time of the sample, so shorter intervals
+    attribute short bursts more precisely.
+
+    Every sample is attributed to a stage, given by the name of the thread
+    (``feeder``, ``parser`` or ``downloader``), and to the innermost hook
+    in the stack, e.g. ``BingParser.parse`` or ``ImageDownloader.keep_file``,
+    see :func:`add_hooks`. Threads of other pools, e.g. the executor of
+    :class:`AsyncCrawler`, get the stage of their hook, or ``other``.
+
+    Args:
+        interval (float): Seconds between two samples.
+        path (str, optional): If set, the samples are written to this file
+            as collapsed stacks when the profiler stops, which is the input
+            of flamegraph tools such as ``flamegraph.pl`` or speedscope.
+            Counts are microseconds.
+    """
+
+    def __init__(self, interval=0.01, path=None):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.path = path
+        self.stacks = Counter()
+        self.stages = Counter()
+        self.hooks = Counter()
+        self._hook_codes = {}
+        self._clocks = {}
+        self._last_time = None
+        self._stopped = threading.Event()
+
+    def add_hooks(self, obj, *names, stage=None):
+        """Attribute the time spent in some methods of an object to them.
+
+        Args:
+            obj (object): e.g. the parser of a crawler.
+            *names: names of the methods, e.g. ``"parse"``.
+            stage (str, optional): stage of the samples of these methods in
+                threads which are not named after a stage.
+        """
+        for name in names:
+            func = getattr(type(obj), name, None)
+            code = getattr(func, "__code__", None)
+            if code is not None:
+                self._hook_codes[code] = (f"{type(obj).__name__}.{name}", stage)
+
+    def stop(self):
+        """Stop sampling and write the collapsed stacks if ``path`` is set."""
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+        if self.path is not None:
+            self.write(self.path)
+
+    def run(self):
+        self._last_time = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def _weight(self, thread, wall_time):
+        """Get the CPU time used by a thread since the last sample."""
+        # threads are the keys as their idents may be reused
+        if thread not in self._clocks:
+            clock = _cpu_clock(thread.ident)
+            try:
+                self._clocks[thread] = [clock, clock() if clock else 0.0]
+            except OSError:
+                pass
+            return 0.0
+        clock, last = self._clocks[thread]
+        if clock is None:
+            return wall_time
+        try:
+            now = clock()
+        except OSError:
+            # the thread has exited
+            return 0.0
+        self._clocks[thread][1] = now
+        return now - last
+
+    def sample(self):
+        """Take a sample of all the threads."""
+        now = time.perf_counter()
+        wall_time, self._last_time = now - self._last_time, now
+        threads = {thread.ident: thread for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            thread = threads.get(ident)
+            if thread is None or thread is self:
+                continue
+            weight = round(self._weight(thread, wall_time) * 1e6)
+            if weight <= 0:
+                continue
+            stack = []
+            hook = None
+            while frame is not None:
+                code = frame.f_code
+                if hook is None and code in self._hook_codes:
+                    hook = self._hook_codes[code]
+                stack.append(f"{code.co_name} ({osp.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stage = thread.name.rsplit("-", 1)[0]
+            if stage not in STAGES:
+                stage = hook[1] if hook is not None and hook[1] else "other"
+            stack.append(stage)
+            self.stacks[";".join(reversed(stack))] += weight
+            self.stages[stage] += weight
+            if hook is not None:
+                self.hooks[hook[0]] += weight
+
+    def write(self, path):
+        """Write the samples as collapsed stacks."""
+        with open(path, "w", encoding="utf-8") as fout:
+            for stack, weight in sorted(self.stacks.items()):
+                fout.write(f"{stack} {weight}\n")
+
+    def report(self, top=10):
+        """Summarize the CPU time per stage, per hook and per function.
+
+        Args:
+            top (int): number of functions listed, by the time spent in
+                them excluding their callees.
+
+        Returns:
+            str: the report.
+        """
+        total = sum(self.stages.values()) or 1
+        functions = Counter()
+        for stack, weight in self.stacks.items():
+            functions[stack.rsplit(";", 1)[-1]] += weight
+
+        def section(title, counter, limit=None):
+            lines = [title]
+            for name, weight in counter.most_common(limit):
+                lines.append(f"  {weight / 1e6:9.3f}s {100 * weight / total:5.1f}%  {name}")
+            return lines
+
+        lines = section("CPU time per stage:", self.stages)
+        lines += section("CPU time in hooks:", self.hooks)
+        lines += section(f"Top {top} functions:", functions, top)
+        return "\n".join(lines)
@@ -0,0 +1,216 @@
+"""Classification, budgets and backoff of the retries of failed requests"""
+
+import random
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import urlsplit
+
+import requests
+
+from .. import defaults
+from .scheduler import retry_after
+
+# failures of the connection, which may succeed if tried again
+TRANSIENT_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    ConnectionError,
+    TimeoutError,
+)
+
+# statuses telling the client to try again, maybe later
+RETRY_STATUSES = frozenset([408, 425, 429, 500, 502, 503, 504])
+
+
+def classify(error):
+    """Tell whether a failed request is worth retrying.
+
+    Responses with a status in :data:`RETRY_STATUSES`, e.g. "429 Too Many
+    Requests" or "503 Service Unavailable", and connection errors or
+    timeouts are transient. Other statuses, e.g. "404 Not Found" or "410
+    Gone", and any other errors, e.g. invalid urls, are permanent.
+
+    >>> from requests import HTTPError, Response
+    >>> response = Response()
+    >>> response.status_code = 404
+    >>> classify(HTTPError(response=response))
+    (False, None)
+    >>> response.status_code = 503
+    >>> response.headers["Retry-After"] = "30"
+    >>> classify(HTTPError(response=response))
+    (True, 30.0)
+    >>> classify(requests.ConnectionError())
+    (True, None)
+
+    Args:
+        error (Exception): the exception raised by the request.
+
+    Returns:
+        tuple: whether to retry, and the seconds to wait asked by the server
+        with ``Retry-After`` (or None).
+    """
+    response = getattr(error, "response", None)
+    if response is not None and getattr(response, "status_code", None) is not None:
+        if response.status_code not in RETRY_STATUSES:
+            return False, None
+        if "Retry-After" in response.headers:
+            return True, retry_after(response)
+        return True, None
+    return isinstance(error, TRANSIENT_ERRORS), None
+
+
+class RetryBudget:
+    """Token bucket limiting the retries to a fraction of the requests.
+
+    Every request adds ``ratio`` token, up to ``burst`` tokens, and every
+    retry takes one, so that when a host, or the whole network, is down the
+    retries add at most ``ratio`` times the requests instead of multiplying
+    them.
+
+    Args:
+        ratio (float): Retries allowed per request.
+        burst (int): Max number of tokens, i.e. retries which can be made at
+            once after a period without failures.
+    """
+
+    def __init__(self, ratio=0.2, burst=10):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = float(burst)
+
+    def deposit(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def withdraw(self):
+        """Take a token if there is one.
+
+        Returns:
+            bool: whether a retry is allowed.
+        """
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RetryPolicy:
+    """Decide whether and when failed requests are tried again.
+
+    A failed request is tried again if it is transient (see
+    :func:`classify`), it has been tried fewer than ``max_attempts`` times,
+    and both the global budget and the budget of its host allow one more
+    retry (see :class:`RetryBudget`). It is delayed by the ``Retry-After``
+    of the response, or by a random exponential backoff otherwise.
+
+    The parser and the downloader do not wait for the delay, they put the
+    page url or the task back into their queue to be taken again after it,
+    see :func:`CachedQueue.retry`. Other requests made with
+    :class:`Session` wait for it.
+
+    Args:
+        max_attempts (int): Max number of attempts of a request.
+        backoff_base (float): Base of the exponential backoff, the n-th
+            retry is delayed by up to ``backoff_base ** n`` seconds.
+        max_delay (float): Max delay of a retry in seconds, requests whose
+            ``Retry-After`` is longer are not retried.
+        budget_ratio (float): Retries allowed per request of all hosts.
+        budget_burst (int): Size of the global budget.
+        host_budget_ratio (float): Retries allowed per request of a host.
+        host_budget_burst (int): Size of the budget of every host.
+        capacity (int): Max number of urls being retried, and of hosts whose
+            budget is not full, which are kept track of. The earliest are
+            discarded when it is exceeded. 0 means unlimited.
+    """
+
+    def __init__(
+        self,
+        max_attempts=defaults.MAX_RETRIES,
+        backoff_base=defaults.BACKOFF_BASE,
+        max_delay=60.0,
+        budget_ratio=0.2,
+        budget_burst=100,
+        host_budget_ratio=0.2,
+        host_budget_burst=10,
+        capacity=100000,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.max_delay = max_delay
+        self.host_budget_ratio = host_budget_ratio
+        self.host_budget_burst = host_budget_burst
+        self.capacity = capacity
+        self.budget = RetryBudget(budget_ratio, budget_burst)
+        # only the hosts whose budget is not full, a missing one is full
+        self._host_budgets = OrderedDict()
+        self._attempts = OrderedDict()
+        self._lock = Lock()
+
+    def _keep(self, entries, key, value):
+        if self.capacity > 0 and len(entries) >= self.capacity:
+            entries.popitem(False)
+        entries[key] = value
+
+    def _host_budget(self, host):
+        if host not in self._host_budgets:
+            self._keep(self._host_budgets, host, RetryBudget(self.host_budget_ratio, self.host_budget_burst))
+        return self._host_budgets[host]
+
+    def on_request(self, url):
+        """Count a request sent, which adds to the budgets."""
+        host = urlsplit(url).hostname or ""
+        with self._lock:
+            self.budget.deposit()
+            budget = self._host_budgets.get(host)
+            if budget is not None:
+                budget.deposit()
+                if budget.tokens >= budget.burst:
+                    del self._host_budgets[host]
+
+    def backoff(self, attempt):
+        """Get the delay before the retry following the n-th attempt."""
+        return random.uniform(0, min(self.max_delay, self.backoff_base**attempt))
+
+    def decide(self, url, error, max_attempts=None):
+        """Decide whether to retry a failed request.
+
+        The attempts of every url are counted until it is given up, or
+        forgotten with :func:`forget` once it succeeds.
+
+        Args:
+            url (str): the requested url.
+            error (Exception): the exception raised by the request.
+            max_attempts (int, optional): overrides ``max_attempts``.
+
+        Returns:
+            tuple: the seconds to wait before retrying (or None if it is not
+            retried), and the reason, one of "retry", "permanent",
+            "attempts", "delay" and "budget".
+        """
+        max_attempts = self.max_attempts if max_attempts is None else max_attempts
+        retryable, delay = classify(error)
+        host = urlsplit(url).hostname or ""
+        with self._lock:
+            attempt = self._attempts.pop(url, 0) + 1
+            if not retryable:
+                return None, "permanent"
+            if attempt >= max_attempts:
+                return None, "attempts"
+            if delay is not None and delay > self.max_delay:
+                return None, "delay"
+            if self.budget.tokens < 1 or not self._host_budget(host).withdraw():
+                return None, "budget"
+            self.budget.withdraw()
+            self._keep(self._attempts, url, attempt)
+        return (self.backoff(attempt) if delay is None else delay), "retry"
+
+    def forget(self, url):
+        """Forget the failed attempts of an url, e.g. after it succeeded."""
+        if self._attempts:
+            with self._lock:
+                self._attempts.pop(url, None)
+
+    def attempts(self, url):
+        """Get the number of failed attempts of an url being retried."""
+        with self._lock:
+            return self._attempts.get(url, 0)
@@ -0,0 +1,252 @@
+"""Queue scheduling the download tasks of different hosts politely"""
+
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from queue import Empty
+from threading import current_thread
+from urllib.parse import urlsplit
+
+from .cached_queue import CachedQueue, QueueClosed
+
+
+def retry_after(response, default=5.0):
+    """Get the seconds to wait from the ``Retry-After`` header of a response.
+
+    >>> from requests import Response
+    >>> response = Response()
+    >>> response.headers["Retry-After"] = "30"
+    >>> retry_after(response)
+    30.0
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    """Token bucket limiting the rate of requests.
+
+    Args:
+        rate (float): Tokens added per second, 0 means no limit.
+        burst (int): Max number of tokens, i.e. requests which can be made
+            at once after being idle.
+    """
+
+    def __init__(self, rate=0, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now=None):
+        """Seconds to wait until a token is available."""
+        now = time.monotonic() if now is None else now
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now=None):
+        """Take a token, :func:`delay` should be 0 before calling it."""
+        now = time.monotonic() if now is None else now
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1
+
+    def pause(self, seconds):
+        """Give no tokens for some seconds."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class HostScheduler(CachedQueue):
+    """Queue of tasks which keeps a sub-queue per host.
+
+    Tasks of different hosts are taken in a round-robin way, and every host
+    is limited by a token bucket and a number of tasks being processed at
+    the same time, so that a burst of urls of one host neither gets the
+    crawler banned by it nor keeps the threads from downloading files of
+    other hosts. A task is being processed from :func:`get` to
+    :func:`task_done`.
+
+    Args:
+        maxsize (int): Max number of tasks of all hosts, 0 means unlimited.
+            A small size would let one host fill the queue and block the
+            tasks of the others.
+        rate (float): Requests per second of every host, 0 means no limit.
+        burst (int): Size of the token buckets.
+        concurrency (int): Max number of tasks of a host processed at the
+            same time, 0 means no limit.
+        hosts (dict, optional): Settings overriding ``rate``, ``burst`` and
+            ``concurrency`` for some hosts, e.g.
+            ``{"i.example.com": {"rate": 10, "concurrency": 8}}``.
+        **kwargs: Arguments of :class:`CachedQueue`.
+    """
+
+    def __init__(self, maxsize=0, rate=0, burst=1, concurrency=0, hosts=None, **kwargs):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.hosts = {} if hosts is None else dict(hosts)
+        self._buckets = {}
+        self._running = {}
+        self._active = {}
+        self._selected = None
+        super().__init__(maxsize, **kwargs)
+
+    def _init(self, maxsize):
+        self.queue = {}
+        self._ring = deque()
+        self._size = 0
+
+    def _qsize(self):
+        return self._size
+
+    @staticmethod
+    def host_of(item):
+        """Get the host of a task or an url."""
+        url = item.get("file_url") if isinstance(item, dict) else item
+        if not isinstance(url, str):
+            return ""
+        return urlsplit(url).hostname or ""
+
+    def _setting(self, host, name):
+        return self.hosts.get(host, {}).get(name, getattr(self, name))
+
+    def _bucket(self, host):
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self._setting(host, "rate"), self._setting(host, "burst"))
+        return self._buckets[host]
+
+    def _put(self, item):
+        host = self.host_of(item)
+        if host not in self.queue:
+            self.queue[host] = deque()
+            self._ring.append(host)
+        self.queue[host].append(item)
+        self._size += 1
+
+    def _schedule(self):
+        """Find the next host whose task can be taken.
+
+        Returns:
+            tuple: the host (or None) and the seconds to wait before a task
+            may be available (or None if it depends on :func:`task_done`).
+        """
+        now = time.monotonic()
+        wait = None
+        for _ in range(len(self._ring)):
+            host = self._ring[0]
+            self._ring.rotate(-1)
+            concurrency = self._setting(host, "concurrency")
+            if concurrency > 0 and self._running.get(host, 0) >= concurrency:
+                continue
+            delay = self._bucket(host).delay(now)
+            if delay <= 0:
+                return host, 0
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _get(self):
+        host = self._selected
+        item = self.queue[host].popleft()
+        if not self.queue[host]:
+            del self.queue[host]
+            self._ring.remove(host)
+        self._size -= 1
+        self._bucket(host).consume()
+        self._running[host] = self._running.get(host, 0) + 1
+        self._active.setdefault(current_thread().name, deque()).append(host)
+        if self.journal is not None:
+            self._in_progress[current_thread().name] = item
+        return item
+
+    def get(self, block=True, timeout=None):
+        """Take a task of a host which is ready.
+
+        It blocks until a task can be taken without exceeding the rate and
+        the concurrency of its host, or raises ``queue.Empty`` after
+        ``timeout`` seconds.
+        """
+        deadline = self._deadline(timeout)
+        with self.not_empty:
+            while True:
+                if self.closed:
+                    raise QueueClosed
+                due = self._release_due() if self._delayed else None
+                host, wait = self._schedule() if self._size else (None, None)
+                if host is not None:
+                    break
+                if not block:
+                    raise Empty
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                if due is not None and (wait is None or due < wait):
+                    wait = due
+                if wait is None or (remaining is not None and remaining < wait):
+                    wait = remaining
+                self.not_empty.wait(wait)
+            self._selected = host
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+    def task_done(self):
+        """Indicate that the task got by the current thread is processed."""
+        with self.mutex:
+            hosts = self._active.get(current_thread().name)
+            if hosts:
+                host = hosts.popleft()
+                if not hosts:
+                    del self._active[current_thread().name]
+                self._running[host] -= 1
+                if not self._running[host]:
+                    del self._running[host]
+                self.not_empty.notify_all()
+        super().task_done()
+
+    def backoff(self, item, seconds):
+        """Stop taking tasks of the host of an item for some seconds.
+
+        It is called when the host responds with "429 Too Many Requests".
+        """
+        with self.mutex:
+            self._bucket(self.host_of(item)).pause(seconds)
+
+    def clear(self):
+        with self.mutex:
+            self.unfinished_tasks = max(0, self.unfinished_tasks - self._size - len(self._delayed))
+            self.queue.clear()
+            self._delayed.clear()
+            self._ring.clear()
+            self._size = 0
+            if self.unfinished_tasks == 0:
+                self.all_tasks_done.notify_all()
+                if self.finished:
+                    self._close()
+            self.not_full.notify_all()
+
+    def restore(self, items, depths=None):
+        with self.mutex:
+            for item in items:
+                self._put(item)
+            self.unfinished_tasks += len(items)
+            self.not_empty.notify_all()
@@ -1,37 +1,149 @@
 from __future__ import annotations
 
 import logging
+import time
 from collections.abc import Mapping
 from urllib.parse import urlsplit
 
 import requests
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 
-from .. import defaults
+from .adapters import HTTP2Adapter, PooledAdapter
+from .http_cache import CachingAdapter, HTTPCache
 from .proxy_pool import ProxyPool
+from .retry import RetryPolicy
 
 
 class Session(requests.Session):
     def __init__(
-        self, proxy_pool: ProxyPool | None = None, headers: Mapping | None = None, cookies: Mapping | None = None
+        self,
+        proxy_pool: ProxyPool | None = None,
+        headers: Mapping | None = None,
+        cookies: Mapping | None = None,
+        retry_policy: RetryPolicy | None = None,
+        cache: HTTPCache | None = None,
+        **pool_kwargs,
     ):
         super().__init__()
         self.logger = logging.getLogger("cscholars.connection")
         self.proxy_pool = proxy_pool
+        self.retry_policy = RetryPolicy() if retry_policy is None else retry_policy
+        self.cache = cache
         if headers is not None:
             self.headers.update(headers)
         if cookies is not None:
             self.cookies.update(cookies)
+        self.configure_pools(**pool_kwargs)
+
+    def configure_pools(
+        self,
+        pool_maxsize: int = 10,
+        pool_connections: int = 10,
+        host_limits: Mapping | None = None,
+        pool_timeout: float = 60,
+        http2: bool = False,
+    ):
+        """Replace the transport adapters with new connection pools.
+
+        Args:
+            pool_maxsize: Number of connections kept alive per host. Threads
+                beyond it open connections which are closed after use, so
+                it should be no less than the number of threads.
+            pool_connections: Number of hosts whose connections are kept.
+            host_limits: Max number of connections to some hosts, requests
+                to these hosts wait for a free connection.
+            pool_timeout: Max seconds to wait for a free connection to the
+                hosts with a limit.
+            http2: Whether to use HTTP/2 for https urls, which requires
+                ``httpx[http2]``.
+        """
+        for adapter in self.adapters.values():
+            adapter.close()
+        adapter = PooledAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            host_limits=host_limits,
+            pool_timeout=pool_timeout,
+        )
+        self.mount("http://", adapter)
+        if http2:
+            self.mount("https://", HTTP2Adapter(adapter, max_connections=pool_maxsize))
+        else:
+            self.mount("https://", adapter)
+        if self.cache is not None:
+            self.set_cache(self.cache)
+
+    def set_cache(self, cache: HTTPCache | None = None):
+        """Serve the GET requests which are not streamed, i.e. pages but
+        not files, from an on-disk cache, see :class:`HTTPCache`.
+
+        Args:
+            cache: the cache, or None to send all the requests.
+        """
+        self.cache = cache
+        wrappers = {}
+        for prefix, adapter in list(self.adapters.items()):
+            if isinstance(adapter, CachingAdapter):
+                adapter = adapter.adapter
+            if cache is not None:
+                # adapters mounted for several prefixes share a wrapper
+                if id(adapter) not in wrappers:
+                    wrappers[id(adapter)] = CachingAdapter(adapter, cache)
+                adapter = wrappers[id(adapter)]
+            self.mount(prefix, adapter)
+
+    def connection_stats(self) -> dict:
+        """Get the number of requests made and connections opened.
+
+        Returns:
+            dict: ``requests``, ``connections`` and ``reused``, the number of
+            requests sent over an existing connection.
+        """
+        adapters = {}
+        for adapter in self.adapters.values():
+            if isinstance(adapter, CachingAdapter):
+                adapter = adapter.adapter
+            adapters[id(adapter)] = adapter
+        # the fallback of an HTTP2Adapter is mounted as well
+        fallbacks = {id(adapter.fallback) for adapter in adapters.values() if isinstance(adapter, HTTP2Adapter)}
+        num_requests = num_connections = 0
+        for key, adapter in adapters.items():
+            if key not in fallbacks and hasattr(adapter, "connection_stats"):
+                adapter_requests, adapter_connections = adapter.connection_stats()
+                num_requests += adapter_requests
+                num_connections += adapter_connections
+        return dict(requests=num_requests, connections=num_connections, reused=max(0, num_requests - num_connections))
 
     def _url_scheme(self, url):
         return urlsplit(url).scheme
 
-    @retry(
-        stop=stop_after_attempt(defaults.MAX_RETRIES),
-        wait=wait_random_exponential(exp_base=defaults.BACKOFF_BASE),
-        retry=retry_if_exception_type(requests.RequestException),
-    )
-    def request(self, method, url, *args, **kwargs):
+    def request(self, method, url, *args, retry=True, **kwargs):
+        """Make a request, and try it again as the retry policy decides.
+
+        Args:
+            retry (bool): Whether to wait and retry a failed request here.
+                The parser and the downloader make requests with
+                ``retry=False``, and reschedule the failed ones and call
+                ``retry_policy.forget()`` themselves, see
+                :class:`RetryPolicy`.
+        """
+        while True:
+            self.retry_policy.on_request(url)
+            try:
+                response = self._request(method, url, *args, **kwargs)
+            except Exception as e:
+                if not retry:
+                    raise
+                delay, _ = self.retry_policy.decide(url, e)
+                if delay is None:
+                    raise
+                self.logger.debug("retrying %s in %.2f seconds, error: %s", url, delay, e)
+                time.sleep(delay)
+            else:
+                if retry:
+                    self.retry_policy.forget(url)
+                return response
+
+    def _request(self, method, url, *args, **kwargs):
         message = f"{method}ing {url}"
         if args and kwargs:
             message += f" with {args} and {kwargs}"
@@ -41,8 +153,8 @@ class Session(requests.Session):
             message += f" with {kwargs}"
         self.logger.debug(message)
 
-        if self.proxy_pool is not None:
-            proxy = self.proxy_pool.get_next(protocol=self._url_scheme(url))
+        proxy = None if self.proxy_pool is None else self.proxy_pool.get_next(protocol=self._url_scheme(url))
+        if proxy is not None:
             self.logger.debug(f"Using proxy: {proxy.format()}")
             try:
                 response = super().request(method, url, *args, proxies=proxy.format(), **kwargs)
@@ -55,5 +167,10 @@ class Session(requests.Session):
 
         if "set-cookie" in response.headers:
             self.cookies.update(response.cookies)
-        response.raise_for_status()
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            # streamed responses would keep their connection out of the pool
+            response.close()
+            raise
         return response
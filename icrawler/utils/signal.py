@@ -1,17 +1,33 @@
+from multiprocessing.sharedctypes import RawArray
+from threading import Condition
+
+
 class Signal:
     """Signal class
 
     Provides interfaces for set and get some globally shared variables(signals).
 
+    Signals can be read as attributes, e.g. ``signal.reach_max_num``, which
+    is a plain attribute lookup without any lock, so it is cheap enough for
+    the loops of workers. They are written with :func:`set` and :func:`incr`
+    under a lock, and threads can :func:`wait` until some of them are set.
+
     Attributes:
-        signals: A dict of all signal names and values.
         init_status: The initial values of all signals.
     """
 
     def __init__(self):
         """Init Signal with empty dicts"""
-        self._signals = {}
         self._init_status = {}
+        self._cond = Condition()
+        self._shared = None
+        self._index = {}
+
+    def _store(self, name, value):
+        if self._shared is None:
+            self.__dict__[name] = value
+        else:
+            self._shared[self._index[name]] = value
 
     def set(self, **signals):
         """Set signals.
@@ -20,14 +36,76 @@ class Signal:
             signals: A dict(key-value pairs) of all signals. For example
                      {'signal1': True, 'signal2': 10}
         """
-        for name in signals:
-            if name not in self._signals:
-                self._init_status[name] = signals[name]
-            self._signals[name] = signals[name]
+        with self._cond:
+            for name, value in signals.items():
+                if name not in self._init_status:
+                    if name.startswith("_") or hasattr(type(self), name):
+                        raise ValueError(f'"{name}" cannot be used as a signal name')
+                    if self._shared is not None:
+                        raise KeyError(f'signal "{name}" cannot be added after the signals are shared')
+                    self._init_status[name] = value
+                self._store(name, value)
+            self._cond.notify_all()
+
+    def incr(self, name, delta=1):
+        """Add to a counter atomically.
+
+        Args:
+            name: the signal name, its initial value is 0 if it is not set.
+            delta: the number to be added.
+
+        Returns:
+            The new value.
+        """
+        with self._cond:
+            value = (self.get(name) or 0) + delta
+            self.set(**{name: value})
+            return value
+
+    def wait(self, *names, timeout=None):
+        """Wait until any of the signals is set to a true value.
+
+        Args:
+            names: signal names.
+            timeout: max seconds to wait, or None to wait forever.
+
+        Returns:
+            bool: False if it timed out.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: any(self.get(name) for name in names), timeout)
 
     def reset(self):
         """Reset signals with their initial values"""
-        self._signals = self._init_status.copy()
+        self.set(**self._init_status)
+
+    def share(self, ctx):
+        """Move the signals to shared memory, so that forked worker
+        processes can read and set them.
+
+        Only numbers and booleans can be shared, and no signal can be added
+        afterwards.
+
+        Args:
+            ctx: a ``multiprocessing`` context using the fork start method.
+        """
+        with self._cond:
+            for name, value in self._init_status.items():
+                if not isinstance(value, (bool, int, float)):
+                    raise TypeError(f'signal "{name}" is not a number and cannot be shared')
+            names = list(self._init_status)
+            values = [self.__dict__.pop(name) for name in names]
+            self._index = {name: i for i, name in enumerate(names)}
+            self._shared = RawArray("d", values)
+            self._cond = ctx.Condition()
+
+    def __getattr__(self, name):
+        # only called for shared signals, others are instance attributes
+        index = self.__dict__.get("_index", {}).get(name)
+        if index is None:
+            raise AttributeError(f'no signal named "{name}"')
+        value = self._shared[index]
+        return type(self._init_status[name])(value)
 
     def get(self, name):
         """Get a signal value by its name.
@@ -38,11 +116,10 @@ class Signal:
         Returns:
             Value of the signal or None if the name is invalid.
         """
-        if name in self._signals:
-            return self._signals[name]
-        else:
+        if name not in self._init_status:
             return None
+        return getattr(self, name)
 
     def names(self):
         """Return all the signal names"""
-        return self._signals.keys()
+        return self._init_status.keys()
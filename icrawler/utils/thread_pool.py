@@ -1,7 +1,12 @@
 import logging
+import multiprocessing
+import time
+from multiprocessing.managers import SyncManager
 from threading import Lock, Thread
+from urllib.parse import urlsplit
 
 from .cached_queue import CachedQueue
+from .metrics import Metrics
 
 
 class Worker(Thread):
@@ -14,6 +19,83 @@ class Worker(Thread):
         self.quit = True
 
 
+class WorkerStats:
+    """Counters of the items processed by the workers of a pool.
+
+    Attributes:
+        busy (int): number of workers processing an item now.
+        done (int): number of items processed.
+        errors (int): number of failed attempts, e.g. requests.
+        busy_time (float): total seconds spent on the processed items.
+    """
+
+    def __init__(self):
+        self.busy = 0
+        self.done = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self._start_sum = 0.0
+        self._lock = Lock()
+
+    def begin(self):
+        """Mark the start of an item, returns the start time for :func:`end`."""
+        start = time.perf_counter()
+        with self._lock:
+            self.busy += 1
+            self._start_sum += start
+        return start
+
+    def end(self, start):
+        """Mark the end of an item started at ``start``."""
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.busy -= 1
+            self.done += 1
+            self.busy_time += elapsed
+            self._start_sum -= start
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self):
+        """Get ``(done, errors, busy_time, now)`` at the same time, the busy
+        time including the items being processed."""
+        with self._lock:
+            now = time.perf_counter()
+            return self.done, self.errors, self.busy_time + self.busy * now - self._start_sum, now
+
+
+def get_mp_context():
+    """Get the multiprocessing context used by worker processes.
+
+    Worker processes are forked, so that they inherit the components, their
+    hooks and the shared queues as they are.
+    """
+    try:
+        return multiprocessing.get_context("fork")
+    except ValueError:
+        raise RuntimeError("worker processes require the fork start method, which is not available here")
+
+
+def start_manager(**objects):
+    """Start a manager process serving some objects to worker processes.
+
+    The manager process is forked, so it holds copies of the objects and
+    ``manager.<name>()`` returns a proxy of the copy of ``objects[name]``,
+    which can be used by any process.
+
+    Returns:
+        SyncManager: the started manager.
+    """
+    manager_cls = type("StateManager", (SyncManager,), {})
+    for name, obj in objects.items():
+        manager_cls.register(name, callable=lambda obj=obj: obj)
+    manager = manager_cls(ctx=get_mp_context())
+    manager.start()
+    return manager
+
+
 class ThreadPool:
     """Simple implementation of a thread pool
 
@@ -24,6 +106,12 @@ class ThreadPool:
     it will get a task from the queue and process as wanted, then it will put
     the output to ``out_queue``.
 
+    If ``process_num`` is positive, the pool forks ``process_num`` worker
+    processes instead, each of them running ``thread_num`` threads, so that
+    CPU-bound hooks are not serialized by the GIL. The queues and the signal
+    must be shared between processes in this case, see
+    :func:`Crawler.share_state`.
+
     Note:
         This class is not designed as a generic thread pool, but works
         specifically for crawler components.
@@ -33,7 +121,13 @@ class ThreadPool:
         thread_num (int): number of available threads.
         in_queue (Queue): input queue of tasks.
         out_queue (Queue): output queue of finished tasks.
-        workers (list): a list of working threads.
+        process_num (int): number of worker processes, 0 means the threads
+            run in the current process.
+        workers (list): a list of working threads, or worker processes.
+        stats (WorkerStats): counters of the items processed by the
+            threads of the current process.
+        metrics (Metrics): metrics of the pipeline, shared by the
+            components of a crawler.
         lock (Lock): thread lock.
         logger (Logger): standard python logger.
     """
@@ -43,22 +137,103 @@ class ThreadPool:
         self.in_queue = in_queue if in_queue else CachedQueue(5 * self.thread_num)
         self.out_queue = out_queue if out_queue else CachedQueue(5 * self.thread_num)
         self.name = name if name else __name__
+        self.process_num = 0
         self.workers = []
+        self.stats = WorkerStats()
+        self.metrics = Metrics()
         self.lock = Lock()
         self.logger = logging.getLogger(self.name)
+        self._worker_args = ((), {})
+        self._retiring = 0
 
     def init_workers(self, *args, **kwargs):
         self.workers = []
+        if self.process_num > 0:
+            ctx = get_mp_context()
+            for i in range(self.process_num):
+                worker = ctx.Process(
+                    target=self.process_exec, name=f"{self.name}-{i + 1}", args=(i, args, kwargs), daemon=True
+                )
+                self.workers.append(worker)
+            return
+        self._worker_args = (args, kwargs)
+        self._retiring = 0
         for i in range(self.thread_num):
             worker = Worker(target=self.worker_exec, name=f"{self.name}-{i + 1:03d}", args=args, kwargs=kwargs)
             self.workers.append(worker)
 
+    def add_workers(self, num):
+        """Start more worker threads while the pool is running.
+
+        Returns:
+            int: the number of threads started, 0 if the input queue is
+            closed already.
+        """
+        args, kwargs = self._worker_args
+        with self.lock:
+            if self.process_num > 0 or self.in_queue.closed:
+                return 0
+            for _ in range(num):
+                worker = Worker(
+                    target=self.worker_exec, name=f"{self.name}-{len(self.workers) + 1:03d}", args=args, kwargs=kwargs
+                )
+                self.workers.append(worker)
+                worker.start()
+            self.thread_num += num
+        return num
+
+    def retire_workers(self, num):
+        """Let some worker threads exit once they finish their current item.
+
+        Returns:
+            int: the number of threads to exit, at least one thread is kept.
+        """
+        with self.lock:
+            num = max(0, min(num, self.thread_num - 1))
+            self._retiring += num
+            self.thread_num -= num
+        return num
+
+    def retiring(self):
+        """Check whether the calling worker should exit, see :func:`retire_workers`."""
+        if not self._retiring:
+            return False
+        with self.lock:
+            if self._retiring > 0:
+                self._retiring -= 1
+                return True
+        return False
+
     def start(self, *args, **kwargs):
         self.init_workers(*args, **kwargs)
         for worker in self.workers:
             self.logger.debug("thread %s started", worker.name)
             worker.start()
 
+    def init_process(self):
+        """Prepare a forked worker process before its threads start.
+
+        This method can be overridden to reset resources that must not be
+        shared with the parent process.
+        """
+        pass
+
+    def process_exec(self, index, args, kwargs):
+        """Target method of worker processes, run the worker threads."""
+        self.init_process()
+        self.process_num = 0
+        self.name = f"{self.name}-{index + 1}"
+        self.init_workers(*args, **kwargs)
+        for worker in self.workers:
+            worker.start()
+        for worker in self.workers:
+            worker.join()
+        self.exit_process()
+
+    def exit_process(self):
+        """Clean up a worker process after its threads exit."""
+        pass
+
     def input(self, task, block=True, timeout=None):
         if self.in_queue is not None:
             self.in_queue.put(task, block, timeout)
@@ -67,10 +242,37 @@ class ThreadPool:
         if self.out_queue is not None:
             self.out_queue.put(task, block, timeout)
 
+    def reschedule(self, item, url, error, policy, stage, max_attempts=None):
+        """Put a failed item back into ``in_queue``, if the retry policy
+        decides to retry it, instead of waiting for the retry.
+
+        Args:
+            item (object): the item got from ``in_queue``.
+            url (str): the url requested for the item.
+            error (Exception): the exception raised by the request.
+            policy (RetryPolicy): the retry policy.
+            stage (str): the stage in the metrics, e.g. "page".
+            max_attempts (int, optional): overrides the max attempts of the
+                policy.
+
+        Returns:
+            tuple: the seconds to wait before the retry (or None if it is
+            not retried) and the reason, see :func:`RetryPolicy.decide`.
+        """
+        delay, reason = policy.decide(url, error, max_attempts)
+        if delay is not None and not self.in_queue.retry(item, delay):
+            policy.forget(url)
+            delay, reason = None, "closed"
+        if delay is None:
+            self.metrics.inc("retries_denied_total", stage=stage, reason=reason)
+        else:
+            self.metrics.inc("retries_total", stage=stage, host=urlsplit(url).hostname or "")
+        return delay, reason
+
     def clear_buffer(self, clear_out=False):
-        self.in_queue.queue.clear()
+        self.in_queue.clear()
         if clear_out:
-            self.out_queue.queue.clear()
+            self.out_queue.clear()
 
     def worker_exec(self, *args, **kwargs):
         raise NotImplementedError
@@ -91,6 +293,13 @@ class ThreadPool:
         component.in_queue = self.out_queue
         return component
 
+    def join(self):
+        """Wait until all the workers exit, including the ones added meanwhile."""
+        joined = 0
+        while joined < len(self.workers):
+            self.workers[joined].join()
+            joined += 1
+
     def is_alive(self):
         for worker in self.workers:
             if worker.is_alive():
@@ -0,0 +1,11 @@
+import pytest
+
+from benchmarks.stub_server import start_server
+
+
+@pytest.fixture(scope="session")
+def stub_server():
+    """Base url of a local http server serving result pages and images."""
+    server, base_url = start_server()
+    yield base_url
+    server.shutdown()
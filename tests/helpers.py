@@ -0,0 +1,31 @@
+"""Helpers shared by the tests"""
+
+import re
+
+from icrawler import Feeder, ImageDownloader, Parser
+from icrawler.storage import FileSystem
+from icrawler.utils import Session, Signal
+
+
+def make_downloader(tmp_path):
+    """Make an :class:`ImageDownloader` writing to ``tmp_path``, outside of a crawler."""
+    signal = Signal()
+    signal.set(reach_max_num=False, exceed_storage_space=False)
+    return ImageDownloader(1, signal, Session(), FileSystem(str(tmp_path)))
+
+
+class ListFeeder(Feeder):
+    """Feed the given urls."""
+
+    def feed(self, urls):
+        for url in urls:
+            self.output(url)
+
+
+class PrefixParser(Parser):
+    """Get the images linked from a stub server page, with the paths prefixed
+    by ``prefixes`` in turn, e.g. ``/flaky``."""
+
+    def parse(self, response, base_url, prefixes):
+        for i, src in enumerate(re.findall(r'src="([^"]+)"', response.text)):
+            yield dict(file_url=base_url + prefixes[i % len(prefixes)] + src)
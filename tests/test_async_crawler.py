@@ -0,0 +1,178 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from benchmarks.stub_server import StubFeeder, StubHandler, StubParser
+from icrawler import AsyncCrawler, Crawler, ImageDownloader
+
+
+def run_crawler(crawler_cls, base_url, root_dir, max_num=0):
+    crawler = crawler_cls(
+        feeder_cls=StubFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        parser_threads=2,
+        downloader_threads=8,
+        storage={"root_dir": str(root_dir)},
+    )
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=base_url, page_num=3),
+        parser_kwargs=dict(base_url=base_url),
+        downloader_kwargs=dict(max_num=max_num),
+    )
+    return sorted(os.listdir(root_dir))
+
+
+def test_async_crawler(stub_server, tmp_path):
+    filenames = run_crawler(AsyncCrawler, stub_server, tmp_path)
+    assert filenames == [f"{i:06d}.jpg" for i in range(1, 31)]
+
+
+def test_async_crawler_max_num(stub_server, tmp_path):
+    filenames = run_crawler(AsyncCrawler, stub_server, tmp_path, max_num=5)
+    assert filenames == [f"{i:06d}.jpg" for i in range(1, 6)]
+
+
+def test_async_crawler_restores_queue(stub_server, tmp_path):
+    crawler = AsyncCrawler(
+        feeder_cls=StubFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        storage={"root_dir": str(tmp_path)},
+    )
+    page_queue = crawler.parser.in_queue
+    crawler.crawl(feeder_kwargs=dict(base_url=stub_server, page_num=1), parser_kwargs=dict(base_url=stub_server))
+    assert crawler.parser.in_queue is page_queue and crawler.feeder.out_queue is page_queue
+    assert len(os.listdir(tmp_path)) == 10
+
+
+def test_async_fetch_streams_files(stub_server, tmp_path):
+    import aiohttp
+
+    crawler = AsyncCrawler(downloader_cls=ImageDownloader, storage={"root_dir": str(tmp_path)})
+    task = {"file_url": stub_server + "/large.png"}
+
+    async def fetch_and_check():
+        loop = asyncio.get_running_loop()
+        async with aiohttp.ClientSession() as http:
+            response = await crawler.fetch(http, task["file_url"], 5, stream=True)
+            try:
+                keep = await loop.run_in_executor(None, crawler.downloader.keep_file, task, response, (2000, 2000))
+            finally:
+                response.close()
+        return keep, response
+
+    keep, response = asyncio.run(fetch_and_check())
+    assert not keep and task["img_size"] == (1024, 768)
+    # only the header is received
+    assert len(response.raw.head) < len(StubHandler.large_image)
+
+
+class SlowFeeder(StubFeeder):
+    def feed(self, base_url, page_num):
+        super().feed(base_url, page_num)
+        # a duplicated url now and then, until the queue is closed
+        for _ in range(30):
+            time.sleep(0.1)
+            self.output(f"{base_url}/page/0")
+
+
+def test_async_crawler_max_idle_time(stub_server, tmp_path):
+    crawler = AsyncCrawler(
+        feeder_cls=SlowFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        storage={"root_dir": str(tmp_path)},
+    )
+    start = time.monotonic()
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=stub_server, page_num=1),
+        parser_kwargs=dict(base_url=stub_server),
+        downloader_kwargs=dict(max_idle_time=0.5, queue_timeout=0.1),
+    )
+    # the downloaders exit without waiting for the feeder, which is stopped
+    assert time.monotonic() - start < 2.5
+    assert len(os.listdir(tmp_path)) == 10
+    assert not crawler.feeder.is_alive()
+
+
+class EndlessFeeder(StubFeeder):
+    def feed(self, base_url, page_num):
+        i = 0
+        while True:
+            self.output(f"{base_url}/page/{i}")
+            i += 1
+            time.sleep(0.01)
+
+
+def test_async_crawler_stops_feeder(stub_server, tmp_path, monkeypatch):
+    errors = []
+    monkeypatch.setattr(threading, "excepthook", errors.append)
+    crawler = AsyncCrawler(
+        feeder_cls=EndlessFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        storage={"root_dir": str(tmp_path)},
+    )
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=stub_server, page_num=0),
+        parser_kwargs=dict(base_url=stub_server),
+        downloader_kwargs=dict(max_num=5),
+    )
+    assert len(os.listdir(tmp_path)) == 5
+    # the feeder is stopped before the crawl returns, not feeding the closed loop
+    assert not crawler.feeder.is_alive()
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("feeder-")]
+    time.sleep(0.2)
+    assert crawler.parser.in_queue.empty()
+    assert errors == []
+
+
+def test_threaded_crawler(stub_server, tmp_path):
+    filenames = run_crawler(Crawler, stub_server, tmp_path)
+    assert filenames == [f"{i:06d}.jpg" for i in range(1, 31)]
+
+
+def test_threaded_crawler_finishes_without_idle_timeouts(stub_server, tmp_path):
+    start = time.monotonic()
+    filenames = run_crawler(Crawler, stub_server, tmp_path)
+    assert len(filenames) == 30
+    # the downloader used to wait for its 5 seconds queue timeout
+    assert time.monotonic() - start < 3
+
+
+class FaultyParser(StubParser):
+    def parse(self, response, base_url):
+        if response.url.endswith("/page/2"):
+            raise ValueError("unexpected page")
+        yield from super().parse(response, base_url)
+
+
+class FaultyDownloader(ImageDownloader):
+    def process_meta(self, task):
+        if task["file_url"].endswith("/img/0.jpg"):
+            raise ValueError("unexpected task")
+
+
+@pytest.mark.parametrize("crawler_cls", [Crawler, AsyncCrawler])
+def test_crawler_survives_hook_errors(stub_server, tmp_path, crawler_cls):
+    crawler = crawler_cls(
+        feeder_cls=StubFeeder,
+        parser_cls=FaultyParser,
+        downloader_cls=FaultyDownloader,
+        parser_threads=3,
+        downloader_threads=4,
+        storage={"root_dir": str(tmp_path)},
+    )
+    start = time.monotonic()
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=stub_server, page_num=6),
+        parser_kwargs=dict(base_url=stub_server),
+        downloader_kwargs=dict(max_num=0),
+    )
+    # the crawl finishes without the page whose parser raised
+    assert time.monotonic() - start < 10
+    assert len(os.listdir(tmp_path)) == 50
@@ -0,0 +1,88 @@
+import queue
+import time
+
+from benchmarks.stub_server import StubFeeder, StubParser
+from icrawler import Crawler, ImageDownloader
+from icrawler.utils import AutoScaler, QueueClosed, ThreadPool
+
+
+class SleepPool(ThreadPool):
+    def worker_exec(self):
+        while not self.retiring():
+            try:
+                item = self.in_queue.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            except QueueClosed:
+                break
+            start = self.stats.begin()
+            time.sleep(item)
+            self.stats.end(start)
+            self.in_queue.task_done()
+
+
+def alive(pool):
+    return sum(worker.is_alive() for worker in pool.workers)
+
+
+def test_add_and_retire_workers():
+    pool = SleepPool(2)
+    pool.start()
+    assert pool.add_workers(2) == 2
+    assert pool.thread_num == 4 and alive(pool) == 4
+    assert pool.retire_workers(10) == 3
+    time.sleep(0.2)
+    assert pool.thread_num == 1 and alive(pool) == 1
+    pool.in_queue.close()
+    assert pool.add_workers(1) == 0
+    pool.join()
+
+
+def test_autoscaler_step():
+    parser, downloader = SleepPool(1), SleepPool(2)
+    parser.start()
+    downloader.start()
+    scaler = AutoScaler(parser, downloader, max_downloader_threads=3)
+    scaler.measure(parser)
+    scaler.measure(downloader)
+    # downloaders busy with a filling queue
+    for _ in range(8):
+        downloader.in_queue.restore([0.3])
+    time.sleep(0.25)
+    scaler.step()
+    assert downloader.thread_num == 3 and downloader.in_queue.maxsize == 15
+    # idle downloaders with an empty queue
+    downloader.in_queue.join()
+    scaler.measure(downloader)
+    time.sleep(0.2)
+    scaler.step()
+    assert downloader.thread_num == 2
+    parser.in_queue.close()
+    downloader.in_queue.close()
+    parser.join()
+    downloader.join()
+
+
+def test_crawl_with_autoscale(stub_server, tmp_path):
+    crawler = Crawler(
+        feeder_cls=StubFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        storage={"root_dir": str(tmp_path)},
+        autoscale={"interval": 0.1, "max_downloader_threads": 4},
+    )
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=stub_server, page_num=3),
+        parser_kwargs=dict(base_url=stub_server),
+        downloader_kwargs=dict(max_num=0),
+    )
+    assert len(list(tmp_path.iterdir())) == 30
+    assert not crawler.downloader.is_alive()
+
+
+def test_connection_pools_sized_for_autoscale():
+    crawler = Crawler(downloader_threads=2, autoscale={"max_downloader_threads": 40})
+    # 1 feeder, 16 parsers (the default bound) and 40 downloaders
+    assert crawler.session.get_adapter("http://a.com")._pool_maxsize == 57
+    crawler = Crawler(downloader_threads=2)
+    assert crawler.session.get_adapter("http://a.com")._pool_maxsize == 10
@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from benchmarks.fake_engines import route, start_server
+from icrawler.builtin import (
+    BaiduImageCrawler,
+    BingImageCrawler,
+    FlickrImageCrawler,
+    FlickrSizeCache,
+    GoogleImageCrawler,
+    GreedyImageCrawler,
+    UrlListCrawler,
+)
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    server, base_url = start_server(sizes="64x48:1,128x96:1", site_pages=20)
+    yield server, base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def fake_engine(fake_server):
+    return fake_server[1]
+
+
+@pytest.mark.parametrize("crawler_cls", [GoogleImageCrawler, BingImageCrawler, BaiduImageCrawler])
+def test_search_engine_crawlers(fake_engine, tmp_path, crawler_cls):
+    crawler = crawler_cls(downloader_threads=4, storage={"root_dir": str(tmp_path)})
+    route(crawler, fake_engine)
+    crawler.crawl(keyword="cat", max_num=40)
+    assert sorted(os.listdir(tmp_path)) == [f"{i:06d}.jpg" for i in range(1, 41)]
+
+
+def test_greedy_crawler(fake_engine, tmp_path):
+    crawler = GreedyImageCrawler(downloader_threads=4, storage={"root_dir": str(tmp_path)})
+    # more pages than fit in the url queue are found
+    crawler.crawl(domains=fake_engine, max_num=150)
+    assert len(os.listdir(tmp_path)) == 150
+
+
+@pytest.mark.parametrize("max_num", [0, 1000])
+def test_greedy_crawler_whole_site(fake_engine, tmp_path, max_num):
+    crawler = GreedyImageCrawler(downloader_threads=4, storage={"root_dir": str(tmp_path)})
+    # the crawl ends when the pages of the site are all parsed
+    crawler.crawl(domains=fake_engine, max_num=max_num)
+    assert len(os.listdir(tmp_path)) == 200
+    assert not crawler.feeder.is_alive()
+
+
+def test_url_list_crawler(fake_engine, tmp_path):
+    url_list = [f"{fake_engine}/img/list-{i}.jpg" for i in range(20)]
+    crawler = UrlListCrawler(downloader_threads=4, storage={"root_dir": str(tmp_path / "images")})
+    crawler.crawl(url_list, max_num=0)
+    assert len(os.listdir(tmp_path / "images")) == 20
+
+
+def test_flickr_crawler_extras(fake_server, tmp_path):
+    server, base_url = fake_server
+    calls = server.RequestHandlerClass.calls
+    calls.clear()
+    crawler = FlickrImageCrawler(apikey="key", downloader_threads=4, storage={"root_dir": str(tmp_path)})
+    route(crawler, base_url)
+    crawler.crawl(tags="cat", max_num=40, size_preference=["medium 640", "large Square"])
+    assert len(os.listdir(tmp_path)) == 40
+    # the urls of the sizes come with the search results
+    assert calls["flickr.photos.search"] >= 1
+    assert calls["flickr.photos.getSizes"] == 0
+
+
+def test_flickr_crawler_size_cache(fake_server, tmp_path):
+    server, base_url = fake_server
+    calls = server.RequestHandlerClass.calls
+    server.RequestHandlerClass.flickr_extras = False
+    try:
+        for run in range(2):
+            calls.clear()
+            root_dir = tmp_path / str(run)
+            crawler = FlickrImageCrawler(
+                apikey="key",
+                downloader_threads=4,
+                storage={"root_dir": str(root_dir)},
+                size_cache={"root_dir": str(tmp_path)},
+            )
+            route(crawler, base_url)
+            crawler.crawl(tags="cat", max_num=40, size_preference="large square")
+            assert len(os.listdir(root_dir)) == 40
+            assert all(name.endswith(".jpg") for name in os.listdir(root_dir))
+            # the sizes of the first run are cached
+            if run == 0:
+                assert calls["flickr.photos.getSizes"] >= 40
+            else:
+                assert calls["flickr.photos.getSizes"] == 0
+    finally:
+        server.RequestHandlerClass.flickr_extras = True
+    assert len(FlickrSizeCache(str(tmp_path))) >= 40
+
+
+def test_flickr_feeder_stops_when_queue_closed(tmp_path):
+    crawler = FlickrImageCrawler(apikey="key", storage={"root_dir": str(tmp_path)})
+    crawler.parser.in_queue.close()
+    # returns instead of retrying the closed queue forever
+    crawler.feeder.start(apikey="key", tags="cat")
+    crawler.feeder.join()
+    assert not crawler.feeder.is_alive()
+
+
+def test_flickr_size_cache_in_state_dir(tmp_path):
+    crawler = FlickrImageCrawler(apikey="key", storage={"root_dir": str(tmp_path)}, size_cache={})
+    assert os.path.dirname(crawler.parser.size_cache.filepath) == str(tmp_path / ".icrawler")
@@ -0,0 +1,89 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from icrawler.utils import CachedQueue, MemoryDedup, QueueClosed
+
+
+def test_full_queue_does_not_mark_item_as_seen():
+    q = CachedQueue(1)
+    q.put("http://a.com/1")
+    with pytest.raises(queue.Full):
+        q.put("http://a.com/2", timeout=0.01)
+    q.get()
+    q.put("http://a.com/2", timeout=0.01)
+    assert q.get() == "http://a.com/2"
+
+
+def test_dedup_outside_queue_lock():
+    checking = threading.Event()
+    release = threading.Event()
+
+    class SlowDedup(MemoryDedup):
+        def add(self, key):
+            checking.set()
+            release.wait(5)
+            return super().add(key)
+
+    q = CachedQueue(2, dedup=SlowDedup())
+    q.restore(["http://a.com/1"])
+    thread = threading.Thread(target=q.put, args=("http://a.com/2",))
+    thread.start()
+    checking.wait(5)
+    # neither blocked by the slow check, nor given the slot it reserved
+    assert q.get(timeout=1) == "http://a.com/1"
+    q.restore(["http://a.com/3"])
+    with pytest.raises(queue.Full):
+        q.put("http://a.com/4", block=False)
+    release.set()
+    thread.join()
+    assert q.get() == "http://a.com/3" and q.get() == "http://a.com/2"
+
+
+def test_finish_closes_when_drained():
+    q = CachedQueue()
+    q.put("http://a.com/1")
+    q.finish()
+    assert not q.closed
+    assert q.get() == "http://a.com/1"
+    # consumers can still put items before the last one is done
+    q.put("http://a.com/2")
+    q.task_done()
+    assert q.get() == "http://a.com/2"
+    q.task_done()
+    assert q.closed
+    with pytest.raises(QueueClosed):
+        q.get()
+    with pytest.raises(QueueClosed):
+        q.put("http://a.com/3")
+    q.reopen()
+    q.put("http://a.com/3")
+    assert q.get() == "http://a.com/3"
+
+
+def test_close_wakes_up_waiting_threads():
+    full_queue = CachedQueue(1)
+    full_queue.put("http://a.com/1")
+    empty_queue = CachedQueue()
+    errors = []
+
+    def wait(method, *args):
+        try:
+            method(*args)
+        except QueueClosed as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=wait, args=(full_queue.put, "http://a.com/2")),
+        threading.Thread(target=wait, args=(empty_queue.get,)),
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    full_queue.close()
+    empty_queue.close()
+    for thread in threads:
+        thread.join(1)
+    assert len(errors) == 2
@@ -0,0 +1,79 @@
+import json
+import os
+import time
+
+from benchmarks.stub_server import StubFeeder, StubHandler, StubParser
+from icrawler import Crawler, ImageDownloader
+from icrawler.utils import Checkpoint
+
+
+def make_crawler(root_dir, checkpoint_dir):
+    return Crawler(
+        feeder_cls=StubFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        downloader_threads=2,
+        storage={"root_dir": str(root_dir)},
+        checkpoint={"root_dir": str(checkpoint_dir), "interval": 0.1},
+    )
+
+
+def crawl(crawler, base_url, max_num, resume=False):
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=base_url, page_num=3),
+        parser_kwargs=dict(base_url=base_url),
+        downloader_kwargs=dict(max_num=max_num),
+        resume=resume,
+    )
+
+
+def test_resume(stub_server, tmp_path):
+    root_dir = tmp_path / "images"
+    crawl(make_crawler(root_dir, tmp_path / "state"), stub_server, max_num=5)
+    assert len(os.listdir(root_dir)) == 5
+    with open(tmp_path / "state" / "journal.jsonl") as fin:
+        assert json.loads(fin.readline()) == {"file_idx_offset": 0, "n": 0}
+
+    StubHandler.requests.clear()
+    crawl(make_crawler(root_dir, tmp_path / "state"), stub_server, max_num=0, resume=True)
+    assert sorted(os.listdir(root_dir)) == [f"{i:06d}.jpg" for i in range(1, 31)]
+    assert all(count == 1 for count in StubHandler.requests.values())
+    assert sum(path.startswith("/img/") for path in StubHandler.requests) == 25
+
+
+def test_journal_compacted_periodically(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path), interval=0.05, compact_records=10)
+    checkpoint.open()
+    for i in range(10):
+        checkpoint.record_put("task", {"file_url": f"http://a.com/{i}.jpg"})
+    for i in range(8):
+        checkpoint.record_done("task", {"file_url": f"http://a.com/{i}.jpg"})
+    time.sleep(0.3)
+    checkpoint.close()
+    with open(tmp_path / "journal.jsonl") as fin:
+        lines = fin.readlines()
+    # a line per item after the header
+    assert len(lines) == 11
+    state = checkpoint.load()
+    assert state["pending"]["task"] == [{"file_url": f"http://a.com/{i}.jpg"} for i in (8, 9)]
+    assert len(state["seen"]["task"]) == 10
+
+
+def test_journal_keeps_depths(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path))
+    checkpoint.open()
+    checkpoint.record_put("page", "http://a.com/1", 0)
+    checkpoint.record_put("page", "http://a.com/1/2", 1)
+    checkpoint.record_put("task", {"file_url": "http://a.com/1.jpg"})
+    checkpoint.close()
+    # compacted when resuming
+    resumed = Checkpoint(str(tmp_path))
+    state = resumed.open(resume=True)
+    resumed.close()
+    assert state["depths"] == {"page": [0, 1], "task": [None]}
+    assert checkpoint.load()["depths"] == state["depths"]
+
+
+def test_checkpoint_in_state_dir(tmp_path):
+    crawler = Crawler(storage={"root_dir": str(tmp_path)}, checkpoint={})
+    assert crawler.checkpoint.filepath == str(tmp_path / ".icrawler" / "journal.jsonl")
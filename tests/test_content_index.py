@@ -0,0 +1,81 @@
+import os
+from io import BytesIO
+
+from PIL import Image
+
+from benchmarks.stub_server import StubHandler, make_image
+from icrawler import Crawler
+from icrawler.utils import ContentIndex
+
+from .helpers import make_downloader
+
+
+def test_content_index_exact(tmp_path):
+    index = ContentIndex(str(tmp_path))
+    body = make_image()
+    digest, duplicate = index.claim(body)
+    assert duplicate is None
+    assert index.claim(body) == (digest, "")
+    index.add(digest, "000001.jpg", "http://a.com/1.jpg")
+    assert index.claim(body) == (digest, "000001.jpg")
+    assert index.claim(make_image())[1] is None
+    assert index.lookup_url("http://a.com/1.jpg") == "000001.jpg"
+    # kept across restarts
+    assert ContentIndex(str(tmp_path)).claim(body)[1] == "000001.jpg"
+
+
+def test_content_index_release(tmp_path):
+    index = ContentIndex(str(tmp_path))
+    body = make_image()
+    digest, _ = index.claim(body)
+    index.release(digest)
+    assert index.claim(body)[1] is None
+
+
+def test_content_index_drops_reservations(tmp_path):
+    index = ContentIndex(str(tmp_path), perceptual=True)
+    img = Image.effect_noise((256, 256), 64).convert("RGB")
+    original, compressed = BytesIO(), BytesIO()
+    img.save(original, "PNG")
+    img.save(compressed, "JPEG", quality=60)
+    index.claim(original.getvalue())
+    # the near-duplicate of a body being written is not recorded
+    assert index.claim(compressed.getvalue())[1] == ""
+    assert len(index) == 0
+    # reservations of a killed crawl are dropped
+    index = ContentIndex(str(tmp_path), perceptual=True)
+    assert index.claim(original.getvalue())[1] is None
+    assert len(index) == 0
+
+
+def test_content_index_perceptual(tmp_path):
+    index = ContentIndex(str(tmp_path), perceptual=True)
+    img = Image.effect_noise((256, 256), 64).convert("RGB").resize((512, 512))
+    original, compressed = BytesIO(), BytesIO()
+    img.save(original, "PNG")
+    img.resize((300, 300)).save(compressed, "JPEG", quality=60)
+    digest, _ = index.claim(original.getvalue())
+    index.add(digest, "000001.png")
+    assert index.claim(compressed.getvalue())[1] == "000001.png"
+    assert index.claim(make_image(256, 256))[1] is None
+
+
+def test_download_skips_duplicates(stub_server, tmp_path):
+    downloader = make_downloader(tmp_path)
+    downloader.content_index = ContentIndex(str(tmp_path / "index"))
+    downloader.max_num = 0
+    tasks = [{"file_url": f"{stub_server}/img/{i}.jpg"} for i in range(3)]
+    for task in tasks:
+        downloader.download(task, "jpg")
+    assert [task["filename"] for task in tasks] == ["000001.jpg"] * 3
+    assert [task.get("duplicate", False) for task in tasks] == [False, True, True]
+    assert sorted(p.name for p in tmp_path.glob("*.jpg")) == ["000001.jpg"]
+    assert downloader.fetched_num == 1
+    assert (tmp_path / "000001.jpg").read_bytes() == StubHandler.image
+    assert downloader.content_index.lookup_url(tasks[2]["file_url"]) == "000001.jpg"
+
+
+def test_content_index_in_state_dir(tmp_path):
+    crawler = Crawler(storage={"root_dir": str(tmp_path)}, content_index={})
+    assert crawler.downloader.content_index.filepath == str(tmp_path / ".icrawler" / "content.sqlite")
+    assert os.listdir(tmp_path) == [".icrawler"]
@@ -0,0 +1,53 @@
+import pytest
+
+from icrawler import Crawler
+from icrawler.utils import BloomDedup, CachedQueue, MemoryDedup, SQLiteDedup, url_fingerprint
+
+
+def test_url_fingerprint():
+    assert url_fingerprint("http://Example.com/a.jpg?x=1&y=2") == url_fingerprint("http://example.com:80/a.jpg?y=2&x=1")
+    assert url_fingerprint({"file_url": "http://a.com/1.jpg", "meta": 1}) == url_fingerprint("http://a.com/1.jpg")
+    assert url_fingerprint("http://a.com/1.jpg") != url_fingerprint("https://a.com/1.jpg")
+
+
+@pytest.mark.parametrize("backend_cls", [MemoryDedup, BloomDedup, SQLiteDedup])
+def test_dedup_backends(backend_cls, tmp_path):
+    kwargs = {} if backend_cls is MemoryDedup else {"root_dir": str(tmp_path)}
+    backend = backend_cls(**kwargs)
+    keys = [url_fingerprint(f"http://a.com/{i}.jpg") for i in range(1000)]
+    assert all(backend.add(key) for key in keys)
+    assert not any(backend.add(key) for key in keys)
+    assert len(backend) == 1000
+
+
+@pytest.mark.parametrize("backend_cls", [BloomDedup, SQLiteDedup])
+def test_dedup_persistence(backend_cls, tmp_path):
+    backend = backend_cls(root_dir=str(tmp_path), namespace="page")
+    backend.add(url_fingerprint("http://a.com/1.jpg"))
+    backend.flush()
+    backend = backend_cls(root_dir=str(tmp_path), namespace="page")
+    assert not backend.add(url_fingerprint("http://a.com/1.jpg"))
+    assert backend.add(url_fingerprint("http://a.com/2.jpg"))
+
+
+def test_bloom_dedup_scales():
+    backend = BloomDedup(capacity=100, error_rate=0.01)
+    added = sum(backend.add(url_fingerprint(f"http://a.com/{i}.jpg")) for i in range(5000))
+    assert added > 5000 * 0.98
+    assert len(backend._filters) > 1
+
+
+def test_cached_queue_dedup():
+    queue = CachedQueue(dedup=MemoryDedup(capacity=2))
+    for url in ["http://a.com/1", "http://a.com/1#x", "http://a.com/2", "http://a.com/3", "http://a.com/1"]:
+        queue.put(url)
+    assert list(queue.queue) == ["http://a.com/1", "http://a.com/2", "http://a.com/3", "http://a.com/1"]
+
+
+def test_dedup_in_state_dir(tmp_path):
+    crawler = Crawler(storage={"root_dir": str(tmp_path)}, dedup={"backend": "SQLiteDedup"})
+    assert crawler.parser.in_queue.dedup.filepath == str(tmp_path / ".icrawler" / "page.sqlite")
+    assert crawler.downloader.in_queue.dedup.filepath == str(tmp_path / ".icrawler" / "task.sqlite")
+    # the backends which do not need a directory are kept in memory
+    crawler = Crawler(storage={"root_dir": str(tmp_path / "bloom")}, dedup={"backend": "BloomDedup"})
+    assert crawler.parser.in_queue.dedup.filepath is None
@@ -0,0 +1,115 @@
+from io import BytesIO
+
+import pytest
+import requests
+from PIL import Image
+
+from benchmarks.stub_server import StubHandler
+from icrawler.utils import probe_image
+
+from .helpers import make_downloader
+
+
+def test_peek_content_keeps_body(stub_server, tmp_path):
+    downloader = make_downloader(tmp_path)
+    with downloader.session.get(stub_server + "/large.png", stream=True) as response:
+        assert downloader.peek_content(response, 100) == StubHandler.large_image[:100]
+        assert downloader.peek_content(response, 10) == StubHandler.large_image[:10]
+        assert response.content == StubHandler.large_image
+
+
+def test_keep_file_reads_header_only(stub_server, tmp_path):
+    downloader = make_downloader(tmp_path)
+    task = {"file_url": stub_server + "/large.png"}
+    with downloader.session.get(task["file_url"], stream=True) as response:
+        assert not downloader.keep_file(task, response, min_size=(2000, 2000))
+        assert task["img_size"] == (1024, 768)
+        assert len(response.raw.head) < len(StubHandler.large_image)
+
+
+class FileRaw:
+    def __init__(self, data):
+        self.file = BytesIO(data)
+
+    def read(self, amt=None, decode_content=True):
+        return self.file.read(amt)
+
+
+def file_response(data):
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = FileRaw(data)
+    return response
+
+
+def test_keep_file_bounds_header(tmp_path):
+    downloader = make_downloader(tmp_path)
+    # not an image, rejected after the first peek
+    response = file_response(b"<!DOCTYPE html>" + bytes(4 * 2**20))
+    assert not downloader.keep_file({}, response)
+    assert response.raw.file.tell() == 16 * 1024
+    # a JPEG header which never ends is read up to max_head_size
+    response = file_response(b"\xff\xd8\xff\xe1\xff\xff" + bytes(4 * 2**20))
+    assert not downloader.keep_file({}, response)
+    assert response.raw.file.tell() == downloader.max_head_size
+
+
+def test_download_streams_to_storage(stub_server, tmp_path):
+    downloader = make_downloader(tmp_path)
+    downloader.max_num = 0
+    task = {"file_url": stub_server + "/large.png"}
+    downloader.download(task, "jpg", min_size=(100, 100))
+    assert task["success"]
+    assert (tmp_path / task["filename"]).read_bytes() == StubHandler.large_image
+
+
+@pytest.mark.parametrize(
+    "fmt, mode, options",
+    [
+        ("JPEG", "RGB", {}),
+        ("JPEG", "L", {"progressive": True, "exif": b"Exif\x00\x00" + bytes(20000)}),
+        ("PNG", "RGBA", {}),
+        ("GIF", "P", {}),
+        ("BMP", "RGB", {}),
+        ("WEBP", "RGB", {}),
+        ("WEBP", "RGBA", {"lossless": True}),
+        ("TIFF", "RGB", {}),
+    ],
+)
+def test_probe_image(fmt, mode, options):
+    buf = BytesIO()
+    Image.new(mode, (321, 123)).save(buf, fmt, **options)
+    data = buf.getvalue()
+    assert probe_image(data[: 32 * 1024]) == (fmt, (321, 123))
+    assert probe_image(data[:9]) is None
+
+
+def test_filename_of_real_format(stub_server, tmp_path):
+    downloader = make_downloader(tmp_path)
+    downloader.max_num = 0
+    task = {"file_url": stub_server + "/image"}
+    downloader.download(task, "jpg")
+    assert task["img_format"] == "PNG"
+    assert task["filename"] == "000001.png"
+    # found by the next crawl, although the url has no extension
+    downloader.clear_status()
+    requests = StubHandler.requests["/image"]
+    task = {"file_url": stub_server + "/image"}
+    downloader.download(task, "jpg", overwrite=False)
+    assert not task["success"] and downloader.fetched_num == 1
+    assert StubHandler.requests["/image"] == requests
+
+
+def test_skip_existing_without_lock(tmp_path):
+    downloader = make_downloader(tmp_path)
+    (tmp_path / "000001.png").write_bytes(b"old")
+    first_existing = downloader.storage.first_existing
+
+    def first_existing_unlocked(ids):
+        assert not downloader.lock.locked()
+        return first_existing(ids)
+
+    downloader.storage.first_existing = first_existing_unlocked
+    assert downloader.skip_existing({"file_url": "http://a.com/1.jpg"}, "jpg")
+    assert not downloader.skip_existing({"file_url": "http://a.com/2.jpg"}, "jpg")
+    assert downloader.fetched_num == 1
@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+from benchmarks.stub_server import StubHandler
+from icrawler import AsyncCrawler, Crawler, ImageDownloader
+from icrawler.utils import HTTPCache, Session
+
+from .helpers import ListFeeder, PrefixParser
+
+
+def test_http_cache_lru(tmp_path):
+    cache = HTTPCache(str(tmp_path), max_size=1000)
+    for i in range(4):
+        assert cache.set(f"http://a.com/{i}", 200, "OK", {"ETag": f'"{i}"', "Content-Length": "100"}, b"x" * 100)
+        time.sleep(0.01)
+    assert not cache.set("http://a.com/large", 200, "OK", {}, b"x" * 101)
+    entry = cache.get("http://a.com/0")
+    assert entry.body == b"x" * 100 and entry.headers == {"ETag": '"0"'}
+    # "http://a.com/1" is the least recently used one
+    for i in range(4, 11):
+        cache.set(f"http://a.com/{i}", 200, "OK", {}, b"x" * 100)
+    assert cache.get("http://a.com/1") is None
+    assert cache.get("http://a.com/0") is not None
+    assert cache.size() <= 1000
+    # kept across runs
+    assert len(HTTPCache(str(tmp_path))) == len(cache)
+
+
+def test_http_cache_freshness(tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    cache.set("http://a.com/1", 200, "OK", {"Cache-Control": "max-age=60"}, b"")
+    cache.set("http://a.com/2", 200, "OK", {"Cache-Control": "no-cache", "ETag": '"2"'}, b"")
+    assert cache.is_fresh(cache.get("http://a.com/1"))
+    assert not cache.is_fresh(cache.get("http://a.com/2"))
+    cache.force_ttl = 60
+    assert cache.is_fresh(cache.get("http://a.com/2"))
+
+
+def test_session_revalidates(stub_server, tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    session = Session(cache=cache)
+    url = f"{stub_server}/cached/page/40"
+    texts = [session.get(url).text for _ in range(3)]
+    assert texts[0] == texts[1] == texts[2]
+    # stale responses are revalidated, and not downloaded again
+    assert StubHandler.requests["/cached/page/40"] == 3
+    assert cache.stats == {"miss": 1, "stored": 1, "revalidated": 2}
+    # files are not cached
+    session.get(f"{stub_server}/cached/img/400.jpg", stream=True).close()
+    assert len(cache) == 1
+    # the session counts the requests of the adapters it wraps
+    assert session.connection_stats()["requests"] == 4
+    session.set_cache(None)
+    session.get(url)
+    assert StubHandler.requests["/cached/page/40"] == 4
+
+
+@pytest.mark.parametrize("crawler_cls, first_page", [(Crawler, 50), (AsyncCrawler, 60)])
+def test_crawler_force_ttl(stub_server, tmp_path, crawler_cls, first_page):
+    pages = [f"{stub_server}/page/{first_page + i}" for i in range(2)]
+    for i in range(2):
+        crawler = crawler_cls(
+            feeder_cls=ListFeeder,
+            parser_cls=PrefixParser,
+            downloader_cls=ImageDownloader,
+            storage={"root_dir": str(tmp_path / str(i))},
+            http_cache={"root_dir": str(tmp_path), "force_ttl": 60},
+        )
+        crawler.crawl(
+            feeder_kwargs=dict(urls=pages),
+            parser_kwargs=dict(base_url=stub_server, prefixes=[""]),
+            downloader_kwargs=dict(max_num=0),
+        )
+        assert len(os.listdir(tmp_path / str(i))) == 20
+    # the pages are requested once, while the images are requested again
+    assert StubHandler.requests[f"/page/{first_page}"] == 1
+    assert StubHandler.requests[f"/img/{first_page * 10}.jpg"] == 2
+    assert crawler.metrics.get("cache_hits_total", stage="page", result="hit") == 2
+
+
+def test_http_cache_in_state_dir(tmp_path):
+    crawler = Crawler(storage={"root_dir": str(tmp_path)}, http_cache={})
+    assert crawler.session.cache.filepath == str(tmp_path / ".icrawler" / "http_cache.sqlite")
+    assert os.listdir(tmp_path) == [".icrawler"]
@@ -0,0 +1,99 @@
+import json
+import time
+import urllib.request
+
+from benchmarks.stub_server import StubFeeder, StubParser
+from icrawler import AsyncCrawler, Crawler, ImageDownloader
+from icrawler.utils import CallbackExporter, JSONLinesExporter, Metrics, PrometheusExporter
+
+
+def test_metrics_prometheus_format():
+    metrics = Metrics()
+    metrics.inc("requests_total", stage="file", host="example.com")
+    metrics.inc("requests_total", 2, stage="file", host="example.com")
+    metrics.observe("parse_seconds", 0.02)
+    metrics.observe("parse_seconds", 20)
+    metrics.gauge("queue_size", lambda: 7, queue="task")
+    assert metrics.get("requests_total", host="example.com", stage="file") == 3
+    assert metrics.get("parse_seconds") == 2
+    assert metrics.get("queue_size", queue="task") == 7
+    assert metrics.get("errors_total") == 0
+    text = metrics.prometheus()
+    assert "# TYPE icrawler_requests_total counter\n" in text
+    assert 'icrawler_requests_total{host="example.com",stage="file"} 3\n' in text
+    assert 'icrawler_queue_size{queue="task"} 7\n' in text
+    assert 'icrawler_parse_seconds_bucket{le="0.01"} 0\n' in text
+    assert 'icrawler_parse_seconds_bucket{le="0.025"} 1\n' in text
+    assert 'icrawler_parse_seconds_bucket{le="+Inf"} 2\n' in text
+    assert "icrawler_parse_seconds_count 2\n" in text
+
+
+def test_exporters(tmp_path):
+    metrics = Metrics()
+    snapshots = []
+    path = tmp_path / "metrics.jsonl"
+    exporters = [
+        JSONLinesExporter(str(path), interval=0.05),
+        CallbackExporter(snapshots.append, interval=0.05),
+        PrometheusExporter(port=0),
+    ]
+    for exporter in exporters:
+        exporter.start(metrics)
+    metrics.inc("files_total", result="saved")
+    time.sleep(0.2)
+    with urllib.request.urlopen(f"http://127.0.0.1:{exporters[2].port}/metrics") as response:
+        assert 'icrawler_files_total{result="saved"} 1' in response.read().decode()
+    metrics.inc("files_total", result="saved")
+    for exporter in exporters:
+        exporter.stop()
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(lines) >= 2 and len(snapshots) >= 2
+    # the last snapshot is exported when stopping
+    assert lines[-1]["counters"] == [dict(name="files_total", labels=dict(result="saved"), value=2)]
+    assert snapshots[-1]["counters"][0]["value"] == 2
+
+
+def run_crawler(crawler_cls, base_url, root_dir, **kwargs):
+    crawler = crawler_cls(
+        feeder_cls=StubFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        parser_threads=2,
+        downloader_threads=4,
+        storage={"root_dir": str(root_dir)},
+        **kwargs,
+    )
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=base_url, page_num=3),
+        parser_kwargs=dict(base_url=base_url),
+        downloader_kwargs=dict(max_num=0),
+    )
+    return crawler.metrics
+
+
+def test_crawler_metrics(stub_server, tmp_path):
+    snapshots = []
+    metrics = run_crawler(
+        Crawler, stub_server, tmp_path / "images", metrics={"callback": {"callback": snapshots.append}}
+    )
+    host = "127.0.0.1"
+    assert metrics.get("requests_total", stage="page", host=host) == 3
+    assert metrics.get("requests_total", stage="file", host=host) == 30
+    assert metrics.get("errors_total", stage="file", host=host) == 0
+    assert metrics.get("files_total", result="saved") == 30
+    assert metrics.get("page_fetch_seconds") == 3
+    assert metrics.get("parse_seconds") == 3
+    assert metrics.get("file_fetch_seconds") == 30
+    assert metrics.get("storage_write_seconds") == 30
+    image_size = (tmp_path / "images" / "000001.jpg").stat().st_size
+    assert metrics.get("bytes_total", stage="file") == 30 * image_size
+    assert metrics.get("threads", pool="downloader") == 4
+    assert metrics.get("queue_size", queue="task") == 0
+    assert snapshots and snapshots[-1]["gauges"]
+
+
+def test_async_crawler_metrics(stub_server, tmp_path):
+    metrics = run_crawler(AsyncCrawler, stub_server, tmp_path)
+    assert metrics.get("requests_total", stage="file", host="127.0.0.1") == 30
+    assert metrics.get("files_total", result="saved") == 30
+    assert metrics.get("file_fetch_seconds") == 30
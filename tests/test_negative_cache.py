@@ -0,0 +1,91 @@
+import os
+import socket
+import time
+from collections import Counter
+
+from benchmarks.stub_server import StubHandler
+from icrawler import Crawler, ImageDownloader
+from icrawler.builtin import PseudoParser, UrlListCrawler
+from icrawler.utils import NegativeCache
+
+from .helpers import ListFeeder
+
+
+def test_negative_cache(tmp_path):
+    cache = NegativeCache(str(tmp_path), ttls={"error": 0.2, "invalid": 0})
+    cache.add("http://a.com/1.jpg", "missing", dict(status=404))
+    cache.add("http://a.com/2.jpg", "error")
+    assert not cache.add("http://a.com/3.jpg", "invalid")
+    # urls are normalized
+    assert cache.get("HTTP://A.com:80/1.jpg") == ("missing", dict(status=404))
+    assert cache.get("http://a.com/2.jpg") == ("error", {})
+    assert cache.get("http://a.com/3.jpg") is None
+    assert len(cache) == 2
+    time.sleep(0.25)
+    assert cache.get("http://a.com/2.jpg") is None
+    assert cache.purge() == 1
+    # kept across runs
+    cache = NegativeCache(str(tmp_path))
+    assert cache.get("http://a.com/1.jpg") == ("missing", dict(status=404))
+    cache.remove("http://a.com/1.jpg")
+    assert len(cache) == 0
+
+
+def crawl(base_url, root_dir, cache_dir, **downloader_kwargs):
+    urls = [f"{base_url}/img/{i}.jpg" for i in range(300, 305)]
+    urls += [f"{base_url}/gone/img/{i}.jpg" for i in range(305, 310)]
+    urls += [f"{base_url}/large.png", f"{base_url}/page/31"]
+    crawler = Crawler(
+        feeder_cls=ListFeeder,
+        parser_cls=PseudoParser,
+        downloader_cls=ImageDownloader,
+        downloader_threads=4,
+        storage={"root_dir": str(root_dir)},
+        negative_cache={"root_dir": str(cache_dir)},
+    )
+    crawler.crawl(feeder_kwargs=dict(urls=urls), downloader_kwargs=dict(max_num=0, **downloader_kwargs))
+    return crawler
+
+
+def test_crawler_skips_known_bad_urls(stub_server, tmp_path):
+    crawler = crawl(stub_server, tmp_path / "1", tmp_path, min_size=(100, 100))
+    assert os.listdir(tmp_path / "1") == ["000001.png"]
+    assert crawler.metrics.get("files_total", result="rejected") == 6
+    requests = StubHandler.requests.copy()
+    # the images too small, the missing ones and the page are not requested again
+    crawler = crawl(stub_server, tmp_path / "2", tmp_path, min_size=(100, 100))
+    assert os.listdir(tmp_path / "2") == ["000001.png"]
+    assert crawler.metrics.get("files_total", result="known_bad") == 11
+    assert StubHandler.requests == requests + Counter({"/large.png": 1})
+    # the small images are requested with other size limits
+    crawler = crawl(stub_server, tmp_path / "3", tmp_path)
+    assert len(os.listdir(tmp_path / "3")) == 6
+    assert crawler.metrics.get("files_total", result="known_bad") == 6
+    assert StubHandler.requests["/img/300.jpg"] == 2
+
+
+def test_throttled_urls_not_remembered(tmp_path):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    url_list = tmp_path / "urls.txt"
+    url_list.write_text("\n".join(f"http://127.0.0.1:{port}/img/{i}.jpg" for i in range(3)))
+    crawler = UrlListCrawler(
+        downloader_threads=1,
+        storage={"root_dir": str(tmp_path / "images")},
+        retry={"max_attempts": 2, "host_budget_ratio": 0, "host_budget_burst": 1, "backoff_base": 0.1},
+        negative_cache={},
+    )
+    crawler.crawl(str(url_list), max_num=0)
+    assert crawler.metrics.get("retries_denied_total", stage="file", reason="budget") == 2
+    # only the url tried as many times as allowed is remembered
+    cache = crawler.downloader.negative_cache
+    assert len(cache) == 1
+    assert cache.get(f"http://127.0.0.1:{port}/img/0.jpg") == ("error", {})
+
+
+def test_negative_cache_in_state_dir(tmp_path):
+    crawler = Crawler(storage={"root_dir": str(tmp_path)}, negative_cache={})
+    assert crawler.downloader.negative_cache.filepath == str(tmp_path / ".icrawler" / "negative.sqlite")
+    assert os.listdir(tmp_path) == [".icrawler"]
@@ -0,0 +1,116 @@
+import json
+import re
+import threading
+import time
+from email import message_from_bytes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from icrawler.storage import GoogleStorage, ObjectStorage
+
+
+class FakeGCSHandler(BaseHTTPRequestHandler):
+    """The part of the JSON API of Google Cloud Storage used by GoogleStorage"""
+
+    objects: Dict[Tuple[str, str], bytes] = {}
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        match = re.match(r"/storage/v1/b/([^/]+)/o$", url.path)
+        if not match:
+            return self.send_error(404)
+        prefix = parse_qs(url.query).get("prefix", [""])[0]
+        bucket = match.group(1)
+        items = [
+            {"name": name, "bucket": bucket}
+            for (b, name) in sorted(self.objects)
+            if b == bucket and name.startswith(prefix)
+        ]
+        self.reply({"kind": "storage#objects", "items": items})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        match = re.match(r"/upload/storage/v1/b/([^/]+)/o$", url.path)
+        if not match:
+            return self.send_error(404)
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        message = message_from_bytes(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+        metadata, content = message.get_payload()
+        name = json.loads(metadata.get_payload())["name"]
+        self.objects[(match.group(1), name)] = content.get_payload(decode=True)
+        self.reply({"name": name, "bucket": match.group(1), "size": str(len(self.objects[(match.group(1), name)]))})
+
+    def reply(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def gcs_client():
+    storage = pytest.importorskip("google.cloud.storage")
+    from google.auth.credentials import AnonymousCredentials
+
+    FakeGCSHandler.objects = {("bucket", "old/000007.jpg"): b"old", ("bucket", "other/000009.jpg"): b"other"}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGCSHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield storage.Client(
+        project="test",
+        credentials=AnonymousCredentials(),
+        client_options={"api_endpoint": f"http://127.0.0.1:{server.server_port}"},
+    )
+    server.shutdown()
+
+
+def test_google_storage(gcs_client):
+    storage = GoogleStorage("gs://bucket/old", client=gcs_client, upload_threads=4)
+    assert storage.max_file_idx() == 7
+    assert storage.exists("000007.jpg") and not storage.exists("000009.jpg")
+    for i in range(8, 20):
+        storage.write(f"{i:06d}.jpg", bytes([i]) * 100)
+    assert storage.exists("000019.jpg")
+    storage.flush()
+    assert FakeGCSHandler.objects[("bucket", "old/000019.jpg")] == b"\x13" * 100
+    assert len(FakeGCSHandler.objects) == 14
+    assert GoogleStorage("gs://bucket/old", client=gcs_client).max_file_idx() == 19
+
+
+class SlowStorage(ObjectStorage):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.uploaded = {}
+        self.ready = threading.Event()
+
+    def upload(self, key, data):
+        self.ready.wait()
+        if key == "bad":
+            raise OSError("rejected")
+        self.uploaded[key] = data
+
+    def list_keys(self):
+        return []
+
+
+def test_object_storage_backpressure():
+    storage = SlowStorage(upload_threads=1, max_pending=2, max_retry=1)
+    writer = threading.Thread(target=lambda: [storage.write(f"{i}", b"x") for i in range(5)])
+    writer.start()
+    time.sleep(0.2)
+    # one file being uploaded and two pending, the writer waits
+    assert writer.is_alive()
+    storage.ready.set()
+    writer.join()
+    storage.write("bad", b"x")
+    storage.flush()
+    assert sorted(storage.uploaded) == ["0", "1", "2", "3", "4"]
+    assert storage.failed == ["bad"] and not storage.exists("bad")
@@ -0,0 +1,103 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.fake_engines import baidu_encode, baidu_page, bing_page, google_page, site_page
+from benchmarks.reference_parsers import dict_baidu, dict_decode_url, soup_bing, soup_google, soup_greedy
+from icrawler.builtin import BaiduParser, BingParser, GoogleParser, GreedyParser
+
+TRICKY_PAGES = [
+    "",
+    "   ",
+    "<html><body><p>no images</p></body></html>",
+    # several classes, entities, missing or empty attributes, nested links
+    '<div class="x  imgpt\ny"><span><a m="{&quot;murl&quot;:&quot;http://a.com/1.jpg&quot;}">x</a></span></div>'
+    '<div class="imgpt"><a href="#">no m</a></div>'
+    '<div class="imgptx"><a m=\'{"murl":"http://a.com/2.jpg"}\'></a></div>'
+    '<div class="imgpt"><a m=\'{"murl":"http://a.com/3.png"}\'></a><a m=\'{"murl":"http://a.com/4.jpg"}\'></a></div>'
+    '<DIV CLASS="IMGPT"><a m=\'{"murl":"http://a.com/5.jpg"}\'></a></DIV>'
+    '<div class="imgpt"><a m="&amp;quot;murl&amp;quot;:&amp;quot;http://a.com/6.jpg"></a></div>',
+    # scripts with attributes, escapes and markup in strings
+    '<script src="http://a.com/x.js" nonce="a&b"></script>'
+    "<script type='text/javascript' data-x='say \"hi\"'>var a = \"http://a.com/1.jpg\";</script>"
+    '<script class=" a  b ">var b = ["http:\\/\\/a.com\\/2.png", "<b>http://a.com/3.bmp</b>"]</script>',
+    "<script>var a = 'http://a.com/\\u00e9.jpg';</script><script>var b = 'http://a.com/later.jpg';</script>",
+    "<html><head><script>no urls</script></head><body><script>http://a.com/body.png</script></body></html>",
+    # images and links of the greedy parser
+    '<img src="//cdn.a.com/1.jpg"><img src="http://a.com/2.gif"><img src=""><img data-src="http://a.com/3.jpg">'
+    '<IMG SRC="http://a.com/4.PNG"><a href="/page/1/">1</a><a href="page2.html">2</a><a href="#x">x</a>'
+    '<a href="//a.com/p/3">3</a><a href="//other.com/p">o</a><link href="http://example.com/style.css">'
+    '<area href="http://example.com/5.jpeg"><a href="javascript:void(0)">j</a><a href="mailto:x@example.com">m</a>'
+    '<a href="a">a</a><a href="ftp://example.com/f">f</a>',
+    # broken markup and non-utf-8 bytes
+    '<div class="imgpt"><a m=\'{"murl":"http://a.com/\xe9.jpg"}\'>'
+    '<script>http://a.com/s.jpg<img src="http://a.com/i.jpg"',
+]
+
+
+RAW_PAGES = [
+    b'<div class="imgpt"><a m=\'{"murl":"http://a.com/\xff\xfe.jpg"}\'></a></div><img src="//a.com/\xc3.jpg">',
+]
+
+
+def pages():
+    urls = [f"http://example.com/img/{i}.jpg" for i in range(100)]
+    links = [f"/site/{i}.html" for i in range(10)] + ["//cdn.example.com/a.png", "#top", "javascript:void(0)"]
+    generated = [google_page(urls), bing_page(urls[:20]), site_page(urls[:30], links)]
+    return [page.encode("utf-8") for page in generated + TRICKY_PAGES] + RAW_PAGES
+
+
+@pytest.mark.parametrize(
+    "parser_cls, reference",
+    [
+        (GoogleParser, soup_google),
+        (BingParser, soup_bing),
+        (GreedyParser, lambda response: soup_greedy(response, ["http://example.com"])),
+    ],
+)
+def test_parsers_equivalence(parser_cls, reference):
+    parser = parser_cls(1, None, None)
+    parse = parser.parse if parser_cls is not GreedyParser else lambda r: parser.parse(r, ["http://example.com"])
+    for content in pages():
+        response = SimpleNamespace(content=content, url="http://example.com/")
+        assert list(parse(response) or []) == list(reference(response) or []), content
+
+
+def test_parsers_equivalence_in_threads():
+    parser = GoogleParser(1, None, None)
+    responses = [SimpleNamespace(content=content, url="http://example.com/") for content in pages()] * 20
+    expected = [list(parser.parse(response) or []) for response in responses]
+    # each thread parses with its own lxml parser
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda response: list(parser.parse(response) or []), responses))
+    assert results == expected
+
+
+def test_baidu_decoder_equivalence():
+    parser = BaiduParser(1, None, None)
+    tokens = ["_z2C$q", "_z&e3B", "AzdH3F"]
+    # the tokens, their parts, and characters mapped or not
+    pieces = set(tokens) | set("w1q0xA_:/\n")
+    for token in tokens:
+        pieces |= {token[:i] for i in range(1, len(token))} | {token[i:] for i in range(1, len(token))}
+    pieces = sorted(pieces)
+    urls = [chr(i) for i in range(0x300)]
+    urls += [a + b + c for a in pieces for b in pieces for c in pieces]
+    for url in urls:
+        assert parser._decode_url(url) == dict_decode_url(url), url
+    # a page is decoded at once
+    for i in range(0, len(urls), 1000):
+        assert parser._decode_urls(urls[i : i + 1000]) == [dict_decode_url(url) for url in urls[i : i + 1000]]
+    assert parser._decode_urls([]) == []
+
+
+def test_baidu_parser_equivalence():
+    parser = BaiduParser(1, None, None)
+    urls = [f"http://example.com/img/{i}.jpg" for i in range(30)]
+    data = [dict(objURL=baidu_encode(url)) for url in urls[:10]] + [dict(hoverURL=url) for url in urls[10:20]]
+    data += [dict(objURL=baidu_encode(url), hoverURL="x") for url in urls[20:]] + [{}]
+    for content in [baidu_page(urls), json.dumps(dict(data=data)), json.dumps(dict(data=[]))]:
+        response = SimpleNamespace(content=content.encode("utf-8"))
+        assert list(parser.parse(response)) == list(dict_baidu(response))
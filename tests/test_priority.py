@@ -0,0 +1,79 @@
+import threading
+import time
+
+from benchmarks.stub_server import StubFeeder, StubParser
+from icrawler import Crawler, ImageDownloader
+from icrawler.utils import PriorityCachedQueue
+
+
+def drain(queue):
+    items = []
+    while queue.qsize():
+        items.append(queue.get())
+        queue.task_done()
+    return items
+
+
+def test_priority_by_depth():
+    queue = PriorityCachedQueue(score="depth")
+    queue.put("http://a.com/1")
+    assert queue.get() == "http://a.com/1"
+    # put by the consumer, one level deeper
+    queue.put("http://a.com/1/2")
+    producer = threading.Thread(target=queue.put, args=("http://a.com/3",))
+    producer.start()
+    producer.join()
+    queue.task_done()
+    assert drain(queue) == ["http://a.com/3", "http://a.com/1/2"]
+
+
+def test_priority_keeps_depth():
+    queue = PriorityCachedQueue(score="depth")
+    queue.put("http://a.com/1")
+    queue.get()
+    queue.put("http://a.com/1/2")
+    queue.put("http://a.com/1/3")
+    queue.task_done()
+    assert queue.get() == "http://a.com/1/2"
+    queue.put("http://a.com/1/2/4")
+    assert queue.retry("http://a.com/1/2", 0.05)
+    queue.task_done()
+    time.sleep(0.1)
+    # the retried url is put back at its own depth, not one level deeper
+    assert drain(queue) == ["http://a.com/1/3", "http://a.com/1/2", "http://a.com/1/2/4"]
+    # and so are the restored ones
+    queue.restore(["http://a.com/1/2/4", "http://a.com/1"], [2, 0])
+    assert drain(queue) == ["http://a.com/1", "http://a.com/1/2/4"]
+
+
+def test_priority_disciplines():
+    queue = PriorityCachedQueue(score="size")
+    for size in [(10, 10), None, (100, 50), (30, 30)]:
+        queue.put({"file_url": f"http://a.com/{size}.jpg", "img_size": size})
+    assert [task["img_size"] for task in drain(queue)] == [(100, 50), (30, 30), (10, 10), None]
+
+    queue = PriorityCachedQueue(score="host")
+    for url in ["http://a.com/1", "http://a.com/2", "http://a.com/3", "http://b.com/1", "http://c.com/1"]:
+        queue.put(url)
+    assert drain(queue) == ["http://a.com/1", "http://b.com/1", "http://c.com/1", "http://a.com/2", "http://a.com/3"]
+
+    queue = PriorityCachedQueue(score=lambda url, depth: url.endswith("/best"))
+    queue.put("http://a.com/1")
+    queue.put("http://a.com/best")
+    assert drain(queue)[0] == "http://a.com/best"
+
+
+def test_crawl_with_priority(stub_server, tmp_path):
+    crawler = Crawler(
+        feeder_cls=StubFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        storage={"root_dir": str(tmp_path)},
+        priority={"page": "depth", "task": lambda task, depth: -int(task["file_url"].split("/")[-1][:-4])},
+    )
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=stub_server, page_num=2),
+        parser_kwargs=dict(base_url=stub_server),
+        downloader_kwargs=dict(max_num=20),
+    )
+    assert len(list(tmp_path.iterdir())) == 20
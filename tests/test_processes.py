@@ -0,0 +1,50 @@
+import multiprocessing
+import os
+
+import pytest
+
+from benchmarks.stub_server import StubFeeder, StubParser
+from icrawler import Crawler, ImageDownloader
+
+
+def run_crawler(base_url, root_dir, max_num=0, **kwargs):
+    crawler = Crawler(
+        feeder_cls=StubFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        parser_threads=2,
+        downloader_threads=4,
+        storage={"root_dir": str(root_dir)},
+        **kwargs,
+    )
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=base_url, page_num=3),
+        parser_kwargs=dict(base_url=base_url),
+        downloader_kwargs=dict(max_num=max_num),
+    )
+    return crawler, sorted(os.listdir(root_dir))
+
+
+def test_worker_processes(stub_server, tmp_path):
+    crawler, filenames = run_crawler(stub_server, tmp_path, parser_processes=2, downloader_processes=2)
+    assert filenames == [f"{i:06d}.jpg" for i in range(1, 31)]
+    assert crawler.downloader.fetched_num == 30
+    assert not any(worker.is_alive() for worker in crawler.downloader.workers)
+    crawler.close()
+    # the manager process is shut down
+    assert not multiprocessing.active_children()
+
+
+def test_worker_processes_max_num(stub_server, tmp_path):
+    crawler, filenames = run_crawler(stub_server, tmp_path, max_num=5, downloader_processes=3)
+    assert filenames == [f"{i:06d}.jpg" for i in range(1, 6)]
+    assert crawler.signal.get("reach_max_num")
+    crawler.close()
+
+
+def test_worker_processes_reject_exporters(tmp_path):
+    crawler = Crawler(
+        downloader_processes=2, storage={"root_dir": str(tmp_path)}, metrics={"callback": {"callback": print}}
+    )
+    with pytest.raises(ValueError):
+        crawler.crawl()
@@ -0,0 +1,41 @@
+import time
+
+from benchmarks.stub_server import StubFeeder, StubParser
+from icrawler import Crawler, ImageDownloader
+
+
+class BusyParser(StubParser):
+    def parse(self, response, base_url):
+        deadline = time.thread_time() + 0.1
+        while time.thread_time() < deadline:
+            pass
+        yield from super().parse(response, base_url)
+
+
+def test_crawler_profile(stub_server, tmp_path):
+    path = tmp_path / "crawl.folded"
+    crawler = Crawler(
+        feeder_cls=StubFeeder,
+        parser_cls=BusyParser,
+        downloader_cls=ImageDownloader,
+        downloader_threads=4,
+        storage={"root_dir": str(tmp_path / "images")},
+        profile={"path": str(path), "interval": 0.002},
+    )
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=stub_server, page_num=3),
+        parser_kwargs=dict(base_url=stub_server),
+        downloader_kwargs=dict(max_num=0),
+    )
+    profiler = crawler.profiler
+    # most of the busy loops are sampled
+    assert profiler.stages["parser"] > 0.2e6
+    assert profiler.hooks.most_common(1)[0][0] == "BusyParser.parse"
+    assert "BusyParser.parse" in profiler.report()
+    lines = path.read_text().splitlines()
+    assert lines
+    for line in lines:
+        stack, weight = line.rsplit(" ", 1)
+        assert stack.split(";")[0] in ("feeder", "parser", "downloader", "other")
+        assert int(weight) > 0
+    assert any(line.startswith("parser;") and "parse (test_profiler.py" in line for line in lines)
@@ -0,0 +1,166 @@
+import os
+import socket
+import time
+
+import pytest
+import requests
+
+from benchmarks.stub_server import StubHandler
+from icrawler import AsyncCrawler, Crawler, ImageDownloader
+from icrawler.builtin import UrlListCrawler
+from icrawler.utils import CachedQueue, HostScheduler, RetryPolicy
+
+from .helpers import ListFeeder, PrefixParser
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+def test_retry_policy():
+    policy = RetryPolicy(max_attempts=3, host_budget_ratio=0, host_budget_burst=2)
+    error = requests.ConnectionError()
+    assert policy.decide("http://a.com/1", http_error(404)) == (None, "permanent")
+    assert policy.decide("http://a.com/1", http_error(410)) == (None, "permanent")
+    assert policy.decide("http://a.com/1", error)[1] == "retry"
+    assert policy.decide("http://a.com/1", error)[1] == "retry"
+    assert policy.decide("http://a.com/1", error) == (None, "attempts")
+    # the budget of the host is spent, not the one of others
+    assert policy.decide("http://a.com/2", error) == (None, "budget")
+    assert policy.decide("http://b.com/1", error)[1] == "retry"
+    policy.forget("http://b.com/1")
+    assert policy.attempts("http://b.com/1") == 0
+
+
+def test_retry_policy_retry_after():
+    policy = RetryPolicy(max_delay=60)
+    error = http_error(429)
+    error.response.headers["Retry-After"] = "7"
+    assert policy.decide("http://a.com/1", error) == (7.0, "retry")
+    error.response.headers["Retry-After"] = "3600"
+    assert policy.decide("http://a.com/2", error) == (None, "delay")
+
+
+def test_retry_policy_budget_refills():
+    policy = RetryPolicy(budget_ratio=0.5, budget_burst=1, max_attempts=100)
+    error = requests.Timeout()
+    assert policy.decide("http://a.com/1", error)[1] == "retry"
+    assert policy.decide("http://a.com/1", error) == (None, "budget")
+    policy.on_request("http://a.com/1")
+    policy.on_request("http://a.com/1")
+    assert policy.decide("http://a.com/1", error)[1] == "retry"
+
+
+def test_retry_policy_bounded():
+    policy = RetryPolicy(max_attempts=100, budget_burst=1000, host_budget_ratio=0.5, host_budget_burst=1, capacity=3)
+    error = requests.Timeout()
+    # no host is kept track of while its budget is full
+    for i in range(10):
+        policy.on_request(f"http://host{i}.com/1")
+    assert len(policy._host_budgets) == 0
+    for i in range(5):
+        assert policy.decide(f"http://host{i}.com/1", error)[1] == "retry"
+    assert len(policy._host_budgets) == len(policy._attempts) == 3
+    assert policy.attempts("http://host0.com/1") == 0 and policy.attempts("http://host4.com/1") == 1
+    # forgotten once refilled
+    policy.on_request("http://host4.com/2")
+    policy.on_request("http://host4.com/2")
+    assert "host4.com" not in policy._host_budgets
+    # or once given up
+    assert policy.decide("http://host4.com/1", http_error(404)) == (None, "permanent")
+    assert policy.attempts("http://host4.com/1") == 0
+
+
+@pytest.mark.parametrize("queue_cls", [CachedQueue, HostScheduler])
+def test_queue_retry(queue_cls):
+    queue = queue_cls()
+    queue.put("http://a.com/1")
+    item = queue.get()
+    assert queue.retry(item, 0.2)
+    queue.task_done()
+    queue.finish()
+    # the retried item is unfinished
+    assert not queue.closed and not queue.empty() and queue.delayed() == 1
+    start = time.monotonic()
+    assert queue.get(timeout=2) == "http://a.com/1"
+    assert 0.15 < time.monotonic() - start < 1
+    queue.task_done()
+    assert queue.closed
+
+
+@pytest.mark.parametrize("crawler_cls, first_page", [(Crawler, 100), (AsyncCrawler, 200)])
+def test_crawler_retries(stub_server, tmp_path, crawler_cls, first_page):
+    crawler = crawler_cls(
+        feeder_cls=ListFeeder,
+        parser_cls=PrefixParser,
+        downloader_cls=ImageDownloader,
+        downloader_threads=4,
+        storage={"root_dir": str(tmp_path)},
+    )
+    pages = [f"{stub_server}/flaky/page/{first_page}", f"{stub_server}/flaky/page/{first_page + 1}"]
+    start = time.monotonic()
+    crawler.crawl(
+        feeder_kwargs=dict(urls=pages),
+        parser_kwargs=dict(base_url=stub_server, prefixes=["", "/flaky", "/gone"]),
+        downloader_kwargs=dict(max_num=0),
+    )
+    # the retries are not delayed as "Retry-After" is 0
+    assert time.monotonic() - start < 3
+    assert len(os.listdir(tmp_path)) == 14
+    for i in range(2):
+        assert StubHandler.requests[f"/flaky/page/{first_page + i}"] == 2
+        for j in range(10):
+            if j % 3 == 1:
+                assert StubHandler.requests[f"/flaky/img/{(first_page + i) * 10 + j}.jpg"] == 2
+            elif j % 3 == 2:
+                assert StubHandler.requests[f"/gone/img/{(first_page + i) * 10 + j}.jpg"] == 1
+    metrics = crawler.metrics
+    assert metrics.get("retries_total", stage="page", host="127.0.0.1") == 2
+    assert metrics.get("retries_total", stage="file", host="127.0.0.1") == 6
+    assert metrics.get("retries_denied_total", stage="file", reason="permanent") == 6
+    assert metrics.get("files_total", result="failed") == 6
+
+
+def test_retry_budget_of_dead_host(tmp_path):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    url_list = tmp_path / "urls.txt"
+    url_list.write_text("\n".join(f"http://127.0.0.1:{port}/img/{i}.jpg" for i in range(20)))
+    crawler = UrlListCrawler(
+        downloader_threads=4,
+        storage={"root_dir": str(tmp_path / "images")},
+        retry={"host_budget_ratio": 0, "host_budget_burst": 3, "backoff_base": 0.1},
+    )
+    crawler.crawl(str(url_list), max_num=0)
+    metrics = crawler.metrics
+    assert metrics.get("retries_total", stage="file", host="127.0.0.1") == 3
+    assert metrics.get("requests_total", stage="file", host="127.0.0.1") == 23
+    assert metrics.get("retries_denied_total", stage="file", reason="budget") == 20
+
+
+@pytest.mark.parametrize("crawler_cls", [Crawler, AsyncCrawler])
+def test_crawler_max_attempts(tmp_path, crawler_cls):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    crawler = crawler_cls(
+        feeder_cls=ListFeeder,
+        parser_cls=PrefixParser,
+        downloader_cls=ImageDownloader,
+        storage={"root_dir": str(tmp_path)},
+        retry={"max_attempts": 5, "backoff_base": 0.1},
+    )
+    crawler.crawl(
+        feeder_kwargs=dict(urls=[f"http://127.0.0.1:{port}/page/1"]),
+        parser_kwargs=dict(base_url="", prefixes=[""]),
+        downloader_kwargs=dict(max_num=0),
+    )
+    metrics = crawler.metrics
+    assert metrics.get("requests_total", stage="page", host="127.0.0.1") == 5
+    assert metrics.get("retries_total", stage="page", host="127.0.0.1") == 4
+    assert metrics.get("retries_denied_total", stage="page", reason="attempts") == 1
@@ -0,0 +1,74 @@
+import os
+import queue
+import time
+
+import pytest
+
+from benchmarks.stub_server import StubFeeder, StubParser
+from icrawler import Crawler, ImageDownloader
+from icrawler.utils import HostScheduler
+
+
+def task(host, i):
+    return dict(file_url=f"http://{host}/{i}.jpg")
+
+
+def test_round_robin():
+    scheduler = HostScheduler()
+    for i in range(4):
+        scheduler.put(task("a.com", i))
+    for i in range(2):
+        scheduler.put(task("b.com", i))
+    hosts = [scheduler.host_of(scheduler.get(timeout=1)) for _ in range(6)]
+    assert hosts == ["a.com", "b.com", "a.com", "b.com", "a.com", "a.com"]
+
+
+def test_concurrency():
+    scheduler = HostScheduler(concurrency=1, hosts={"b.com": {"concurrency": 2}})
+    for i in range(3):
+        scheduler.put(task("a.com", i))
+        scheduler.put(task("b.com", i))
+    hosts = [scheduler.host_of(scheduler.get(timeout=1)) for _ in range(3)]
+    assert sorted(hosts) == ["a.com", "b.com", "b.com"]
+    with pytest.raises(queue.Empty):
+        scheduler.get(timeout=0.1)
+    scheduler.task_done()
+    assert scheduler.host_of(scheduler.get(timeout=1)) == "a.com"
+
+
+def test_rate():
+    scheduler = HostScheduler(rate=20)
+    for i in range(5):
+        scheduler.put(task("a.com", i))
+    scheduler.put(task("b.com", 0))
+    start = time.monotonic()
+    hosts = [scheduler.host_of(scheduler.get(timeout=1)) for _ in range(6)]
+    assert hosts[:2] == ["a.com", "b.com"]
+    assert time.monotonic() - start >= 4 / 20 * 0.9
+
+
+def test_backoff():
+    scheduler = HostScheduler()
+    scheduler.put(task("a.com", 0))
+    scheduler.put(task("b.com", 0))
+    scheduler.backoff(task("a.com", 1), 10)
+    assert scheduler.host_of(scheduler.get(timeout=1)) == "b.com"
+    with pytest.raises(queue.Empty):
+        scheduler.get(timeout=0.1)
+
+
+def test_crawler_with_scheduler(stub_server, tmp_path):
+    crawler = Crawler(
+        feeder_cls=StubFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        downloader_threads=4,
+        storage={"root_dir": str(tmp_path)},
+        scheduler={"rate": 200, "burst": 4, "concurrency": 2},
+    )
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=stub_server, page_num=3),
+        parser_kwargs=dict(base_url=stub_server),
+        downloader_kwargs=dict(max_num=0),
+    )
+    assert sorted(os.listdir(tmp_path)) == [f"{i:06d}.jpg" for i in range(1, 31)]
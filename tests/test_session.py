@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+import requests
+from urllib3.exceptions import EmptyPoolError
+
+from icrawler.utils import Session
+
+
+def test_connections_reused(stub_server):
+    session = Session(pool_maxsize=4)
+    for i in range(20):
+        assert session.get(f"{stub_server}/img/{i}.jpg").status_code == 200
+    stats = session.connection_stats()
+    assert stats == dict(requests=20, connections=1, reused=19)
+
+
+def test_host_limits(stub_server):
+    session = Session(pool_maxsize=16, host_limits={"127.0.0.1": 2})
+
+    def fetch(start):
+        for i in range(start, start + 10):
+            session.get(f"{stub_server}/img/{i}.jpg")
+
+    threads = [threading.Thread(target=fetch, args=(i * 10,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = session.connection_stats()
+    assert stats["requests"] == 80
+    assert stats["connections"] <= 2
+
+
+def test_errors_release_connections(stub_server):
+    session = Session(host_limits={"127.0.0.1": 1})
+    errors = []
+
+    def fetch():
+        for i in range(5):
+            try:
+                session.get(f"{stub_server}/missing/{i}.jpg", stream=True, retry=False)
+            except requests.HTTPError as e:
+                errors.append(e.response.status_code)
+
+    # the only connection used to be kept by the first response
+    thread = threading.Thread(target=fetch, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert errors == [404] * 5
+
+
+def test_pool_timeout(stub_server):
+    session = Session(host_limits={"127.0.0.1": 1}, pool_timeout=0.1)
+    with session.get(f"{stub_server}/large.png", stream=True):
+        # the only connection is kept by the open response
+        with pytest.raises(EmptyPoolError):
+            session.get(f"{stub_server}/img/1.jpg")
+    assert session.get(f"{stub_server}/img/1.jpg").status_code == 200
+
+
+def test_http2_adapter(stub_server):
+    pytest.importorskip("httpx")
+    from icrawler.utils import HTTP2Adapter
+
+    session = Session()
+    # httpx falls back to HTTP/1.1 without TLS, which is enough to test the adapter
+    session.mount("http://", HTTP2Adapter(session.adapters["http://"]))
+    response = session.get(f"{stub_server}/page/1")
+    assert "/img/10.jpg" in response.text
+    with session.get(f"{stub_server}/large.png", stream=True) as response:
+        content = b"".join(response.iter_content(1000))
+    assert content == session.get(f"{stub_server}/large.png").content
+    assert session.connection_stats()["connections"] == 1
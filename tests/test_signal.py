@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from icrawler.utils import Signal
+from icrawler.utils.thread_pool import get_mp_context
+
+
+def make_signal():
+    signal = Signal()
+    signal.set(stopped=False, fetched=0)
+    return signal
+
+
+def test_set_and_get():
+    signal = make_signal()
+    signal.set(stopped=True)
+    assert signal.stopped is True
+    assert signal.get("stopped") is True
+    assert signal.get("unknown") is None
+    assert set(signal.names()) == {"stopped", "fetched"}
+    signal.reset()
+    assert signal.stopped is False
+    with pytest.raises(ValueError):
+        signal.set(wait=True)
+
+
+def test_incr():
+    signal = make_signal()
+
+    def count():
+        for _ in range(1000):
+            signal.incr("fetched")
+
+    threads = [threading.Thread(target=count) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert signal.fetched == 4000
+
+
+def test_wait():
+    signal = make_signal()
+    assert not signal.wait("stopped", timeout=0.01)
+    threading.Timer(0.05, signal.set, kwargs=dict(stopped=True)).start()
+    start = time.monotonic()
+    assert signal.wait("stopped", timeout=5)
+    assert time.monotonic() - start < 1
+
+
+def test_share_with_processes():
+    signal = make_signal()
+    ctx = get_mp_context()
+    signal.share(ctx)
+
+    def work():
+        for _ in range(100):
+            signal.incr("fetched")
+        signal.set(stopped=True)
+
+    processes = [ctx.Process(target=work) for _ in range(2)]
+    for process in processes:
+        process.start()
+    assert signal.wait("stopped", timeout=10)
+    for process in processes:
+        process.join()
+    assert signal.fetched == 200
+    assert signal.stopped is True
+    with pytest.raises(KeyError):
+        signal.set(other=1)
@@ -0,0 +1,98 @@
+import os
+import tarfile
+
+from benchmarks.stub_server import StubFeeder, StubHandler, StubParser
+from icrawler import Crawler, ImageDownloader
+from icrawler.storage import FileSystem, ShardStorage
+
+
+def test_shard_storage(tmp_path):
+    storage = ShardStorage(str(tmp_path), shard_size=6000)
+    for i in range(10):
+        storage.write(f"{i:06d}.jpg", bytes([i]) * 1000)
+    assert storage.exists("000003.jpg") and not storage.exists("000010.jpg")
+    assert storage.read("000003.jpg") == b"\3" * 1000
+    storage.flush()
+    shards = sorted(tmp_path.glob("*.tar"))
+    assert len(shards) == 4
+    with tarfile.open(shards[0]) as tar:
+        assert tar.getnames() == ["000000.jpg", "000001.jpg", "000002.jpg"]
+        assert tar.extractfile("000001.jpg").read() == b"\1" * 1000
+
+    reopened = ShardStorage(str(tmp_path))
+    assert reopened.max_file_idx() == 9
+    assert [id for id, _ in reopened] == [f"{i:06d}.jpg" for i in range(10)]
+    reopened.write("000010.jpg", b"new")
+    assert len(list(tmp_path.glob("*.tar"))) == 5
+    assert reopened.read("000010.jpg") == b"new"
+
+
+def test_crawl_to_shards(stub_server, tmp_path):
+    crawler = Crawler(
+        feeder_cls=StubFeeder,
+        parser_cls=StubParser,
+        downloader_cls=ImageDownloader,
+        downloader_threads=2,
+        downloader_processes=2,
+        storage={"backend": "ShardStorage", "root_dir": str(tmp_path)},
+    )
+    crawler.crawl(
+        feeder_kwargs=dict(base_url=stub_server, page_num=2),
+        parser_kwargs=dict(base_url=stub_server),
+        downloader_kwargs=dict(max_num=0),
+    )
+    crawler.close()
+    storage = ShardStorage(str(tmp_path))
+    assert len(storage) == 20
+    assert storage.read("000020.jpg") == StubHandler.image
+    for shard in tmp_path.glob("*.tar"):
+        with tarfile.open(shard) as tar:
+            tar.getmembers()
+
+
+def test_filesystem_manifest(tmp_path):
+    (tmp_path / "000005.jpg").write_bytes(b"old")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "000007.png").write_bytes(b"old")
+    # the crawl state is not listed
+    (tmp_path / ".icrawler").mkdir()
+    (tmp_path / ".icrawler" / "content.sqlite").write_bytes(b"state")
+    storage = FileSystem(str(tmp_path), manifest=True)
+    # rebuilt from the existing files, only the top level ones are numbered
+    assert storage.max_file_idx() == FileSystem(str(tmp_path)).max_file_idx() == 5
+    assert storage.exists("sub/000007.png") and not storage.exists("000006.jpg")
+    storage.write_chunks("000008.jpg", [b"new"])
+    storage.write("./000009.jpg", b"new")
+    assert storage.exists("000009.jpg") and storage.max_file_idx() == 9
+
+    # loaded from the log, which sees the files of other processes
+    reopened = FileSystem(str(tmp_path), manifest=True)
+    storage.write("000010.jpg", b"new")
+    assert reopened.exists("000008.jpg") and reopened.max_file_idx() == 10
+    storage.flush()
+    assert sorted((tmp_path / ".icrawler" / "manifest").read_text().split()) == [
+        "000005.jpg",
+        "000008.jpg",
+        "000009.jpg",
+        "000010.jpg",
+        "sub/000007.png",
+    ]
+
+
+def test_filesystem_first_existing(tmp_path, monkeypatch):
+    (tmp_path / "000001.png").write_bytes(b"old")
+    storage = FileSystem(str(tmp_path))
+    listed = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path: listed.append(path) or listdir(path))
+    assert storage.first_existing(["000001.jpg", "000001.png"]) == "000001.png"
+    assert storage.first_existing(["000002.jpg", "000002.png"]) is None
+    # the files written meanwhile are seen without listing the directory again
+    storage.write("000002.png", b"new")
+    assert storage.first_existing(["000002.jpg", "000002.png"]) == "000002.png"
+    assert storage.first_existing(["sub/000001.png"]) is None
+    assert [os.path.normpath(path) for path in listed] == [str(tmp_path), str(tmp_path / "sub")]
+    # listed again by the next crawl
+    (tmp_path / "000003.gif").write_bytes(b"other")
+    storage.flush()
+    assert storage.first_existing(["000003.jpg", "000003.gif"]) == "000003.gif"